@@ -0,0 +1,74 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from survey_schema import answer_categories, answer_codes
+
+# Questions the counts can be broken down by by default
+DEFAULT_COHORTS = ['Cycle Irregularity', 'Education on Cycle Effects']
+
+# Rows counted per vectorized pass when updating from a large frame
+_UPDATE_CHUNK = 100000
+
+
+class AnswerCountIndex:
+    # Answer histograms for every question, kept in one integer array so a
+    # callback reads counts in O(1) however many responses are held:
+    #
+    #   counts[0, q, a]                  respondents answering level a on question q
+    #   counts[1 + c * L + b, q, a]      ... among those answering level b on cohort question c
+    #
+    # where L is the number of answer levels. Appending rows adds their counts
+    # without rescanning what was already indexed.
+    def __init__(self, columns, cohorts=DEFAULT_COHORTS, levels=answer_categories):
+        self.columns = list(columns)
+        self.levels = list(levels)
+        self.cohorts = [c for c in cohorts if c in self.columns]
+        self._column_index = {col: i for i, col in enumerate(self.columns)}
+        self._cohort_index = {col: i for i, col in enumerate(self.cohorts)}
+        self.counts = np.zeros((1 + len(self.cohorts) * len(self.levels), len(self.columns), len(self.levels)),
+                               dtype='int64')
+        self.n_rows = 0
+        self._lock = threading.Lock()
+
+    # Add survey rows (a DataFrame holding the index's columns)
+    def update(self, frame):
+        for start in range(0, len(frame), _UPDATE_CHUNK):
+            chunk = frame.iloc[start:start + _UPDATE_CHUNK]
+            self.update_codes(np.column_stack([answer_codes(chunk[col]) for col in self.columns]))
+
+    # Add rows given as answer codes (rows x columns, 0-based level, -1 missing)
+    def update_codes(self, codes):
+        codes = np.asarray(codes, dtype='int64')
+        if codes.size == 0:
+            return
+        n, k = codes.shape
+        n_levels = len(self.levels)
+        cell = np.arange(k) * n_levels + codes
+
+        # Slice 0 for everyone, then one slice per (cohort, cohort answer)
+        cohort_codes = codes[:, [self._column_index[c] for c in self.cohorts]]
+        slices = np.concatenate([
+            np.zeros((n, 1), dtype='int64'),
+            np.where(cohort_codes >= 0, 1 + np.arange(len(self.cohorts)) * n_levels + cohort_codes, -1)
+        ], axis=1)
+
+        flat = slices[:, :, None] * (k * n_levels) + cell[:, None, :]
+        valid = (slices[:, :, None] >= 0) & (codes[:, None, :] >= 0)
+        added = np.bincount(flat[valid], minlength=self.counts.size).reshape(self.counts.shape)
+
+        with self._lock:
+            self.counts += added
+            self.n_rows += n
+
+    # Count per answer level for a question, optionally among respondents who
+    # gave `cohort_answer` to the `cohort` question
+    def value_counts(self, question, cohort=None, cohort_answer=None):
+        q = self._column_index[question]
+        if cohort is None:
+            row = self.counts[0, q]
+        else:
+            b = self.levels.index(cohort_answer)
+            row = self.counts[1 + self._cohort_index[cohort] * len(self.levels) + b, q]
+        return pd.Series(row, index=self.levels, name=question)
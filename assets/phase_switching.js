@@ -0,0 +1,111 @@
+// Clientside phase switching: the radar chart, workout bars and phase advice
+// are redrawn in the browser from the phase-data store (see update_phase_data
+// in cycle_analysis.py), so toggling phase-selection never calls the server.
+// Each function mirrors its server callback of the same panel.
+(function () {
+    function rgba(hex, alpha) {
+        const value = hex.replace('#', '');
+        const [r, g, b] = [0, 2, 4].map(i => parseInt(value.slice(i, i + 2), 16));
+        return `rgba(${r}, ${g}, ${b}, ${alpha})`;
+    }
+
+    // Repeat the first value so the polygon closes
+    function closed(values) {
+        return values.concat([values[0]]);
+    }
+
+    function html(type, props) {
+        return {namespace: 'dash_html_components', type: type, props: props};
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        phases: {
+            // Mirrors update_radar_chart
+            radar: function (phase, data) {
+                if (!data || !phase) {
+                    return window.dash_clientside.no_update;
+                }
+                const categories = closed(data.metrics);
+                const traces = [{
+                    type: 'scatterpolar',
+                    r: closed(data.values[data.phases.indexOf(phase)]),
+                    theta: categories,
+                    fill: 'toself',
+                    fillcolor: rgba(data.colors[phase], 0.5),
+                    line: {color: data.colors[phase]},
+                    name: phase
+                }];
+                data.phases.forEach(function (other, i) {
+                    if (other !== phase) {
+                        traces.push({
+                            type: 'scatterpolar',
+                            r: closed(data.values[i]),
+                            theta: categories,
+                            line: {color: data.colors[other], width: 1, dash: 'dot'},
+                            opacity: 0.3,
+                            showlegend: false
+                        });
+                    }
+                });
+                if (data.cohort) {
+                    traces.push({
+                        type: 'scatterpolar',
+                        r: closed(data.cohort[data.phases.indexOf(phase)]),
+                        theta: categories,
+                        line: {color: data.cohort_color, width: 2, dash: 'dash'},
+                        name: 'Cohort median'
+                    });
+                }
+                return {data: traces, layout: data.radar_layout};
+            },
+
+            // Mirrors update_training_recommendations
+            recommendations: function (phase, data) {
+                if (!data || !phase) {
+                    return window.dash_clientside.no_update;
+                }
+                const workouts = data.workouts[phase];
+                const names = workouts.map(w => w.type);
+                return {
+                    data: [
+                        {
+                            type: 'bar',
+                            x: names,
+                            y: workouts.map(w => w.intensity),
+                            name: 'Intensity (%)',
+                            marker: {color: data.colors[phase]},
+                            opacity: 0.8,
+                            xaxis: 'x',
+                            yaxis: 'y'
+                        },
+                        {
+                            type: 'bar',
+                            x: names,
+                            y: workouts.map(w => w.duration),
+                            name: 'Duration (min)',
+                            marker: {color: data.colors[phase]},
+                            opacity: 0.5,
+                            xaxis: 'x2',
+                            yaxis: 'y2'
+                        }
+                    ],
+                    layout: data.recommendations_layout
+                };
+            },
+
+            // Mirrors update_phase_advice
+            advice: function (phase, data) {
+                if (!data || !phase) {
+                    return window.dash_clientside.no_update;
+                }
+                return html('Ul', {
+                    children: data.advice[phase].map(item => html('Li', {
+                        children: item,
+                        style: {marginBottom: '8px', lineHeight: '1.5', fontSize: '14px'}
+                    })),
+                    style: {paddingLeft: '20px'}
+                });
+            }
+        }
+    });
+})();
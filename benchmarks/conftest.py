@@ -0,0 +1,215 @@
+import datetime
+import glob
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import tracemalloc
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Keep benchmark runs away from the working database, survey cache and
+# wearable store: everything they write goes to a scratch directory
+WORKDIR = tempfile.mkdtemp(prefix='cycleperform-bench-')
+os.environ.setdefault('CYCLEPERFORM_DB', os.path.join(WORKDIR, 'cycleperform.db'))
+os.environ.setdefault('CYCLEPERFORM_CACHE_DIR', os.path.join(WORKDIR, 'cache'))
+os.environ.setdefault('CYCLEPERFORM_WEARABLE_DIR', os.path.join(WORKDIR, 'wearables'))
+
+from survey_cache import read_survey_file  # noqa: E402
+from synthetic_data import fit_survey_model, iter_survey_chunks, write_chunks  # noqa: E402
+
+# Survey sizes the data-dependent benchmarks run at: '1x' is the bundled
+# workbook, numbers are synthetic surveys of that many responses
+DEFAULT_ROWS = '1x,10000,100000,1000000'
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+BUNDLED_SURVEY = glob.glob(os.path.join(ROOT, '*.xlsx'))[0]
+
+# Medians (and peak memory) of the benchmarks run this session, by name
+_results = {}
+
+# (name, metric, baseline, value) for every result worse than the baseline
+_regressions = []
+
+# Baseline path when there was none to compare against
+_missing_baseline = []
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('cycleperform')
+    group.addoption('--bench-rows', default=DEFAULT_ROWS,
+                    help=f"Comma-separated survey sizes to benchmark (default: {DEFAULT_ROWS})")
+    group.addoption('--baseline', default=DEFAULT_BASELINE,
+                    help="Baseline JSON to compare against / save to")
+    group.addoption('--save-baseline', action='store_true',
+                    help="Write this run's results to the baseline instead of comparing")
+    group.addoption('--regression-tolerance', type=float, default=0.2,
+                    help="Fail when a median or peak memory exceeds the baseline by more than this fraction")
+
+
+def pytest_generate_tests(metafunc):
+    if 'rows' in metafunc.fixturenames:
+        scales = [s.strip() for s in metafunc.config.getoption('--bench-rows').split(',') if s.strip()]
+        # Session scope: each survey size is generated and indexed once
+        metafunc.parametrize('rows', [s if s == '1x' else int(s) for s in scales], ids=str, scope='session')
+
+
+# Peak Python-heap allocation of one call, in MiB
+def peak_memory(func):
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / 2 ** 20
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.fixture(scope='session')
+def app():
+    import cycle_analysis
+    cycle_analysis.init()
+    return cycle_analysis
+
+
+# Answer shares and correlations of the bundled survey, for synthetic surveys
+@pytest.fixture(scope='session')
+def survey_model():
+    return fit_survey_model(read_survey_file(BUNDLED_SURVEY))
+
+
+# Survey export for a size: the bundled workbook, or a synthetic CSV export
+# shaped like it
+@pytest.fixture(scope='session')
+def survey_file(rows, survey_model):
+    if rows == '1x':
+        return BUNDLED_SURVEY
+    path = os.path.join(WORKDIR, f'survey-{rows}.csv')
+    if not os.path.exists(path):
+        write_chunks(iter_survey_chunks(rows, **survey_model), path)
+    return path
+
+
+# Point the app's survey data (frame, correlation engine, bootstrap statistics,
+# answer, cohort, strata and percentile indexes) at a survey of the given size for the benchmarks that read it
+@pytest.fixture(scope='session')
+def survey_state(app, survey_file):
+    from answer_index import AnswerCountIndex
+    from cohort_filter import CohortBitmapIndex
+    from correlation_engine import CorrelationEngine
+    from percentile_index import PercentileIndex
+    from stratification import StratificationIndex
+    from survey_ingest import SurveyIngestor
+    from survey_stats import SurveyStatistics
+
+    names = ['survey_ingestor', 'df', 'correlation_engine', 'answer_index', 'cohort_index', 'strata_index',
+             'percentile_index', 'survey_statistics']
+    saved = {name: getattr(app, name) for name in names}
+
+    app.survey_ingestor = SurveyIngestor(survey_file, cache_dir=os.path.join(WORKDIR, 'cache'))
+    app.df, _ = app.load_data()
+    app.correlation_engine = CorrelationEngine(saved['correlation_engine'].columns)
+    app.correlation_engine.update(app.df)
+    # Fewer resamples than the app's default: the callbacks only read the results
+    app.survey_statistics = SurveyStatistics.load_or_compute(app.correlation_engine, os.path.join(WORKDIR, 'cache'),
+                                                             n_resamples=200)
+    app.answer_index = AnswerCountIndex(app.correlation_engine.columns)
+    app.answer_index.update(app.df)
+    app.cohort_index = CohortBitmapIndex(app.correlation_engine.columns)
+    app.cohort_index.update(app.df)
+    app.strata_index = StratificationIndex(app.correlation_engine.columns)
+    app.strata_index.update(app.df)
+    app.percentile_index = PercentileIndex(app.correlation_engine.columns)
+    app.percentile_index.update(app.df)
+    yield app
+
+    for name, value in saved.items():
+        setattr(app, name, value)
+
+
+@pytest.fixture
+def scratch_dir():
+    path = tempfile.mkdtemp(dir=WORKDIR)
+    yield path
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def _benchmark_name(item):
+    return f'{os.path.basename(str(item.fspath))}::{item.name}'
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item, call):
+    outcome = yield
+    if call.when != 'call' or outcome.get_result().failed:
+        return
+    fixture = item.funcargs.get('benchmark')
+    if fixture is None or fixture.disabled or not getattr(fixture, 'stats', None):
+        return
+    result = {'median': fixture.stats.stats.median}
+    if 'peak_memory_mb' in fixture.extra_info:
+        result['peak_memory_mb'] = fixture.extra_info['peak_memory_mb']
+    _results[_benchmark_name(item)] = result
+
+
+def _compare(baseline, tolerance):
+    for name, result in sorted(_results.items()):
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for metric, value in result.items():
+            reference = previous.get(metric)
+            if reference and value > reference * (1 + tolerance):
+                yield name, metric, reference, value
+
+
+def pytest_sessionfinish(session, exitstatus):
+    config = session.config
+    if not _results or not hasattr(config, 'getoption'):
+        return
+    path = config.getoption('--baseline')
+
+    if config.getoption('--save-baseline'):
+        try:
+            with open(path) as f:
+                benchmarks = json.load(f).get('benchmarks', {})
+        except (OSError, ValueError):
+            benchmarks = {}
+        benchmarks.update(_results)
+        with open(path, 'w') as f:
+            json.dump({
+                'machine': {'python': platform.python_version(), 'platform': platform.platform(),
+                            'processor': platform.processor(), 'cpus': os.cpu_count()},
+                'saved': datetime.datetime.now().isoformat(timespec='seconds'),
+                'benchmarks': benchmarks
+            }, f, indent=2, sort_keys=True)
+        return
+
+    try:
+        with open(path) as f:
+            baseline = json.load(f)['benchmarks']
+    except (OSError, ValueError, KeyError):
+        _missing_baseline.append(path)
+        return
+    _regressions.extend(_compare(baseline, config.getoption('--regression-tolerance')))
+    if _regressions:
+        session.exitstatus = 1
+
+
+def pytest_terminal_summary(terminalreporter):
+    for path in _missing_baseline:
+        terminalreporter.write_line(f'No baseline at {path}; record one with --save-baseline to check for regressions.',
+                                    yellow=True)
+    if _regressions:
+        terminalreporter.section('regressions against baseline', sep='=', red=True)
+        for name, metric, reference, value in _regressions:
+            terminalreporter.write_line(f'{name}: {metric} {reference:.6g} -> {value:.6g} ({value / reference - 1:+.0%})')
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(WORKDIR, ignore_errors=True)
@@ -0,0 +1,86 @@
+import inspect
+
+import pytest
+
+import cycle_analysis
+from twin_store import cycle_phases
+
+# The parameters below are read from the layout, which init() builds
+cycle_analysis.init()
+
+
+# Values a dropdown in the layout offers, so the benchmarks follow the layout
+def dropdown_values(component_id):
+    for component in cycle_analysis.base_layout._traverse():
+        if getattr(component, 'id', None) == component_id:
+            return [option['value'] for option in component.options]
+    raise KeyError(component_id)
+
+
+# 'cached' runs the callback as Dash calls it, through the figure cache;
+# 'render' calls the undecorated function, i.e. what a cache miss costs
+def variant(func, name):
+    return func if name == 'cached' else inspect.unwrap(func)
+
+
+IMPACT_QUESTIONS = dropdown_values('impact-selection')
+CORRELATION_METHODS = dropdown_values('correlation-method')
+COHORT_FILTERS = {
+    'none': None,
+    'one': ['Cycle Irregularity|1'],
+    'two-questions': ['Cycle Irregularity|1', 'Cycle Irregularity|2', 'Education on Cycle Effects|3']
+}
+
+
+@pytest.mark.parametrize('mode', ['cached', 'render'])
+@pytest.mark.parametrize('phase', cycle_phases)
+def test_update_radar_chart(benchmark, app, phase, mode):
+    benchmark(variant(app.update_radar_chart, mode), phase, None)
+
+
+@pytest.mark.parametrize('mode', ['cached', 'render'])
+@pytest.mark.parametrize('phase', cycle_phases)
+def test_update_training_recommendations(benchmark, app, phase, mode):
+    benchmark(variant(app.update_training_recommendations, mode), phase)
+
+
+@pytest.mark.parametrize('mode', ['cached', 'render'])
+@pytest.mark.parametrize('phase', cycle_phases)
+def test_update_phase_advice(benchmark, app, phase, mode):
+    benchmark(variant(app.update_phase_advice, mode), phase)
+
+
+@pytest.mark.parametrize('filters', COHORT_FILTERS, ids=str)
+@pytest.mark.parametrize('question', IMPACT_QUESTIONS)
+def test_update_impact_distribution(benchmark, survey_state, rows, question, filters):
+    benchmark(survey_state.update_impact_distribution, question, COHORT_FILTERS[filters])
+
+
+@pytest.mark.parametrize('dimension', dropdown_values('strata-dimension'))
+def test_update_strata_distribution(benchmark, survey_state, rows, dimension):
+    benchmark(survey_state.update_strata_distribution, 'Fatigue/Soreness', dimension)
+
+
+# An athlete with every answer and both bands given, so each sketch is read
+def test_update_percentile_ranking(benchmark, survey_state, rows):
+    benchmark(survey_state.update_percentile_ranking, 1, 2, 2, 3, 1, 21, 22.5)
+
+
+@pytest.mark.parametrize('method', CORRELATION_METHODS)
+def test_update_correlations_heatmap(benchmark, survey_state, rows, method):
+    benchmark(survey_state.update_correlations_heatmap, method)
+
+
+@pytest.mark.parametrize('mode', ['cached', 'render'])
+def test_update_training_planner(benchmark, app, mode):
+    benchmark(variant(app.update_training_planner, mode), None)
+
+
+@pytest.mark.parametrize('name', ['update_current_status', 'update_readiness', 'update_phase_data'])
+def test_athlete_callbacks(benchmark, app, name):
+    benchmark(getattr(app, name), None)
+
+
+# Building the whole served page (every callback's initial output)
+def test_render_layout(benchmark, app):
+    benchmark(app.render_layout)
@@ -0,0 +1,50 @@
+import os
+import shutil
+
+from conftest import peak_memory
+from survey_ingest import SurveyIngestor
+
+
+def _loader(app, survey_file, cache_dir):
+    # load_data() reads through the module's ingestor; give it a fresh one per
+    # call so nothing is reused from the previous round in memory
+    def load():
+        app.survey_ingestor = SurveyIngestor(survey_file, cache_dir=cache_dir)
+        return app.load_data()
+    return load
+
+
+# No Arrow cache yet: the export is parsed and the cache written
+def test_load_data_cold(benchmark, app, survey_file, rows, scratch_dir):
+    saved = app.survey_ingestor
+    cache_dir = os.path.join(scratch_dir, 'cache')
+    load = _loader(app, survey_file, cache_dir)
+
+    def clear_cache():
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    try:
+        clear_cache()
+        benchmark.extra_info['peak_memory_mb'] = peak_memory(load)
+        benchmark.pedantic(load, setup=clear_cache, rounds=3, iterations=1)
+    finally:
+        app.survey_ingestor = saved
+
+
+# Cache present (e.g. a restart or another worker): the export is memory-mapped
+def test_load_data_warm(benchmark, app, survey_file, rows, scratch_dir):
+    saved = app.survey_ingestor
+    load = _loader(app, survey_file, os.path.join(scratch_dir, 'cache'))
+    try:
+        load()
+        benchmark.extra_info['peak_memory_mb'] = peak_memory(load)
+        df, _ = benchmark(load)
+        benchmark.extra_info['rows'] = len(df)
+        # Resident size of the survey data: the dashboard frame shares the
+        # ingested frame's buffers, so the ingested frame is the total
+        ingested = app.survey_ingestor.df
+        benchmark.extra_info['bytes_per_response'] = (
+            ingested.memory_usage(deep=True).sum() + df['Impact Score'].nbytes
+        ) / len(df)
+    finally:
+        app.survey_ingestor = saved
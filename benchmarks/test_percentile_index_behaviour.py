@@ -0,0 +1,110 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from percentile_index import PercentileIndex, QuantileSketch
+from stratification import AGE_BANDS, BMI_BANDS, band_codes
+
+
+# Fraction of values below x, counting values equal to x as half below
+def mid_rank(values, x):
+    values = np.asarray(values, dtype='float64')
+    return ((values < x).sum() + 0.5 * (values == x).sum()) / len(values)
+
+
+def test_cdf_is_exact_below_compression():
+    rng = np.random.default_rng(0)
+    values = rng.integers(0, 150, size=5000).astype('float64')
+    sketch = QuantileSketch(compression=200).update(values)
+
+    assert sketch.count == len(values)
+    assert len(sketch.means) == len(np.unique(values))
+    for x in np.unique(values):
+        assert sketch.cdf(x) == pytest.approx(mid_rank(values, x), abs=1e-12)
+    assert sketch.cdf(values.min() - 1) == 0.0
+    assert sketch.cdf(values.max() + 1) == 1.0
+
+
+def test_update_skips_nan_and_honours_weights():
+    sketch = QuantileSketch().update([1.0, np.nan, 2.0, 3.0], weights=[1, 5, 2, 1])
+    assert sketch.count == 4
+    assert sketch.cdf(2.0) == pytest.approx(mid_rank([1, 2, 2, 3], 2.0))
+    assert np.isnan(QuantileSketch().cdf(1.0))
+
+
+def test_compression_bounds_centroids_and_keeps_tails():
+    rng = np.random.default_rng(1)
+    values = rng.normal(size=100000)
+    sketch = QuantileSketch(compression=200).update(values)
+
+    assert len(sketch.means) <= 200
+    assert sketch.count == len(values)
+    assert sketch.weights.sum() == pytest.approx(len(values))
+    # The arcsine scale keeps tail centroids small, so extreme ranks stay tight
+    for q in (0.001, 0.01, 0.25, 0.5, 0.75, 0.99, 0.999):
+        assert sketch.cdf(np.quantile(values, q)) == pytest.approx(q, abs=max(0.005, q * (1 - q) * 0.05))
+
+
+def test_merge_is_order_independent_below_compression():
+    rng = np.random.default_rng(2)
+    shards = [rng.integers(0, 100, size=n).astype('float64') for n in (300, 1000, 50)]
+    whole = QuantileSketch().update(np.concatenate(shards))
+    for order in itertools.permutations(shards):
+        merged = QuantileSketch()
+        for shard in order:
+            merged.merge(QuantileSketch().update(shard))
+        np.testing.assert_array_equal(merged.means, whole.means)
+        np.testing.assert_array_equal(merged.weights, whole.weights)
+
+
+def test_merge_of_compressed_shards_matches_one_sketch():
+    rng = np.random.default_rng(3)
+    shards = [rng.gamma(2.0, size=n) for n in (20000, 5000, 40000)]
+    values = np.concatenate(shards)
+    whole = QuantileSketch().update(values)
+    for order in itertools.permutations(shards):
+        merged = QuantileSketch()
+        for shard in order:
+            merged.merge(QuantileSketch().update(shard))
+        assert merged.count == whole.count
+        for q in (0.01, 0.1, 0.5, 0.9, 0.99):
+            assert merged.cdf(np.quantile(values, q)) == pytest.approx(q, abs=0.01)
+
+
+# Percentiles per band of every value given match a mid-rank computed
+# directly over the rows in that band, whether the index is built in one pass
+# or merged from shards
+def test_percentile_index_matches_direct_mid_ranks():
+    rng = np.random.default_rng(4)
+    n_rows = 3000
+    answers = rng.integers(1, 4, size=(n_rows, 2)).astype('float64')
+    answers[rng.random(n_rows) < 0.05, 1] = np.nan
+    score = np.round(np.nanmean(answers, axis=1), 4)
+    values = np.column_stack([score, answers])
+    age = rng.uniform(17, 30, size=n_rows)
+    bmi = rng.uniform(16, 35, size=n_rows)
+    age[:20] = np.nan
+
+    index = PercentileIndex(['Q1', 'Q2'])
+    index.update_arrays(values, age, bmi)
+    sharded = PercentileIndex(['Q1', 'Q2'])
+    for part in np.array_split(np.arange(n_rows), 3):
+        shard = PercentileIndex(['Q1', 'Q2'])
+        shard.update_arrays(values[part], age[part], bmi[part])
+        sharded.merge(shard)
+    assert index.n_rows == sharded.n_rows == n_rows
+
+    age_band = band_codes(age, AGE_BANDS['edges'])
+    bmi_band = band_codes(bmi, BMI_BANDS['edges'])
+    for m, metric in enumerate(index.metrics):
+        for a, b in [(None, None), (1, None), (None, 2), (0, 1), (3, 3)]:
+            rows = np.isfinite(values[:, m])
+            if a is not None:
+                rows &= age_band == a
+            if b is not None:
+                rows &= bmi_band == b
+            for value in np.unique(values[rows, m]):
+                expected = 100 * mid_rank(values[rows, m], value)
+                assert index.percentile(metric, value, a, b) == pytest.approx(expected, abs=1e-9)
+                assert sharded.percentile(metric, value, a, b) == pytest.approx(expected, abs=1e-9)
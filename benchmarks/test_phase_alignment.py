@@ -0,0 +1,37 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import peak_memory
+from phase_alignment import CohortCurves, align_daily
+from synthetic_data import iter_athlete_chunks
+from twin_store import phase_metrics
+
+# A year of daily performance per athlete, for squads of these sizes
+SQUAD_SIZES = [100, 1000, 10000]
+HISTORY_DAYS = 365
+
+
+# Synthetic daily histories with the period starts and forecast lengths the
+# engine reads from the forecaster
+@pytest.fixture(scope='module', params=SQUAD_SIZES, ids=str)
+def squad(request):
+    daily = pd.concat(iter_athlete_chunks(request.param, HISTORY_DAYS), ignore_index=True)
+    daily['day'] = np.array([d.toordinal() for d in daily['date']], dtype='int64')
+    starts = daily[daily['cycle_day'] == 1].groupby('athlete_id')['day'].agg(list)
+    period_starts = {a: [datetime.date.fromordinal(d) for d in days] for a, days in starts.items()}
+    forecast_lengths = daily.groupby('athlete_id')['cycle_length'].first().astype(int).to_dict()
+    return daily, period_starts, forecast_lengths
+
+
+# Every athlete's cycles resampled onto the phase grid and averaged, in one pass
+def test_align_daily(benchmark, squad):
+    benchmark.extra_info['peak_memory_mb'] = peak_memory(lambda: align_daily(*squad, metrics=phase_metrics))
+    benchmark.pedantic(align_daily, args=squad, kwargs={'metrics': phase_metrics}, rounds=3, iterations=1)
+
+
+def test_cohort_curves(benchmark, squad):
+    _, curves = align_daily(*squad, metrics=phase_metrics)
+    benchmark(lambda: CohortCurves().update(curves).summary())
@@ -0,0 +1,23 @@
+import subprocess
+import sys
+
+import pytest
+
+from conftest import ROOT
+
+# Each step runs in a fresh interpreter, since import and init() cost is
+# only paid once per process
+STARTUP_STEPS = {
+    'import': "import cycle_analysis",
+    'init': "import cycle_analysis; cycle_analysis.init()",
+    'first-request': "import cycle_analysis; cycle_analysis.app.server.test_client().get('/_dash-layout')",
+}
+
+
+@pytest.mark.parametrize('step', STARTUP_STEPS)
+def test_startup(benchmark, step):
+    def run():
+        subprocess.run([sys.executable, '-c', STARTUP_STEPS[step]], cwd=ROOT, check=True)
+    # Warm the survey cache and the database the way a restarted server finds them
+    run()
+    benchmark.pedantic(run, rounds=3, iterations=1)
@@ -0,0 +1,16 @@
+from percentile_index import PercentileIndex
+from survey_stats import SurveyStatistics
+
+
+# Resampling is done on the joint answer tables, so its cost should not grow
+# with the number of responses. One worker, to time the work rather than the pool.
+def test_bootstrap(benchmark, survey_state, rows):
+    benchmark.pedantic(SurveyStatistics.compute, args=(survey_state.correlation_engine,),
+                       kwargs={'n_resamples': 100, 'max_workers': 1}, rounds=3, iterations=1)
+
+
+# Combining per-shard percentile indexes touches only their centroids, so it
+# should stay flat as the shards grow
+def test_percentile_merge(benchmark, survey_state, rows):
+    shard = survey_state.percentile_index
+    benchmark(lambda: PercentileIndex(shard.columns).merge(shard).merge(shard))
@@ -0,0 +1,99 @@
+import math
+
+import numpy as np
+import pytest
+
+from correlation_engine import pearson_from_tables
+from survey_stats import _bootstrap_task, chi2_sf, chi_square_tests
+
+
+# Critical values from standard chi-square tables: (statistic, dof, p-value)
+CHI2_CRITICAL = [
+    (3.841458820694124, 1, 0.05),
+    (6.634896601021214, 1, 0.01),
+    (5.991464547107979, 2, 0.05),
+    (7.814727903251178, 3, 0.05),
+    (9.487729036781154, 4, 0.05),
+    (11.070497693516351, 5, 0.05),
+    (16.811893829770927, 6, 0.01),
+    (18.307038053275146, 10, 0.05),
+    (37.56623478662507, 20, 0.01)
+]
+
+
+@pytest.mark.parametrize('statistic, dof, p_value', CHI2_CRITICAL)
+def test_chi2_sf_critical_values(statistic, dof, p_value):
+    assert chi2_sf(statistic, dof) == pytest.approx(p_value, rel=1e-9)
+
+
+# One and two degrees of freedom have elementary survival functions
+@pytest.mark.parametrize('statistic', [0.01, 0.5, 1.0, 4.0, 25.0, 200.0])
+def test_chi2_sf_low_dof_closed_forms(statistic):
+    assert chi2_sf(statistic, 1) == pytest.approx(math.erfc(math.sqrt(statistic / 2)), rel=1e-12)
+    assert chi2_sf(statistic, 2) == pytest.approx(math.exp(-statistic / 2), rel=1e-12)
+
+
+def test_chi2_sf_edges():
+    assert chi2_sf(0.0, 1) == 1.0
+    assert chi2_sf(0.0, 4) == 1.0
+    assert math.isnan(chi2_sf(1.0, 0))
+    assert math.isnan(chi2_sf(math.nan, 3))
+    # Decreasing in the statistic, increasing in the degrees of freedom
+    assert chi2_sf(3.0, 3) > chi2_sf(4.0, 3)
+    assert chi2_sf(4.0, 3) < chi2_sf(4.0, 4)
+
+
+def _chi_square(table):
+    table = np.asarray(table, dtype='float64')
+    table = table[table.sum(axis=1) > 0][:, table.sum(axis=0) > 0]
+    expected = np.outer(table.sum(axis=1), table.sum(axis=0)) / table.sum()
+    return ((table - expected) ** 2 / expected).sum(), (table.shape[0] - 1) * (table.shape[1] - 1)
+
+
+def test_chi_square_tests_match_direct_computation():
+    rng = np.random.default_rng(0)
+    tables = rng.integers(0, 40, size=(6, 3, 3))
+    tables[2, 1] = 0  # a level nobody gave, on one side
+    tables[3, :, 0] = 0
+    statistic, dof, p_value = chi_square_tests(tables)
+    for table, s, d, p in zip(tables, statistic, dof, p_value):
+        expected_statistic, expected_dof = _chi_square(table)
+        assert s == pytest.approx(expected_statistic, rel=1e-12)
+        assert d == expected_dof
+        assert p == pytest.approx(chi2_sf(expected_statistic, expected_dof), rel=1e-12)
+
+
+def test_chi_square_tests_independent_and_degenerate_tables():
+    independent = np.outer([10, 20, 30], [1, 2, 3])
+    degenerate = np.zeros((3, 3))
+    degenerate[1, :] = [4, 5, 6]
+    statistic, dof, p_value = chi_square_tests(np.stack([independent, degenerate]))
+    assert statistic[0] == pytest.approx(0.0, abs=1e-12)
+    assert p_value[0] == pytest.approx(1.0)
+    # A single answer on one side leaves no degrees of freedom to test
+    assert dof[1] == 0
+    assert np.isnan(statistic[1]) and np.isnan(p_value[1])
+
+
+# Replicates resample respondents: each pair's table plus the respondents who
+# skipped either question add up to n_rows, and on average every cell keeps
+# its observed count
+def test_bootstrap_task_resamples_pair_tables():
+    rng = np.random.default_rng(1)
+    tables = rng.integers(5, 60, size=(4, 3, 3))
+    n_rows = int(tables.sum(axis=(1, 2)).max()) + 50
+    draws, correlations = _bootstrap_task(tables, n_rows, 4000, ['pearson'], seed=7)
+
+    assert draws.shape == (4000, 4, 3, 3)
+    assert (draws.sum(axis=(2, 3)) <= n_rows).all()
+    np.testing.assert_allclose(draws.mean(axis=0), tables, rtol=0.1)
+    np.testing.assert_allclose(correlations['pearson'], pearson_from_tables(draws.astype('float64')))
+
+
+def test_bootstrap_task_is_seeded():
+    tables = np.full((2, 3, 3), 10)
+    first, _ = _bootstrap_task(tables, 120, 50, ['pearson'], seed=3)
+    again, _ = _bootstrap_task(tables, 120, 50, ['pearson'], seed=3)
+    other, _ = _bootstrap_task(tables, 120, 50, ['pearson'], seed=4)
+    np.testing.assert_array_equal(first, again)
+    assert (first != other).any()
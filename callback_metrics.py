@@ -0,0 +1,169 @@
+import bisect
+import cProfile
+import datetime
+import functools
+import os
+import threading
+import time
+
+import flask
+
+# Upper bounds of the histogram buckets (Prometheus `le` labels)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# Request header that asks for a cProfile dump of one callback request
+PROFILE_HEADER = 'X-CyclePerform-Profile'
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Histogram:
+    # Cumulative-bucket histogram per label value, as Prometheus expects it
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}
+
+    def observe(self, label, value):
+        series = self._series.get(label)
+        if series is None:
+            series = self._series.setdefault(label, [[0] * (len(self.buckets) + 1), 0.0])
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self, label_name):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for label in sorted(self._series):
+            counts, total = self._series[label]
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label_name}="{_label(label)}",le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label_name}="{_label(label)}"}} {_format_value(total)}')
+            lines.append(f'{self.name}_count{{{label_name}="{_label(label)}"}} {cumulative}')
+        return lines
+
+
+class CallbackMetrics:
+    # In-process latency and payload metrics for Dash callbacks:
+    #
+    #   instrument(func)       records wall and CPU time of every call
+    #   instrument_dispatch()  records the serialized response size of each
+    #                          /_dash-update-component request against the callback
+    #                          it ran, and profiles it on request
+    #   render()               everything (plus figure cache hits) as Prometheus text
+    #
+    # Profiling is off unless `profile_dir` is set; then a callback request sent
+    # with the PROFILE_HEADER header is run under cProfile and the stats are
+    # written to `profile_dir` (named in the response's PROFILE_HEADER header).
+    def __init__(self, profile_dir=None):
+        self.profile_dir = profile_dir
+        self.wall = Histogram('cycleperform_callback_duration_seconds',
+                              'Wall time of Dash callbacks.', LATENCY_BUCKETS)
+        self.cpu = Histogram('cycleperform_callback_cpu_seconds',
+                             'CPU time of Dash callbacks (calling thread).', LATENCY_BUCKETS)
+        self.response_bytes = Histogram('cycleperform_callback_response_bytes',
+                                        'Serialized (uncompressed) callback response size.', SIZE_BUCKETS)
+        self._errors = {}
+        self._caches = []
+        self._lock = threading.Lock()
+        # Instrumented calls in progress on this thread
+        self._local = threading.local()
+
+    def instrument(self, func):
+        name = func.__name__
+
+        # Only the outermost instrumented call is measured and names the
+        # request; callbacks it calls in turn are part of its time
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            depth = getattr(self._local, 'depth', 0)
+            if depth:
+                self._local.depth = depth + 1
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self._local.depth = depth
+
+            if flask.has_request_context():
+                flask.g.callback_name = name
+            self._local.depth = 1
+            wall_start, cpu_start = time.perf_counter(), time.thread_time()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                with self._lock:
+                    self._errors[name] = self._errors.get(name, 0) + 1
+                raise
+            finally:
+                self._local.depth = 0
+                wall, cpu = time.perf_counter() - wall_start, time.thread_time() - cpu_start
+                with self._lock:
+                    self.wall.observe(name, wall)
+                    self.cpu.observe(name, cpu)
+
+        return wrapper
+
+    # Wrap Dash's callback endpoint. The response is measured before any
+    # after_request hook (e.g. compression) sees it.
+    def instrument_dispatch(self, server, endpoint='/_dash-update-component'):
+        dispatch = server.view_functions[endpoint]
+
+        @functools.wraps(dispatch)
+        def view(*args, **kwargs):
+            profile = self.profile_dir is not None and flask.request.headers.get(PROFILE_HEADER)
+            if profile:
+                profiler = cProfile.Profile()
+                response = server.make_response(profiler.runcall(dispatch, *args, **kwargs))
+            else:
+                response = server.make_response(dispatch(*args, **kwargs))
+
+            name = flask.g.get('callback_name')
+            if name is not None and not response.is_streamed:
+                with self._lock:
+                    self.response_bytes.observe(name, response.calculate_content_length() or 0)
+            if profile:
+                response.headers[PROFILE_HEADER] = self._dump_profile(profiler, name or 'callback')
+            return response
+
+        server.view_functions[endpoint] = view
+
+    def _dump_profile(self, profiler, name):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        stamp = datetime.datetime.now().strftime('%Y%m%dT%H%M%S%f')
+        path = os.path.join(self.profile_dir, f'{name}-{stamp}-{os.getpid()}.prof')
+        profiler.dump_stats(path)
+        return os.path.basename(path)
+
+    # Export the hit/miss counters of a FigureCache alongside the callback metrics
+    def track_cache(self, cache):
+        self._caches.append(cache)
+
+    def render(self):
+        with self._lock:
+            lines = []
+            for histogram in (self.wall, self.cpu, self.response_bytes):
+                lines += histogram.render('callback')
+            lines += ['# HELP cycleperform_callback_errors_total Dash callbacks that raised.',
+                      '# TYPE cycleperform_callback_errors_total counter']
+            lines += [f'cycleperform_callback_errors_total{{callback="{_label(name)}"}} {count}'
+                      for name, count in sorted(self._errors.items())]
+
+        stats = [cache.stats()['callbacks'] for cache in self._caches]
+        for kind in ('hits', 'misses'):
+            metric = f'cycleperform_figure_cache_{kind}_total'
+            lines += [f'# HELP {metric} Figure cache {kind} by callback.', f'# TYPE {metric} counter']
+            for callbacks in stats:
+                lines += [f'{metric}{{callback="{_label(name)}"}} {counts[kind]}'
+                          for name, counts in sorted(callbacks.items())]
+        return '\n'.join(lines) + '\n'
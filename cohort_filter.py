@@ -0,0 +1,107 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from survey_schema import answer_categories, answer_codes
+
+_M1 = np.uint64(0x5555555555555555)
+_M2 = np.uint64(0x3333333333333333)
+_M4 = np.uint64(0x0F0F0F0F0F0F0F0F)
+_H01 = np.uint64(0x0101010101010101)
+
+
+# Set bits per 64-bit word (SWAR popcount), summed over the last axis
+def popcount(words):
+    x = words - ((words >> np.uint64(1)) & _M1)
+    x = (x & _M2) + ((x >> np.uint64(2)) & _M2)
+    x = (x + (x >> np.uint64(4))) & _M4
+    return ((x * _H01) >> np.uint64(56)).sum(axis=-1, dtype='int64')
+
+
+class CohortBitmapIndex:
+    # One packed bitmap per (question, answer) over all respondents, so slicing
+    # the survey by any combination of answers is bitwise ANDs/ORs and a
+    # popcount, never a scan of the responses.
+    #
+    # bitmaps[q, a] has bit r set when respondent r answered level a on question q.
+    # Rows are packed with np.packbits and read as 64-bit words; bits past the
+    # last respondent are always zero.
+    def __init__(self, columns, levels=answer_categories):
+        self.columns = list(columns)
+        self.levels = list(levels)
+        self._column_index = {col: i for i, col in enumerate(self.columns)}
+        self.n_rows = 0
+        self._bitmaps = np.zeros((len(self.columns), len(self.levels), 0), dtype='uint8')
+        self._lock = threading.Lock()
+
+    @property
+    def bitmaps(self):
+        return self._bitmaps[..., :(self.n_rows + 63) // 64 * 8].view('uint64')
+
+    # Add survey rows (a DataFrame holding the index's columns)
+    def update(self, frame):
+        self.update_codes(np.column_stack([answer_codes(frame[col]) for col in self.columns]))
+
+    # Add rows given as answer codes (rows x columns, 0-based level, -1 missing)
+    def update_codes(self, codes):
+        codes = np.asarray(codes)
+        if codes.size == 0:
+            return
+        # (question, level, row) membership for the new rows
+        bits = codes.T[:, None, :] == np.arange(len(self.levels))[None, :, None]
+
+        with self._lock:
+            # Re-pack the last partial byte together with the new rows
+            tail = self.n_rows % 8
+            start_byte = self.n_rows // 8
+            if tail:
+                kept = np.unpackbits(self._bitmaps[..., start_byte:start_byte + 1], axis=-1)[..., :tail]
+                bits = np.concatenate([kept.astype(bool), bits], axis=-1)
+            packed = np.packbits(bits, axis=-1)
+
+            needed = start_byte + packed.shape[-1]
+            if needed > self._bitmaps.shape[-1]:
+                # Grow geometrically so repeated appends stay amortised O(new rows)
+                capacity = max((needed + 7) // 8 * 8, 2 * self._bitmaps.shape[-1])
+                grown = np.zeros(self._bitmaps.shape[:-1] + (capacity,), dtype='uint8')
+                grown[..., :self._bitmaps.shape[-1]] = self._bitmaps
+                self._bitmaps = grown
+            self._bitmaps[..., start_byte:needed] = packed
+            self.n_rows += codes.shape[0]
+
+    # Bitmap of respondents matching every filter. `filters` maps a question to
+    # an answer level or a list of levels: levels of one question are ORed,
+    # different questions ANDed.
+    def mask(self, filters=None):
+        bitmaps = self.bitmaps
+        mask = np.full(bitmaps.shape[-1], 0xFFFFFFFFFFFFFFFF, dtype='uint64')
+        for question, answers in (filters or {}).items():
+            if not isinstance(answers, (list, tuple, set)):
+                answers = [answers]
+            q = self._column_index[question]
+            levels = [self.levels.index(a) for a in answers]
+            mask &= np.bitwise_or.reduce(bitmaps[q, levels], axis=0)
+        return mask
+
+    def count(self, filters=None):
+        if not filters:
+            return self.n_rows
+        return int(popcount(self.mask(filters)))
+
+    # Count per answer level for a question among respondents matching `filters`
+    def value_counts(self, question, filters=None):
+        selected = self.bitmaps[self._column_index[question]] & self.mask(filters)
+        counts = popcount(selected)
+        return pd.Series(counts, index=self.levels, name=question)
+
+    # Levels of `row_question` x levels of `column_question` among respondents
+    # matching `filters`
+    def crosstab(self, row_question, column_question, filters=None):
+        bitmaps = self.bitmaps
+        mask = self.mask(filters)
+        rows = bitmaps[self._column_index[row_question]] & mask
+        cols = bitmaps[self._column_index[column_question]]
+        counts = popcount(rows[:, None, :] & cols[None, :, :])
+        return pd.DataFrame(counts, index=pd.Index(self.levels, name=row_question),
+                            columns=pd.Index(self.levels, name=column_question))
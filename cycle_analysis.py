@@ -1,10 +1,23 @@
-import pandas as pd
-import numpy as np
+import copy
+import datetime
+import json
+import os
+import threading
+
 import dash
-from dash import dcc, html, Input, Output, callback
-import plotly.express as px
+import flask
+from dash import dcc, html, Input, Output, ClientsideFunction
+# plotly loads its figure classes on first use, so this import is cheap
 import plotly.graph_objects as go
-from plotly.subplots import make_subplots
+
+from callback_metrics import CallbackMetrics, PROMETHEUS_CONTENT_TYPE
+from figure_cache import FigureCache
+from survey_schema import impact_questions
+
+# Importing this module only sets up the app, its callbacks and routes. The
+# survey data, stores, indexes and layout are built by init(), which runs on
+# the first request or explicitly (create_app() calls it). The data-layer
+# modules pull in pandas, NumPy and pyarrow, so they are imported where used.
 
 # Initialize the Dash app
 app = dash.Dash(__name__, title="CyclePerform Digital Twin", external_stylesheets=[
@@ -98,430 +111,773 @@ colors = {
     'hover': '#3730a3'                 # Darker purple for hover states
 }
 
+# Colors for each cycle phase
+phase_colors = {
+    'Menstrual': colors['accent1'],
+    'Follicular': colors['accent2'],
+    'Ovulatory': colors['accent3'],
+    'Luteal': colors['accent4']
+}
+
+# Advice shown for each cycle phase
+phase_advice = {
+    'Menstrual': [
+        "Focus on gentle recovery workouts",
+        "Pay extra attention to iron-rich foods",
+        "Prioritize sleep and hydration",
+        "Consider shorter but more frequent sessions"
+    ],
+    'Follicular': [
+        "Great time to work on building strength",
+        "Your body can handle more intensity now",
+        "Good phase for trying new workout routines",
+        "Focus on skill development and technique"
+    ],
+    'Ovulatory': [
+        "Peak performance window - ideal for tests or races",
+        "Body is primed for high-intensity workouts",
+        "Recovery tends to be efficient in this phase",
+        "Good time to push for personal records"
+    ],
+    'Luteal': [
+        "Focus on maintaining rather than building",
+        "Pay attention to cooling down properly",
+        "You may need more carbohydrates for energy",
+        "Adjust expectations as fatigue may increase"
+    ]
+}
+
+# Where to find the survey exports: a file, a directory or a glob pattern
+# (several can be joined with os.pathsep). Defaults to the exports next to this script.
+SURVEY_SOURCE = os.environ.get(
+    'CYCLEPERFORM_SURVEY_SOURCE',
+    os.path.dirname(os.path.abspath(__file__))
+)
+
+# Athlete shown when no athlete id is entered
+DEFAULT_ATHLETE_ID = os.environ.get('CYCLEPERFORM_DEFAULT_ATHLETE', 'demo')
+
+# Fewest aligned athletes the cohort curves need before the radar chart shows them
+MIN_COHORT_ATHLETES = 5
+
+# Survey data, stores, indexes and the page layout; set up by init()
+survey_ingestor = None
+df = None
+twin_store = forecaster = alignment_engine = readiness_engine = wearable_store = None
+
+# (as_of, profile) of the cohort curves last read by get_cohort_profile()
+_cohort = (None, None)
+correlation_engine = answer_index = cohort_index = strata_index = percentile_index = None
+survey_statistics = None
+base_layout = None
+
+# Styles for the current phase and cycle day in the status panel
+def current_phase_style(color):
+    return {
+        'marginRight': '10px', 
+        'color': color,
+        'fontSize': '24px',
+        'fontWeight': '700'
+    }
+
+def cycle_day_style(color):
+    return {
+        'fontSize': '16px',
+        'backgroundColor': '#e6f2f5',
+        'padding': '4px 8px',
+        'borderRadius': '16px',
+        'color': color
+    }
+
+# Style for the readiness dial, tinted by the score's band
+def readiness_dial_style(color):
+    return {
+        'fontSize': '48px', 
+        'fontWeight': 'bold', 
+        'color': color,
+        'textAlign': 'center',
+        'display': 'flex',
+        'alignItems': 'center',
+        'justifyContent': 'center',
+        'width': '100px',
+        'height': '100px',
+        'borderRadius': '50%',
+        'backgroundColor': '#fff',
+        'border': f'8px solid {color}33',
+        'boxShadow': '0 2px 4px rgba(0, 0, 0, 0.1)'
+    }
+
 # Load and prepare data
 def load_data():
-    # In a real application, this would load your Excel file
-    # For now, we'll create a simulated dataframe based on the analysis
-    
-    file_path = "C:\\Users\\marks\\Desktop\\Master's\\DBM190\\Project Dataset\\EFFECT OF MENSTRUAL CYCLE ON PHYSICAL ACTIVITY AMONG COLLEGE GOING RECREATIONAL ATHLETES (Responses).xlsx" 
-    # Load the Excel file - in production code, replace with your file path
-    df = pd.read_excel(file_path)
-
-    
-    # Map numeric responses to meaningful labels for better visualization
-    # Based on our analysis, 1 generally indicates higher impact, 3 lower impact
-    response_mapping = {1: "High Impact", 2: "Moderate Impact", 3: "Low Impact"}
-    
-    # Create shorthand question labels for better readability in visualizations
-    question_labels = {
-        "1- Do you face menstrual cycle irregularity ?": "Cycle Irregularity",
-        "2- Have you been educated or informed about how the menstrual cycle may influence recreational athletic activities?": "Education on Cycle Effects",
-        "3- Do you perceive the general effect of your menstrual cycle on your engagement in recreational physical activity ": "Effect on Engagement",
-        "4- Do you recognise fluctuations in your energy levels throughout different phases of your menstrual cycle?": "Energy Fluctuations",
-        "5- Do you have a specific pre warm up routine or rituals that you follow taking into account your menstrual cycle phases? ": "Adjusted Warm-Up",
-        "6- Does your motivation for physical activities get influenced by your menstrual cycle?": "Motivation Impact",
-        "7- Have you modified the intensity or duration of your recreational activities depending on the stage of your menstrual cycle?": "Modified Intensity/Duration",
-        "8- Do you notice alterations in strength or endurance during particular phases of your menstrual cycle? ": "Strength/Endurance Changes",
-        "9- Does your menstrual cycle impact the agility and coordination while participating in physical activity?": "Agility/Coordination Impact",
-        "10- Does your menstrual cycle affect your capacity to partake in high intensity exercise? ": "High Intensity Capability",
-        "11- Do you experience fluctuations in flexibility or joint health throughout your menstrual cycle? ": "Flexibility Changes",
-        "12- Do you sense greater fatigue or muscle soreness during specific periods of the menstrual cycle while performing any physical activity?": "Fatigue/Soreness",
-        "13- Does menstrual discomfort like cramps, bloating or changes in mood influence your training or competitive  performance?": "Discomfort Effect",
-        "14- Do you perceive difference in the duration it takes for recovery after participating in recreational activities during your menstrual cycle? ": "Recovery Time Change",
-        "15- Do you implement psychological strategies to sustain focus and a positive mindset during recreational athletic activities, particularly when navigating challenges associated with the menstrual cycle?": "Psychological Strategies"
-    }
+    import pandas as pd
+    from survey_schema import question_labels, impact_questions, answer_values
     
-    # Add short labels for better visualization
-    for col, short_label in question_labels.items():
-        if col in df.columns:
-            df[short_label] = df[col]
-    
-    # Calculate impact score (average of key questions)
-    impact_questions = [
-        "Effect on Engagement",
-        "Motivation Impact",
-        "Strength/Endurance Changes",
-        "High Intensity Capability",
-        "Fatigue/Soreness"
-    ]
+    # Every export is parsed once into the Arrow cache and merged onto the
+    # question_labels schema; calling this again only re-reads changed files
+    survey = survey_ingestor.load()
+    
+    # Questions go by their short labels (question_labels maps the export
+    # headers to them). The columns share the ingested frame's buffers rather
+    # than copying them, and the hashed names are only needed for deduplication.
+    df = pd.DataFrame(
+        {question_labels.get(col, col): survey[col] for col in survey.columns if col != 'NAME'},
+        copy=False
+    )
     
-    # Make sure all these columns exist before calculating
+    # Make sure all the impact questions exist before calculating
     valid_impact_questions = [q for q in impact_questions if q in df.columns]
     if valid_impact_questions:
-        df['Impact Score'] = df[valid_impact_questions].mean(axis=1)
-    
-    # Create a phase-specific impact feature (for a simulated person)
-    # This would normally come from your digital twin's analysis
-    cycle_phases = ['Menstrual', 'Follicular', 'Ovulatory', 'Luteal']
-    
-    # Create simulated phase-specific data for the current user
-    # In a real app, this would be personalized based on the user's data
-    current_user_data = {
-        'Phase': cycle_phases,
-        'Energy Level': [60, 80, 95, 70],
-        'Strength': [65, 85, 90, 75],
-        'Endurance': [55, 75, 90, 65],
-        'Recovery': [50, 70, 85, 60],
-        'Recommended Intensity': [60, 90, 95, 75]
-    }
+        # Answers are stored as categoricals, so average their numeric values
+        df['Impact Score'] = pd.concat(
+            [answer_values(df[q]) for q in valid_impact_questions], axis=1
+        ).mean(axis=1).astype('float32')
     
-    user_df = pd.DataFrame(current_user_data)
+    return df, question_labels
+
+# Resolve the athlete twin for a callback, falling back to the demo athlete
+def get_twin(athlete_id):
+    return twin_store.get((athlete_id or '').strip() or DEFAULT_ATHLETE_ID) or twin_store.get(DEFAULT_ATHLETE_ID)
+
+# Median cohort profile (phase x metric) for the radar chart, or None until
+# enough athletes are aligned. Re-read whenever the nightly alignment stores a
+# new set of curves (even for the same date), so every worker picks them up
+# without a restart.
+def get_cohort_profile():
+    global _cohort
+    from phase_alignment import phase_profile
     
-    return df, user_df, question_labels
+    run = alignment_engine.curves_run()
+    if run != _cohort[0]:
+        curves = alignment_engine.cohort_curves()
+        enough = len(curves) and curves['athletes'].max() >= MIN_COHORT_ATHLETES
+        _cohort = (run, phase_profile(curves) if enough else None)
+    return _cohort[1]
+
+# Cache key part for the figures that draw the cohort profile
+def cohort_key():
+    profile = get_cohort_profile()
+    return profile.tobytes() if profile is not None else b''
+
+# Cached phase figures; athlete-specific figures are keyed on the athlete's
+# phase profile, so they are re-rendered whenever that profile changes
+figure_cache = FigureCache()
+
+# Latency, CPU time and response size of every page callback, served at /metrics
+callback_metrics = CallbackMetrics()
+callback_metrics.track_cache(figure_cache)
+callback_metrics.instrument_dispatch(app.server)
+
+# 1st, 2nd, 3rd, 4th, ..., 11th, 12th, 13th, ..., 21st
+def ordinal(n):
+    n = int(round(n))
+    suffix = 'th' if 10 <= n % 100 <= 20 else {1: 'st', 2: 'nd', 3: 'rd'}.get(n % 10, 'th')
+    return f"{n}{suffix}"
 
-# Load the data
-df, user_df, question_labels = load_data()
+# Cohort filter options are "<question>|<answer>" strings
+def parse_cohort_filters(values):
+    filters = {}
+    for value in values or []:
+        question, answer = value.rsplit('|', 1)
+        filters.setdefault(question, []).append(int(answer))
+    return filters
 
-# Create reverse mapping from short labels to original questions
-reverse_question_mapping = {v: k for k, v in question_labels.items()}
+# Axis titles and radio labels of the age/BMI breakdown
+STRATA_LABELS = {'age': "Age", 'bmi': "BMI"}
+
+# Questions the athlete answers in the ranking panel (the Impact Score questions)
+RANKED_QUESTIONS = list(impact_questions)
 
 # Prepare the app layout
-app.layout = html.Div(style={'backgroundColor': colors['background'], 'padding': '20px'}, children=[
-    # Header
-    html.Div(style={
-        'backgroundColor': colors['panel'], 
-        'padding': '20px', 
-        'marginBottom': '20px', 
-        'borderRadius': '10px', 
-        'boxShadow': '0 4px 8px rgba(0, 0, 0, 0.1)',
-        'border': f'1px solid {colors["border"]}'
-    }, children=[
-        html.H1("CyclePerform Digital Twin", style={
-            'color': colors['title'], 
-            'textAlign': 'center',
-            'fontFamily': 'system-ui, -apple-system, "Segoe UI", Roboto, "Helvetica Neue", Arial',
-            'fontWeight': '700',
-            'marginBottom': '8px'
-        }),
-        html.P("Optimize your running performance through menstrual cycle analysis", style={
-            'textAlign': 'center',
-            'fontSize': '16px',
-            'color': '#718096',
-            'marginBottom': '24px'
-        }),
-        
-        # User profile snapshot
+def build_layout():
+    from correlation_engine import CORRELATION_METHODS
+    from stratification import STRATA_DIMENSIONS
+    from survey_schema import response_mapping
+    from twin_store import cycle_phases
+    
+    return html.Div(style={'backgroundColor': colors['background'], 'padding': '20px'}, children=[
+        # Header
         html.Div(style={
-            'display': 'flex', 
-            'flexWrap': 'wrap',
-            'justifyContent': 'space-between', 
-            'marginTop': '20px',
-            'gap': '16px'
+            'backgroundColor': colors['panel'], 
+            'padding': '20px', 
+            'marginBottom': '20px', 
+            'borderRadius': '10px', 
+            'boxShadow': '0 4px 8px rgba(0, 0, 0, 0.1)',
+            'border': f'1px solid {colors["border"]}'
         }, children=[
+            html.H1("CyclePerform Digital Twin", style={
+                'color': colors['title'], 
+                'textAlign': 'center',
+                'fontFamily': 'system-ui, -apple-system, "Segoe UI", Roboto, "Helvetica Neue", Arial',
+                'fontWeight': '700',
+                'marginBottom': '8px'
+            }),
+            html.P("Optimize your running performance through menstrual cycle analysis", style={
+                'textAlign': 'center',
+                'fontSize': '16px',
+                'color': '#718096',
+                'marginBottom': '24px'
+            }),
+        
+            # Athlete selection
             html.Div(style={
-                'flex': '1',
-                'minWidth': '200px',
-                'backgroundColor': '#f7fafc',
-                'padding': '16px',
-                'borderRadius': '8px'
+                'display': 'flex',
+                'justifyContent': 'center',
+                'alignItems': 'center',
+                'gap': '8px'
             }, children=[
-                html.H4("Current Status", style={
-                    'fontSize': '16px',
-                    'fontWeight': '600',
-                    'color': colors['title'],
-                    'marginBottom': '12px'
+                html.Label("Athlete ID", htmlFor='athlete-id', style={
+                    'fontSize': '14px',
+                    'fontWeight': '500',
+                    'color': colors['title']
                 }),
-                html.Div(style={'display': 'flex', 'alignItems': 'center'}, children=[
-                    html.H2("Luteal Phase", style={
-                        'marginRight': '10px', 
-                        'color': colors['accent4'],
-                        'fontSize': '24px',
-                        'fontWeight': '700'
-                    }),
-                    html.Div("Day 22 of 28", style={
+                dcc.Input(
+                    id='athlete-id',
+                    type='text',
+                    value=DEFAULT_ATHLETE_ID,
+                    debounce=True,
+                    style={
+                        'padding': '6px 10px',
+                        'borderRadius': '6px',
+                        'border': f'1px solid {colors["border"]}'
+                    }
+                )
+            ]),
+        
+            # User profile snapshot
+            html.Div(style={
+                'display': 'flex', 
+                'flexWrap': 'wrap',
+                'justifyContent': 'space-between', 
+                'marginTop': '20px',
+                'gap': '16px'
+            }, children=[
+                html.Div(style={
+                    'flex': '1',
+                    'minWidth': '200px',
+                    'backgroundColor': '#f7fafc',
+                    'padding': '16px',
+                    'borderRadius': '8px'
+                }, children=[
+                    html.H4("Current Status", style={
                         'fontSize': '16px',
-                        'backgroundColor': '#e6f2f5',
-                        'padding': '4px 8px',
-                        'borderRadius': '16px',
-                        'color': colors['accent4']
+                        'fontWeight': '600',
+                        'color': colors['title'],
+                        'marginBottom': '12px'
+                    }),
+                    html.Div(style={'display': 'flex', 'alignItems': 'center'}, children=[
+                        html.H2(id='current-phase', style=current_phase_style(colors['accent4'])),
+                        html.Div(id='cycle-day', style=cycle_day_style(colors['accent4']))
+                    ]),
+                    html.Div(id='cycle-forecast', style={
+                        'fontSize': '14px', 
+                        'color': '#718096',
+                        'marginTop': '8px'
                     })
                 ]),
-                html.Div("Based on your cycle history and symptoms", style={
-                    'fontSize': '14px', 
-                    'color': '#718096',
-                    'marginTop': '8px'
-                })
-            ]),
             
+                html.Div(style={
+                    'flex': '1',
+                    'minWidth': '200px',
+                    'backgroundColor': '#f7fafc',
+                    'padding': '16px',
+                    'borderRadius': '8px'
+                }, children=[
+                    html.H4("Today's Recommendation", style={
+                        'fontSize': '16px',
+                        'fontWeight': '600',
+                        'color': colors['title'],
+                        'marginBottom': '12px'
+                    }),
+                    html.P("Focus on moderate intensity workouts with emphasis on technique rather than pushing for new personal records.", 
+                           style={
+                               'fontSize': '14px',
+                               'lineHeight': '1.5',
+                               'color': colors['text']
+                           })
+                ]),
+            
+                html.Div(style={
+                    'flex': '1',
+                    'minWidth': '200px',
+                    'backgroundColor': '#f7fafc',
+                    'padding': '16px',
+                    'borderRadius': '8px',
+                    'display': 'flex',
+                    'flexDirection': 'column',
+                    'alignItems': 'center',
+                    'justifyContent': 'center'
+                }, children=[
+                    html.H4("Current Readiness", style={
+                        'fontSize': '16px',
+                        'fontWeight': '600',
+                        'color': colors['title'],
+                        'marginBottom': '12px',
+                        'textAlign': 'center'
+                    }),
+                    html.Div(id='readiness-score', style=readiness_dial_style(colors['text'])),
+                    html.Div(id='readiness-label', style={
+                        'fontSize': '14px',
+                        'marginTop': '8px',
+                        'color': '#718096'
+                    })
+                ])
+            ])
+        ]),
+    
+        # Main content area
+        html.Div(style={'display': 'flex', 'flexWrap': 'wrap', 'gap': '20px'}, children=[
+            # Left panel - Performance by Cycle Phase
             html.Div(style={
-                'flex': '1',
-                'minWidth': '200px',
-                'backgroundColor': '#f7fafc',
-                'padding': '16px',
-                'borderRadius': '8px'
+                'flex': '1', 
+                'minWidth': '350px', 
+                'backgroundColor': colors['panel'], 
+                'padding': '24px', 
+                'borderRadius': '10px', 
+                'boxShadow': '0 4px 8px rgba(0, 0, 0, 0.1)',
+                'border': f'1px solid {colors["border"]}'
             }, children=[
-                html.H4("Today's Recommendation", style={
-                    'fontSize': '16px',
-                    'fontWeight': '600',
+                html.H3("Your Performance Across Cycle Phases", style={
+                    'marginBottom': '20px',
                     'color': colors['title'],
-                    'marginBottom': '12px'
+                    'fontWeight': '600',
+                    'fontSize': '18px'
                 }),
-                html.P("Focus on moderate intensity workouts with emphasis on technique rather than pushing for new personal records.", 
-                       style={
-                           'fontSize': '14px',
-                           'lineHeight': '1.5',
-                           'color': colors['text']
-                       })
+                dcc.Graph(id='cycle-performance-radar'),
+                dcc.Store(id='phase-data'),
+                html.Div(style={
+                    'marginTop': '16px',
+                    'backgroundColor': '#f7fafc',
+                    'padding': '12px',
+                    'borderRadius': '8px'
+                }, children=[
+                    html.H4("Phase Selection", style={
+                        'marginBottom': '8px',
+                        'fontSize': '16px',
+                        'fontWeight': '500',
+                        'color': colors['title']
+                    }),
+                    dcc.RadioItems(
+                        id='phase-selection',
+                        options=[{'label': phase, 'value': phase} for phase in cycle_phases],
+                        value='Luteal',
+                        inline=True,
+                        style={
+                            'display': 'flex',
+                            'justifyContent': 'space-between'
+                        },
+                        className='custom-radio'
+                    )
+                ])
             ]),
-            
+        
+            # Right panel - Recommendations and training adjustments
             html.Div(style={
-                'flex': '1',
-                'minWidth': '200px',
-                'backgroundColor': '#f7fafc',
-                'padding': '16px',
-                'borderRadius': '8px',
-                'display': 'flex',
-                'flexDirection': 'column',
-                'alignItems': 'center',
-                'justifyContent': 'center'
+                'flex': '1', 
+                'minWidth': '350px', 
+                'backgroundColor': colors['panel'], 
+                'padding': '24px', 
+                'borderRadius': '10px', 
+                'boxShadow': '0 4px 8px rgba(0, 0, 0, 0.1)',
+                'border': f'1px solid {colors["border"]}'
             }, children=[
-                html.H4("Current Readiness", style={
-                    'fontSize': '16px',
-                    'fontWeight': '600',
+                html.H3("Recommended Training Adjustments", style={
+                    'marginBottom': '20px',
                     'color': colors['title'],
-                    'marginBottom': '12px',
-                    'textAlign': 'center'
+                    'fontWeight': '600',
+                    'fontSize': '18px'
                 }),
+                dcc.Graph(id='training-recommendations'),
                 html.Div(style={
-                    'fontSize': '48px', 
-                    'fontWeight': 'bold', 
-                    'color': '#f59e0b',
-                    'textAlign': 'center',
-                    'display': 'flex',
-                    'alignItems': 'center',
-                    'justifyContent': 'center',
-                    'width': '100px',
-                    'height': '100px',
-                    'borderRadius': '50%',
-                    'backgroundColor': '#fff',
-                    'border': '8px solid #fef3c7',
-                    'boxShadow': '0 2px 4px rgba(0, 0, 0, 0.1)'
-                }, children=["73%"]),
-                html.Div("Moderate Energy Level", style={
-                    'fontSize': '14px',
-                    'marginTop': '8px',
-                    'color': '#718096'
-                })
+                    'marginTop': '16px',
+                    'backgroundColor': '#f7fafc',
+                    'padding': '16px',
+                    'borderRadius': '8px'
+                }, children=[
+                    html.H4("Phase-Specific Advice", style={
+                        'marginBottom': '12px',
+                        'fontSize': '16px',
+                        'fontWeight': '500',
+                        'color': colors['title']
+                    }),
+                    html.Div(id='phase-advice')
+                ])
             ])
-        ])
-    ]),
+        ]),
     
-    # Main content area
-    html.Div(style={'display': 'flex', 'flexWrap': 'wrap', 'gap': '20px'}, children=[
-        # Left panel - Performance by Cycle Phase
+        # Second row
         html.Div(style={
-            'flex': '1', 
-            'minWidth': '350px', 
-            'backgroundColor': colors['panel'], 
-            'padding': '24px', 
-            'borderRadius': '10px', 
-            'boxShadow': '0 4px 8px rgba(0, 0, 0, 0.1)',
-            'border': f'1px solid {colors["border"]}'
+            'display': 'flex', 
+            'flexWrap': 'wrap', 
+            'gap': '20px', 
+            'marginTop': '20px'
         }, children=[
-            html.H3("Your Performance Across Cycle Phases", style={
-                'marginBottom': '20px',
-                'color': colors['title'],
-                'fontWeight': '600',
-                'fontSize': '18px'
-            }),
-            dcc.Graph(id='cycle-performance-radar'),
+            # Survey data visualization
             html.Div(style={
-                'marginTop': '16px',
-                'backgroundColor': '#f7fafc',
-                'padding': '12px',
-                'borderRadius': '8px'
+                'flex': '2', 
+                'minWidth': '350px', 
+                'backgroundColor': colors['panel'], 
+                'padding': '24px', 
+                'borderRadius': '10px', 
+                'boxShadow': '0 4px 8px rgba(0, 0, 0, 0.1)',
+                'border': f'1px solid {colors["border"]}'
             }, children=[
-                html.H4("Phase Selection", style={
-                    'marginBottom': '8px',
-                    'fontSize': '16px',
-                    'fontWeight': '500',
-                    'color': colors['title']
+                html.H3("Athletic Performance Impact Analysis", style={
+                    'marginBottom': '12px',
+                    'color': colors['title'],
+                    'fontWeight': '600',
+                    'fontSize': '18px'
+                }),
+                html.P(id='impact-respondents', style={
+                    'fontSize': '14px', 
+                    'color': '#718096', 
+                    'marginBottom': '20px'
+                }),
+                dcc.Dropdown(
+                    id='impact-selection',
+                    options=[
+                        {'label': label, 'value': label}
+                        for label in [
+                            'Energy Fluctuations', 
+                            'Strength/Endurance Changes', 
+                            'Fatigue/Soreness',
+                            'High Intensity Capability',
+                            'Recovery Time Change',
+                            'Motivation Impact'
+                        ]
+                    ],
+                    value='Energy Fluctuations',
+                    clearable=False,
+                    style={
+                        'marginBottom': '16px',
+                        'borderRadius': '6px',
+                        'border': f'1px solid {colors["border"]}',
+                    }
+                ),
+                dcc.Dropdown(
+                    id='cohort-filters',
+                    options=[
+                        {'label': f"{question}: {response_mapping[answer]}", 'value': f"{question}|{answer}"}
+                        for question in correlation_engine.columns
+                        for answer in response_mapping
+                    ],
+                    multi=True,
+                    placeholder="Filter respondents by their other answers...",
+                    style={
+                        'marginBottom': '16px',
+                        'borderRadius': '6px',
+                        'border': f'1px solid {colors["border"]}',
+                    }
+                ),
+                dcc.Graph(id='impact-distribution')
+            ]),
+        
+            # Correlations and insights
+            html.Div(style={
+                'flex': '1', 
+                'minWidth': '350px', 
+                'backgroundColor': colors['panel'], 
+                'padding': '24px', 
+                'borderRadius': '10px', 
+                'boxShadow': '0 4px 8px rgba(0, 0, 0, 0.1)',
+                'border': f'1px solid {colors["border"]}'
+            }, children=[
+                html.H3("Performance Insights", style={
+                    'marginBottom': '12px',
+                    'color': colors['title'],
+                    'fontWeight': '600',
+                    'fontSize': '18px'
                 }),
                 dcc.RadioItems(
-                    id='phase-selection',
-                    options=[{'label': phase, 'value': phase} for phase in user_df['Phase'].unique()],
-                    value='Luteal',
+                    id='correlation-method',
+                    options=[{'label': label, 'value': method} for method, label in CORRELATION_METHODS.items()],
+                    value='spearman',
                     inline=True,
-                    style={
-                        'display': 'flex',
-                        'justifyContent': 'space-between'
-                    },
                     className='custom-radio'
-                )
+                ),
+                dcc.Graph(id='correlations-heatmap'),
+                html.Div(style={
+                    'marginTop': '16px', 
+                    'padding': '16px', 
+                    'backgroundColor': '#f7fafc', 
+                    'borderRadius': '8px',
+                    'border': f'1px solid {colors["border"]}'
+                }, children=[
+                    html.H4("Key Findings", style={
+                        'marginBottom': '12px',
+                        'fontSize': '16px',
+                        'fontWeight': '500',
+                        'color': colors['title']
+                    }),
+                    html.Ul([
+                        html.Li("75% of athletes experience energy fluctuations across their cycle", 
+                               style={'marginBottom': '6px', 'lineHeight': '1.5'}),
+                        html.Li("Fatigue and recovery time are closely correlated",
+                               style={'marginBottom': '6px', 'lineHeight': '1.5'}),
+                        html.Li("Strength variations are most pronounced during the menstrual phase",
+                               style={'marginBottom': '6px', 'lineHeight': '1.5'})
+                    ], style={'paddingLeft': '20px'})
+                ])
             ])
         ]),
-        
-        # Right panel - Recommendations and training adjustments
+    
+        # Survey answers broken down by age and BMI band
         html.Div(style={
-            'flex': '1', 
-            'minWidth': '350px', 
             'backgroundColor': colors['panel'], 
             'padding': '24px', 
+            'marginTop': '20px', 
             'borderRadius': '10px', 
             'boxShadow': '0 4px 8px rgba(0, 0, 0, 0.1)',
             'border': f'1px solid {colors["border"]}'
         }, children=[
-            html.H3("Recommended Training Adjustments", style={
-                'marginBottom': '20px',
+            html.H3("Impact by Age and BMI", style={
+                'marginBottom': '16px',
                 'color': colors['title'],
                 'fontWeight': '600',
                 'fontSize': '18px'
             }),
-            dcc.Graph(id='training-recommendations'),
             html.Div(style={
-                'marginTop': '16px',
-                'backgroundColor': '#f7fafc',
-                'padding': '16px',
-                'borderRadius': '8px'
+                'display': 'flex',
+                'flexWrap': 'wrap',
+                'gap': '20px',
+                'alignItems': 'center',
+                'marginBottom': '16px'
             }, children=[
-                html.H4("Phase-Specific Advice", style={
-                    'marginBottom': '12px',
-                    'fontSize': '16px',
-                    'fontWeight': '500',
-                    'color': colors['title']
-                }),
-                html.Div(id='phase-advice')
-            ])
-        ])
-    ]),
-    
-    # Second row
-    html.Div(style={
-        'display': 'flex', 
-        'flexWrap': 'wrap', 
-        'gap': '20px', 
-        'marginTop': '20px'
-    }, children=[
-        # Survey data visualization
+                dcc.Dropdown(
+                    id='strata-question',
+                    options=[{'label': label, 'value': label} for label in correlation_engine.columns],
+                    value='Fatigue/Soreness',
+                    clearable=False,
+                    style={
+                        'minWidth': '300px',
+                        'borderRadius': '6px',
+                        'border': f'1px solid {colors["border"]}',
+                    }
+                ),
+                dcc.RadioItems(
+                    id='strata-dimension',
+                    options=[{'label': STRATA_LABELS[dimension], 'value': dimension} for dimension in STRATA_DIMENSIONS],
+                    value='age',
+                    inline=True,
+                    className='custom-radio'
+                )
+            ]),
+            dcc.Graph(id='strata-distribution')
+        ]),
+    
+        # The athlete's own answers ranked against the survey
         html.Div(style={
-            'flex': '2', 
-            'minWidth': '350px', 
             'backgroundColor': colors['panel'], 
             'padding': '24px', 
+            'marginTop': '20px', 
             'borderRadius': '10px', 
             'boxShadow': '0 4px 8px rgba(0, 0, 0, 0.1)',
             'border': f'1px solid {colors["border"]}'
         }, children=[
-            html.H3("Athletic Performance Impact Analysis", style={
+            html.H3("Where You Stand", style={
                 'marginBottom': '12px',
                 'color': colors['title'],
                 'fontWeight': '600',
                 'fontSize': '18px'
             }),
-            html.P("Based on survey of 361 recreational athletes", style={
+            html.P("Answer the Impact Score questions to see how your experience compares with the surveyed "
+                   "athletes. Add your age and BMI to compare with athletes in the same bands.", style={
                 'fontSize': '14px', 
                 'color': '#718096', 
-                'marginBottom': '20px'
+                'marginBottom': '16px'
             }),
-            dcc.Dropdown(
-                id='impact-selection',
-                options=[
-                    {'label': label, 'value': label}
-                    for label in [
-                        'Energy Fluctuations', 
-                        'Strength/Endurance Changes', 
-                        'Fatigue/Soreness',
-                        'High Intensity Capability',
-                        'Recovery Time Change',
-                        'Motivation Impact'
-                    ]
-                ],
-                value='Energy Fluctuations',
-                clearable=False,
-                style={
-                    'marginBottom': '16px',
-                    'borderRadius': '6px',
-                    'border': f'1px solid {colors["border"]}',
-                }
-            ),
-            dcc.Graph(id='impact-distribution')
+            html.Div(style={
+                'display': 'flex',
+                'flexWrap': 'wrap',
+                'gap': '20px'
+            }, children=[
+                html.Div(style={'flex': '1', 'minWidth': '300px'}, children=[
+                    html.Div(style={'marginBottom': '12px'}, children=[
+                        html.Label(question, style={
+                            'display': 'block',
+                            'fontSize': '14px',
+                            'fontWeight': '500',
+                            'color': colors['title'],
+                            'marginBottom': '4px'
+                        }),
+                        dcc.RadioItems(
+                            id=f'rank-answer-{i}',
+                            options=[{'label': label, 'value': answer} for answer, label in response_mapping.items()],
+                            value=2,
+                            inline=True,
+                            className='custom-radio'
+                        )
+                    ]) for i, question in enumerate(RANKED_QUESTIONS)
+                ] + [
+                    html.Div(style={'display': 'flex', 'gap': '12px'}, children=[
+                        dcc.Input(id='rank-age', type='number', placeholder="Age", min=10, max=80, debounce=True,
+                                  style={'width': '100px', 'padding': '6px', 'borderRadius': '6px',
+                                         'border': f'1px solid {colors["border"]}'}),
+                        dcc.Input(id='rank-bmi', type='number', placeholder="BMI", min=10, max=60, step=0.1,
+                                  debounce=True,
+                                  style={'width': '100px', 'padding': '6px', 'borderRadius': '6px',
+                                         'border': f'1px solid {colors["border"]}'})
+                    ])
+                ]),
+                html.Div(style={'flex': '2', 'minWidth': '350px'}, children=[
+                    html.P(id='percentile-summary', style={
+                        'fontSize': '14px',
+                        'lineHeight': '1.5',
+                        'marginBottom': '8px'
+                    }),
+                    dcc.Graph(id='percentile-ranking')
+                ])
+            ])
         ]),
-        
-        # Correlations and insights
+    
+        # Bottom panel - Cycle phase calendar
         html.Div(style={
-            'flex': '1', 
-            'minWidth': '350px', 
             'backgroundColor': colors['panel'], 
             'padding': '24px', 
+            'marginTop': '20px', 
             'borderRadius': '10px', 
             'boxShadow': '0 4px 8px rgba(0, 0, 0, 0.1)',
             'border': f'1px solid {colors["border"]}'
         }, children=[
-            html.H3("Performance Insights", style={
-                'marginBottom': '12px',
+            html.H3("Your Cycle-Based Training Planner", style={
+                'marginBottom': '16px',
                 'color': colors['title'],
                 'fontWeight': '600',
                 'fontSize': '18px'
             }),
-            dcc.Graph(id='correlations-heatmap'),
-            html.Div(style={
-                'marginTop': '16px', 
-                'padding': '16px', 
-                'backgroundColor': '#f7fafc', 
-                'borderRadius': '8px',
-                'border': f'1px solid {colors["border"]}'
-            }, children=[
-                html.H4("Key Findings", style={
-                    'marginBottom': '12px',
-                    'fontSize': '16px',
-                    'fontWeight': '500',
-                    'color': colors['title']
-                }),
-                html.Ul([
-                    html.Li("75% of athletes experience energy fluctuations across their cycle", 
-                           style={'marginBottom': '6px', 'lineHeight': '1.5'}),
-                    html.Li("Fatigue and recovery time are closely correlated",
-                           style={'marginBottom': '6px', 'lineHeight': '1.5'}),
-                    html.Li("Strength variations are most pronounced during the menstrual phase",
-                           style={'marginBottom': '6px', 'lineHeight': '1.5'})
-                ], style={'paddingLeft': '20px'})
-            ])
+            dcc.Graph(id='training-planner')
         ])
-    ]),
-    
-    # Bottom panel - Cycle phase calendar
-    html.Div(style={
-        'backgroundColor': colors['panel'], 
-        'padding': '24px', 
-        'marginTop': '20px', 
-        'borderRadius': '10px', 
-        'boxShadow': '0 4px 8px rgba(0, 0, 0, 0.1)',
-        'border': f'1px solid {colors["border"]}'
-    }, children=[
-        html.H3("Your Cycle-Based Training Planner", style={
-            'marginBottom': '16px',
-            'color': colors['title'],
-            'fontWeight': '600',
-            'fontSize': '18px'
-        }),
-        dcc.Graph(id='training-planner')
     ])
-])
+
+# In server-render mode the page callbacks' initial outputs are embedded in the
+# served layout, so a page load is one layout request instead of a request per
+# callback. Set CYCLEPERFORM_SERVER_RENDER=0 to let the browser fire them instead.
+SERVER_RENDER = os.environ.get('CYCLEPERFORM_SERVER_RENDER', '1') != '0'
+
+# In clientside mode, switching phase-selection redraws the radar chart, workout
+# bars and advice in the browser from the phase-data store (assets/phase_switching.js)
+# instead of calling the server. Set CYCLEPERFORM_CLIENTSIDE_PHASES=0 to disable.
+CLIENTSIDE_PHASES = os.environ.get('CYCLEPERFORM_CLIENTSIDE_PHASES', '1') != '0'
+
+# (callback, input ids, output (id, property) pairs) for every page callback
+page_callbacks = []
+
+# app.callback for callbacks whose initial output serve_layout() renders.
+# clientside: (function in the dash_clientside.phases namespace, its inputs)
+# to register instead of the server callback in clientside mode; the server
+# function still renders the initial output.
+def page_callback(outputs, inputs, clientside=None):
+    def register(func):
+        func = callback_metrics.instrument(func)
+        output_list = outputs if isinstance(outputs, list) else [outputs]
+        page_callbacks.append((
+            func,
+            [i.component_id for i in inputs],
+            [(o.component_id, o.component_property) for o in output_list],
+            isinstance(outputs, list)
+        ))
+        if clientside is not None and CLIENTSIDE_PHASES:
+            function_name, clientside_inputs = clientside
+            app.clientside_callback(ClientsideFunction('phases', function_name), outputs, clientside_inputs,
+                                    prevent_initial_call=SERVER_RENDER)
+            return func
+        return app.callback(outputs, inputs, prevent_initial_call=SERVER_RENDER)(func)
+    return register
+
+# Inputs of the clientside phase callbacks
+phase_data_inputs = [Input('phase-selection', 'value'), Input('phase-data', 'data')]
+
+# Callback for the current status panel
+# Reads the precomputed forecast only; the model runs nightly, not per page view
+@page_callback(
+    [Output('current-phase', 'children'),
+     Output('current-phase', 'style'),
+     Output('cycle-day', 'children'),
+     Output('cycle-day', 'style'),
+     Output('cycle-forecast', 'children')],
+    [Input('athlete-id', 'value')]
+)
+def update_current_status(athlete_id):
+    forecast = forecaster.get_forecast(get_twin(athlete_id).athlete_id)
+    if forecast is None:
+        return ("No cycle history", current_phase_style(colors['text']), "Log a period start",
+                cycle_day_style(colors['text']), "Based on your cycle history and symptoms")
+    
+    color = phase_colors[forecast['phase']]
+    next_start = forecast['next_starts'][0]
+    next_date = datetime.date.fromisoformat(next_start['date'])
+    return (
+        f"{forecast['phase']} Phase",
+        current_phase_style(color),
+        f"Day {forecast['cycle_day']} of {forecast['cycle_length']}",
+        cycle_day_style(color),
+        f"Next cycle expected {next_date:%b %d} (± {max(round(next_start['sd_days']), 1)} days), based on your cycle history"
+    )
+
+# Callback for the readiness dial
+# Reads the precomputed score only; scoring runs nightly and when inputs are logged
+@page_callback(
+    [Output('readiness-score', 'children'),
+     Output('readiness-score', 'style'),
+     Output('readiness-label', 'children')],
+    [Input('athlete-id', 'value')]
+)
+def update_readiness(athlete_id):
+    readiness = readiness_engine.get_readiness(get_twin(athlete_id).athlete_id)
+    if readiness is None:
+        return "--", readiness_dial_style(colors['text']), "Log sleep, HRV and soreness"
+    return f"{readiness['score']}%", readiness_dial_style(readiness['color']), readiness['label']
+
+# Everything the browser needs to redraw the phase-driven panels for an
+# athlete: their phase profile, the workouts and advice, and the chart layouts
+@page_callback(
+    Output('phase-data', 'data'),
+    [Input('athlete-id', 'value')]
+)
+@figure_cache.memoize(key=lambda athlete_id: (get_twin(athlete_id).metrics.tobytes(), cohort_key()))
+def update_phase_data(athlete_id):
+    from planner import phase_workouts
+    from twin_store import cycle_phases, phase_metrics
+    
+    if not CLIENTSIDE_PHASES:
+        return None
+    twin = get_twin(athlete_id)
+    cohort_profile = get_cohort_profile()
+    return {
+        'phases': cycle_phases,
+        'metrics': phase_metrics,
+        'values': twin.metrics.tolist(),
+        'cohort': cohort_profile.tolist() if cohort_profile is not None else None,
+        'colors': phase_colors,
+        'cohort_color': colors['text'],
+        'workouts': phase_workouts,
+        'advice': phase_advice,
+        'radar_layout': update_radar_chart(cycle_phases[0], twin.athlete_id)['layout'],
+        'recommendations_layout': update_training_recommendations(cycle_phases[0])['layout']
+    }
 
 # Callback for the radar chart
-@app.callback(
+@page_callback(
     Output('cycle-performance-radar', 'figure'),
-    [Input('phase-selection', 'value')]
+    [Input('phase-selection', 'value'),
+     Input('athlete-id', 'value')],
+    clientside=('radar', phase_data_inputs)
 )
-def update_radar_chart(selected_phase):
-    # Filter data for the selected phase
-    phase_data = user_df[user_df['Phase'] == selected_phase].iloc[0]
+@figure_cache.memoize(key=lambda selected_phase, athlete_id=None: (selected_phase, get_twin(athlete_id).metrics.tobytes(),
+                                                                   cohort_key()))
+def update_radar_chart(selected_phase, athlete_id=None):
+    from twin_store import cycle_phases, phase_metrics
+    
+    # Resolve the athlete's phase profile
+    twin = get_twin(athlete_id)
     
     # Create radar chart
-    categories = ['Energy Level', 'Strength', 'Endurance', 'Recovery', 'Recommended Intensity']
-    values = [phase_data[cat] for cat in categories]
+    categories = list(phase_metrics)
+    values = twin.phase_row(selected_phase).tolist()
     
     # Add the first value again to close the polygon
     categories = categories + [categories[0]]
     values = values + [values[0]]
     
-    # Get color for selected phase
-    phase_colors = {
-        'Menstrual': colors['accent1'],
-        'Follicular': colors['accent2'],
-        'Ovulatory': colors['accent3'],
-        'Luteal': colors['accent4']
-    }
     
     fig = go.Figure()
     
@@ -541,10 +897,9 @@ def update_radar_chart(selected_phase):
     ))
     
     # Add reference polygon for all phases
-    for phase in user_df['Phase'].unique():
+    for phase in cycle_phases:
         if phase != selected_phase:
-            phase_data = user_df[user_df['Phase'] == phase].iloc[0]
-            values = [phase_data[cat] for cat in categories[:-1]]
+            values = twin.phase_row(phase).tolist()
             values = values + [values[0]]  # Close the polygon
             
             fig.add_trace(go.Scatterpolar(
@@ -555,6 +910,17 @@ def update_radar_chart(selected_phase):
                 showlegend=False
             ))
     
+    # Median of the aligned cohort in the selected phase
+    cohort_profile = get_cohort_profile()
+    if cohort_profile is not None:
+        values = cohort_profile[cycle_phases.index(selected_phase)].tolist()
+        fig.add_trace(go.Scatterpolar(
+            r=values + [values[0]],
+            theta=categories,
+            line=dict(color=colors['text'], width=2, dash='dash'),
+            name='Cohort median'
+        ))
+    
     # Update layout
     fig.update_layout(
         polar=dict(
@@ -588,45 +954,19 @@ def update_radar_chart(selected_phase):
     return fig
 
 # Callback for the training recommendations
-@app.callback(
+@page_callback(
     Output('training-recommendations', 'figure'),
-    [Input('phase-selection', 'value')]
+    [Input('phase-selection', 'value')],
+    clientside=('recommendations', phase_data_inputs)
 )
+@figure_cache.memoize
 def update_training_recommendations(selected_phase):
-    # Create a dictionary of recommended workouts by phase
-    phase_workouts = {
-        'Menstrual': [
-            {'type': 'Light Jog', 'intensity': 50, 'duration': 25},
-            {'type': 'Recovery Walk', 'intensity': 30, 'duration': 40},
-            {'type': 'Gentle Yoga', 'intensity': 45, 'duration': 30}
-        ],
-        'Follicular': [
-            {'type': 'Hill Sprints', 'intensity': 75, 'duration': 30},
-            {'type': 'Tempo Run', 'intensity': 70, 'duration': 40},
-            {'type': 'Long Run', 'intensity': 65, 'duration': 60}
-        ],
-        'Ovulatory': [
-            {'type': 'HIIT Session', 'intensity': 90, 'duration': 35},
-            {'type': 'Race Pace Run', 'intensity': 85, 'duration': 45},
-            {'type': 'Speed Intervals', 'intensity': 95, 'duration': 30}
-        ],
-        'Luteal': [
-            {'type': 'Steady State', 'intensity': 65, 'duration': 45},
-            {'type': 'Fartlek Training', 'intensity': 70, 'duration': 35},
-            {'type': 'Cross Training', 'intensity': 60, 'duration': 40}
-        ]
-    }
+    from plotly.subplots import make_subplots
+    from planner import phase_workouts
     
     # Filter workouts for the selected phase
     workouts = phase_workouts[selected_phase]
     
-    # Get color for selected phase
-    phase_colors = {
-        'Menstrual': colors['accent1'],
-        'Follicular': colors['accent2'],
-        'Ovulatory': colors['accent3'],
-        'Luteal': colors['accent4']
-    }
     
     # Create figure with two subplots
     fig = make_subplots(rows=1, cols=2, specs=[[{"type": "bar"}, {"type": "bar"}]])
@@ -690,39 +1030,13 @@ def update_training_recommendations(selected_phase):
     return fig
 
 # Callback for the phase advice
-@app.callback(
+@page_callback(
     Output('phase-advice', 'children'),
-    [Input('phase-selection', 'value')]
+    [Input('phase-selection', 'value')],
+    clientside=('advice', phase_data_inputs)
 )
+@figure_cache.memoize
 def update_phase_advice(selected_phase):
-    # Update phase advice
-    phase_advice = {
-        'Menstrual': [
-            "Focus on gentle recovery workouts",
-            "Pay extra attention to iron-rich foods",
-            "Prioritize sleep and hydration",
-            "Consider shorter but more frequent sessions"
-        ],
-        'Follicular': [
-            "Great time to work on building strength",
-            "Your body can handle more intensity now",
-            "Good phase for trying new workout routines",
-            "Focus on skill development and technique"
-        ],
-        'Ovulatory': [
-            "Peak performance window - ideal for tests or races",
-            "Body is primed for high-intensity workouts",
-            "Recovery tends to be efficient in this phase",
-            "Good time to push for personal records"
-        ],
-        'Luteal': [
-            "Focus on maintaining rather than building",
-            "Pay attention to cooling down properly",
-            "You may need more carbohydrates for energy",
-            "Adjust expectations as fatigue may increase"
-        ]
-    }
-    
     advice = phase_advice[selected_phase]
     
     return html.Ul([
@@ -734,17 +1048,32 @@ def update_phase_advice(selected_phase):
     ], style={'paddingLeft': '20px'})
 
 # Callback for impact distribution
-@app.callback(
-    Output('impact-distribution', 'figure'),
-    [Input('impact-selection', 'value')]
+@page_callback(
+    [Output('impact-distribution', 'figure'),
+     Output('impact-respondents', 'children')],
+    [Input('impact-selection', 'value'),
+     Input('cohort-filters', 'value')]
 )
-def update_impact_distribution(selected_impact):
-    # Get the original question from our mapping
-    if selected_impact in reverse_question_mapping:
-        original_question = reverse_question_mapping[selected_impact]
-        
-        # Count values
-        value_counts = df[original_question].value_counts().sort_index()
+def update_impact_distribution(selected_impact, cohort_filters=None):
+    # Levels of one question are ORed, different questions ANDed
+    filters = parse_cohort_filters(cohort_filters)
+    if filters:
+        respondents = f"{cohort_index.count(filters)} of {cohort_index.n_rows} surveyed athletes match the filters"
+    else:
+        respondents = f"Based on survey of {answer_index.n_rows} recreational athletes"
+    
+    # Filtering on one question: test whether the answers depend on it
+    if len(filters) == 1 and selected_impact in survey_statistics.columns:
+        test = survey_statistics.chi_square(selected_impact, next(iter(filters)))
+        if test['dof'] > 0:
+            respondents += f" (χ²({test['dof']}) = {test['statistic']:.1f}, p = {test['p_value']:.3g})"
+    
+    if selected_impact in answer_index.columns:
+        # Read the precomputed counts, or intersect the cohort bitmaps
+        if filters:
+            value_counts = cohort_index.value_counts(selected_impact, filters)
+        else:
+            value_counts = answer_index.value_counts(selected_impact)
         
         # Map numeric values to labels for better understanding
         labels = {1: "High Impact", 2: "Moderate Impact", 3: "Low Impact"}
@@ -752,6 +1081,19 @@ def update_impact_distribution(selected_impact):
         # Create colors list based on impact level
         colors_list = ['#ff6b6b', '#feca57', '#1dd1a1']
         
+        # Bootstrap interval for each count; precomputed without filters or
+        # with answers to a single question
+        error_y = None
+        if len(filters) <= 1:
+            cohort, answers = next(iter(filters.items()), (None, None))
+            lower, upper = survey_statistics.count_interval(selected_impact, cohort, answers)
+            error_y = dict(
+                type='data',
+                array=(upper - value_counts).clip(lower=0).values,
+                arrayminus=(value_counts - lower).clip(lower=0).values,
+                color='#718096'
+            )
+        
         # Create the bar chart
         fig = go.Figure()
         
@@ -760,12 +1102,13 @@ def update_impact_distribution(selected_impact):
             y=value_counts.values,
             marker_color=colors_list,
             text=value_counts.values,
-            textposition='auto'
+            textposition='auto',
+            error_y=error_y
         ))
         
         # Update layout
         fig.update_layout(
-            title=f"Distribution of {selected_impact}",
+            title=f"Distribution of {selected_impact}" + (" (filtered)" if filters else ""),
             title_font=dict(size=16, color=colors['title'], family="system-ui, -apple-system, Segoe UI, Roboto"),
             xaxis_title="Impact Level",
             yaxis_title="Number of Athletes",
@@ -787,17 +1130,149 @@ def update_impact_distribution(selected_impact):
             )
         )
         
-        return fig
+        return fig, respondents
     
     # Fallback if mapping not found
-    return go.Figure()
+    return go.Figure(), respondents
+
+# Callback for the age/BMI breakdown
+# Reads the precomputed per-band aggregates instead of grouping the responses
+@page_callback(
+    Output('strata-distribution', 'figure'),
+    [Input('strata-question', 'value'),
+     Input('strata-dimension', 'value')]
+)
+def update_strata_distribution(question, dimension):
+    from plotly.subplots import make_subplots
+    from survey_schema import response_mapping
+    
+    if question not in strata_index.columns:
+        return go.Figure()
+    table = strata_index.summary(dimension or 'age', question)
+    answered = table[list(response_mapping)].sum(axis=1).replace(0, 1)
+    
+    fig = make_subplots(specs=[[{"secondary_y": True}]])
+    
+    # Share of each band giving each answer, stacked to 100%
+    for answer, color in zip(response_mapping, ['#ff6b6b', '#feca57', '#1dd1a1']):
+        fig.add_trace(go.Bar(
+            x=table.index,
+            y=100 * table[answer] / answered,
+            name=response_mapping[answer],
+            marker_color=color,
+            customdata=table[answer],
+            hovertemplate="%{x}: %{y:.0f}% (%{customdata} athletes)<extra>" + response_mapping[answer] + "</extra>"
+        ), secondary_y=False)
+    
+    # Mean Impact Score per band (1 = high impact, 3 = low)
+    fig.add_trace(go.Scatter(
+        x=table.index,
+        y=table['mean_impact_score'],
+        name="Mean Impact Score",
+        mode='lines+markers',
+        line=dict(color=colors['title'], width=2),
+        customdata=table['respondents'],
+        hovertemplate="%{x}: %{y:.2f} (%{customdata} athletes)<extra></extra>"
+    ), secondary_y=True)
+    
+    fig.update_layout(
+        title=f"{question} by {STRATA_LABELS[dimension or 'age']}",
+        title_font=dict(size=16, color=colors['title'], family="system-ui, -apple-system, Segoe UI, Roboto"),
+        barmode='stack',
+        height=350,
+        margin=dict(l=40, r=40, t=60, b=40),
+        paper_bgcolor='white',
+        plot_bgcolor='white',
+        font=dict(
+            family="system-ui, -apple-system, Segoe UI, Roboto",
+            color=colors['text']
+        ),
+        legend=dict(orientation='h', y=-0.2)
+    )
+    fig.update_yaxes(title_text="Share of Athletes (%)", range=[0, 100], gridcolor='rgba(0,0,0,0.05)', secondary_y=False)
+    fig.update_yaxes(title_text="Mean Impact Score", range=[1, 3], showgrid=False, secondary_y=True)
+    
+    return fig
+
+# Callback for the percentile ranking
+# Reads the quantile sketches; nothing here scans the survey
+@page_callback(
+    [Output('percentile-ranking', 'figure'),
+     Output('percentile-summary', 'children')],
+    [Input(f'rank-answer-{i}', 'value') for i in range(len(RANKED_QUESTIONS))] +
+    [Input('rank-age', 'value'),
+     Input('rank-bmi', 'value')]
+)
+def update_percentile_ranking(*values):
+    *answers, age, bmi = values
+    answers = {question: answer for question, answer in zip(RANKED_QUESTIONS, answers) if answer is not None}
+    ranking = percentile_index.rank(answers, age, bmi)
+    
+    rows = ([('Impact Score', ranking['impact_score'])] if ranking['impact_score'] else []) + \
+        list(ranking['questions'].items())
+    labels = [label for label, _ in rows]
+    
+    fig = go.Figure()
+    fig.add_trace(go.Bar(
+        y=labels,
+        x=[entry['percentile'] for _, entry in rows],
+        orientation='h',
+        name="All surveyed athletes",
+        marker_color=colors['button'],
+        hovertemplate="%{y}: percentile %{x:.0f}<extra>All athletes</extra>"
+    ))
+    
+    stratum = ranking['stratum']
+    if stratum:
+        group = " and ".join(f"{label} {name}" for label, name in
+                             ((stratum['age'], "age band"), (stratum['bmi'], "BMI band")) if label)
+        fig.add_trace(go.Bar(
+            y=labels,
+            x=[entry['stratum_percentile'] for _, entry in rows],
+            orientation='h',
+            name=f"Athletes in the {group}",
+            marker_color=colors['accent3'],
+            hovertemplate="%{y}: percentile %{x:.0f}<extra>Your group</extra>"
+        ))
+    
+    fig.update_layout(
+        barmode='group',
+        height=350,
+        margin=dict(l=40, r=40, t=20, b=40),
+        paper_bgcolor='white',
+        plot_bgcolor='white',
+        font=dict(
+            family="system-ui, -apple-system, Segoe UI, Roboto",
+            color=colors['text']
+        ),
+        xaxis=dict(
+            title="Percentile (lower = stronger impact)",
+            range=[0, 100],
+            gridcolor='rgba(0,0,0,0.05)'
+        ),
+        yaxis=dict(autorange='reversed'),
+        legend=dict(orientation='h', y=-0.25)
+    )
+    
+    score = ranking['impact_score']
+    if score is None or score['percentile'] is None:
+        return fig, "Answer at least one question to see where you stand."
+    summary = (f"Your Impact Score is {score['value']:.2f}, at the {ordinal(score['percentile'])} percentile "
+               f"of {percentile_index.n_rows} surveyed athletes")
+    if stratum and score['stratum_percentile'] is not None:
+        summary += (f" and the {ordinal(score['stratum_percentile'])} among the {stratum['respondents']} "
+                    f"in the {group}")
+    return fig, summary + ". Lower scores mean a stronger impact of the cycle on training."
 
 # Callback for correlations heatmap
-@app.callback(
+@page_callback(
     Output('correlations-heatmap', 'figure'),
-    [Input('dummy-input', 'children')]  # Dummy input to trigger on load
+    [Input('correlation-method', 'value')]
 )
-def update_correlations_heatmap(dummy):
+def update_correlations_heatmap(method):
+    import numpy as np
+    from correlation_engine import CORRELATION_METHODS
+    
     # Select key performance metrics
     performance_metrics = [
         'Energy Fluctuations', 
@@ -808,16 +1283,11 @@ def update_correlations_heatmap(dummy):
         'Motivation Impact'
     ]
     
-    # Create a dummy correlation matrix (in a real app, calculate this from actual data)
-    # These correlations are simulated based on our limited analysis
-    correlation_matrix = np.array([
-        [1.00, 0.58, 0.47, 0.52, 0.35, 0.30],  # Energy Fluctuations
-        [0.58, 1.00, 0.43, 0.65, 0.38, 0.25],  # Strength/Endurance
-        [0.47, 0.43, 1.00, 0.39, 0.68, 0.42],  # Fatigue/Soreness
-        [0.52, 0.65, 0.39, 1.00, 0.41, 0.33],  # High Intensity
-        [0.35, 0.38, 0.68, 0.41, 1.00, 0.29],  # Recovery Time
-        [0.30, 0.25, 0.42, 0.33, 0.29, 1.00]   # Motivation
-    ])
+    # Pull the metrics' rows/columns out of the engine's full matrix
+    indices = [correlation_engine.columns.index(metric) for metric in performance_metrics]
+    correlation_matrix = correlation_engine.matrix(method or 'spearman')[np.ix_(indices, indices)]
+    lower, upper = survey_statistics.correlation_interval(method or 'spearman')
+    interval = np.dstack([lower[np.ix_(indices, indices)], upper[np.ix_(indices, indices)]])
     
     # Create the heatmap
     fig = go.Figure(data=go.Heatmap(
@@ -828,12 +1298,17 @@ def update_correlations_heatmap(dummy):
         zmin=-1, zmax=1,
         text=correlation_matrix,
         texttemplate='%{text:.2f}',
+        customdata=interval,
+        hovertemplate=(
+            "%{y} / %{x}<br>%{z:.2f} "
+            f"({survey_statistics.confidence:.0%} CI " "%{customdata[0]:.2f} to %{customdata[1]:.2f})<extra></extra>"
+        ),
         colorbar=dict(title='Correlation')
     ))
     
     # Update layout
     fig.update_layout(
-        title="Correlation Between Performance Metrics",
+        title=f"Correlation Between Performance Metrics ({CORRELATION_METHODS[method or 'spearman']})",
         title_font=dict(size=16, color=colors['title'], family="system-ui, -apple-system, Segoe UI, Roboto"),
         height=350,
         margin=dict(l=10, r=10, t=50, b=10),
@@ -854,103 +1329,67 @@ def update_correlations_heatmap(dummy):
     return fig
 
 # Callback for training planner
-@app.callback(
+@page_callback(
     Output('training-planner', 'figure'),
-    [Input('dummy-input-2', 'children')]  # Dummy input to trigger on load
+    [Input('athlete-id', 'value')]
 )
-def update_training_planner(dummy):
-    # Create calendar data for next 28 days (one cycle)
-    # In a real app, this would be calculated based on the user's cycle tracking
-    days = list(range(1, 29))
-    
-    # Assign phases - this is simplified; would be personalized in real app
-    phases = ['Menstrual'] * 5 + ['Follicular'] * 9 + ['Ovulatory'] * 3 + ['Luteal'] * 11
-    
-    # Assign recommended workout types
-    workout_types = []
-    for phase in phases:
-        if phase == 'Menstrual':
-            workout_types.append(np.random.choice(['Light Jog', 'Recovery Walk', 'Gentle Yoga']))
-        elif phase == 'Follicular':
-            workout_types.append(np.random.choice(['Hill Sprints', 'Tempo Run', 'Long Run']))
-        elif phase == 'Ovulatory':
-            workout_types.append(np.random.choice(['HIIT Session', 'Race Pace Run', 'Speed Intervals']))
-        else:  # Luteal
-            workout_types.append(np.random.choice(['Steady State', 'Fartlek Training', 'Cross Training']))
-    
-    # Assign intensity levels (0-100)
-    intensity_levels = []
-    for phase in phases:
-        if phase == 'Menstrual':
-            intensity_levels.append(np.random.randint(30, 60))
-        elif phase == 'Follicular':
-            intensity_levels.append(np.random.randint(60, 80))
-        elif phase == 'Ovulatory':
-            intensity_levels.append(np.random.randint(80, 100))
-        else:  # Luteal
-            intensity_levels.append(np.random.randint(50, 75))
+@figure_cache.memoize(key=lambda athlete_id: (get_twin(athlete_id).athlete_id, get_twin(athlete_id).phase_lengths.tobytes()))
+def update_training_planner(athlete_id):
+    import numpy as np
+    import pandas as pd
+    from planner import athlete_key, generate_plans, plan_workout_names
+    from twin_store import cycle_phases
+    
+    # Plan one full cycle for the athlete, using their own phase lengths
+    # The plan is deterministic per athlete, so the figure can be cached
+    twin = get_twin(athlete_id)
+    cycle_length = twin.cycle_length
+    plan = generate_plans([athlete_key(twin.athlete_id)], cycle_length, cycle_length,
+                          phase_lengths=twin.phase_lengths[None, :])
     
     # Create a DataFrame for the calendar
     calendar_df = pd.DataFrame({
-        'Day': days,
-        'Phase': phases,
-        'Workout': workout_types,
-        'Intensity': intensity_levels
+        'Day': plan['cycle_day'][0],
+        'Phase': np.array(cycle_phases)[plan['phase'][0]],
+        'Workout': plan_workout_names(plan)[0],
+        'Intensity': plan['intensity'][0]
     })
     
-    # Define colors for each phase
-    phase_colors = {
-        'Menstrual': colors['accent1'],
-        'Follicular': colors['accent2'],
-        'Ovulatory': colors['accent3'],
-        'Luteal': colors['accent4']
-    }
     
     # Create color-coded calendar
     fig = go.Figure()
     
-    # Add color bands for phases
-    current_phase = None
-    phase_start = 0
-    
-    for i, phase in enumerate(phases):
-        if phase != current_phase:
-            if current_phase is not None:
-                # Add a colored rectangle for the previous phase
-                # Convert hex color to rgba for transparency
-                hex_color = phase_colors[current_phase].lstrip('#')
-                r, g, b = tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
-                rgba_color = f'rgba({r}, {g}, {b}, 0.3)'  # 0.3 for 30% transparency
-                
-                fig.add_shape(
-                    type="rect",
-                    x0=phase_start - 0.5,
-                    x1=i - 0.5,
-                    y0=-0.5,
-                    y1=1.5,
-                    fillcolor=rgba_color,
-                    line=dict(width=0),
-                    layer="below"
-                )
-            current_phase = phase
-            phase_start = i
-    
-    # Add the last phase
-    # Convert hex color to rgba for transparency for the last phase
-    hex_color = phase_colors[current_phase].lstrip('#')
-    r, g, b = tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
-    rgba_color = f'rgba({r}, {g}, {b}, 0.3)'  # 0.3 for 30% transparency
-    
-    fig.add_shape(
-        type="rect",
-        x0=phase_start - 0.5,
-        x1=len(phases) - 0.5,
-        y0=-0.5,
-        y1=1.5,
-        fillcolor=rgba_color,
-        line=dict(width=0),
-        layer="below"
-    )
+    # Add color bands for phases, one per phase from the athlete's phase lengths
+    phase_ends = np.cumsum(twin.phase_lengths)
+    phase_starts = phase_ends - twin.phase_lengths
+    for phase, start, end in zip(cycle_phases, phase_starts, phase_ends):
+        # Convert hex color to rgba for transparency
+        hex_color = phase_colors[phase].lstrip('#')
+        r, g, b = tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
+        rgba_color = f'rgba({r}, {g}, {b}, 0.3)'  # 0.3 for 30% transparency
+        
+        fig.add_shape(
+            type="rect",
+            x0=start + 0.5,
+            x1=end + 0.5,
+            y0=-0.5,
+            y1=1.5,
+            fillcolor=rgba_color,
+            line=dict(width=0),
+            layer="below"
+        )
+        
+        # Label the phase at its first day
+        fig.add_annotation(
+            x=start + 1,
+            y=1.3,
+            text=phase,
+            showarrow=False,
+            font=dict(
+                color=phase_colors[phase],
+                size=12
+            )
+        )
     
     # Add intensity markers
     fig.add_trace(go.Scatter(
@@ -962,38 +1401,20 @@ def update_training_planner(dummy):
             color=[phase_colors[phase] for phase in calendar_df['Phase']],
             line=dict(width=1, color='white')
         ),
-        text=calendar_df.apply(lambda row: f"Day {row['Day']}<br>Phase: {row['Phase']}<br>Workout: {row['Workout']}<br>Intensity: {row['Intensity']}%", axis=1),
+        text="Day " + calendar_df['Day'].astype(str) + "<br>Phase: " + calendar_df['Phase'] +
+             "<br>Workout: " + calendar_df['Workout'] + "<br>Intensity: " + calendar_df['Intensity'].astype(str) + "%",
         hoverinfo='text'
     ))
     
-    # Add phase labels
-    phase_starts = {}
-    for i, phase in enumerate(phases):
-        if phase not in phase_starts:
-            phase_starts[phase] = i + 1  # Day number (1-indexed)
-    
-    # Add annotations for phase starts
-    for phase, day in phase_starts.items():
-        fig.add_annotation(
-            x=day,
-            y=1.3,
-            text=phase,
-            showarrow=False,
-            font=dict(
-                color=phase_colors[phase],
-                size=12
-            )
-        )
-    
     # Update layout
     fig.update_layout(
-        title="28-Day Training Calendar Based on Cycle Phases",
+        title=f"{cycle_length}-Day Training Calendar Based on Cycle Phases",
         xaxis=dict(
             title="Day of Cycle",
             tickmode='linear',
             tick0=1,
             dtick=1,
-            range=[0, 29]
+            range=[0, cycle_length + 1]
         ),
         yaxis=dict(
             showticklabels=False,
@@ -1006,10 +1427,395 @@ def update_training_planner(dummy):
     
     return fig
 
-# Add a dummy div for triggering callbacks
-app.layout.children.append(html.Div(id='dummy-input', style={'display': 'none'}))
-app.layout.children.append(html.Div(id='dummy-input-2', style={'display': 'none'}))
+# The layout with every page callback's output for the layout's initial input
+# values filled in
+def render_layout():
+    layout = copy.deepcopy(base_layout)
+    components = {c.id: c for c in layout._traverse() if isinstance(getattr(c, 'id', None), str)}
+    for func, inputs, outputs, multiple in page_callbacks:
+        result = func(*[getattr(components[i], 'value', None) for i in inputs])
+        for (component_id, prop), value in zip(outputs, result if multiple else [result]):
+            setattr(components[component_id], prop, value)
+    return layout
+
+# Layout function: the rendered layout is cached and only rebuilt when the
+# default athlete's forecast, readiness or twin changes, or the cohort curves
+# the radar is drawn against do
+def serve_layout():
+    twin = get_twin(DEFAULT_ATHLETE_ID)
+    key = (
+        json.dumps(forecaster.get_forecast(twin.athlete_id), sort_keys=True),
+        json.dumps(readiness_engine.get_readiness(twin.athlete_id), sort_keys=True),
+        twin.metrics.tobytes(),
+        twin.phase_lengths.tobytes(),
+        cohort_key()
+    )
+    return figure_cache.get_or_render('serve_layout', key, render_layout)
+
+_init_lock = threading.Lock()
+_initialized = False
+
+# Load the survey data, open the athlete stores, build the survey indexes and
+# the layout, and render the cached figures. Runs once; later calls return
+# straight away.
+def init():
+    global _initialized, survey_ingestor, df, twin_store, forecaster, alignment_engine, readiness_engine, wearable_store
+    global correlation_engine, answer_index, cohort_index, strata_index, percentile_index, survey_statistics
+    global base_layout
+    if _initialized:
+        return app
+    with _init_lock:
+        if _initialized:
+            return app
+        
+        import numpy as np
+        from answer_index import AnswerCountIndex
+        from cohort_filter import CohortBitmapIndex
+        from correlation_engine import CorrelationEngine
+        from forecaster import CycleForecaster
+        from percentile_index import PercentileIndex
+        from phase_alignment import PhaseAlignmentEngine
+        from planner import default_phase_lengths
+        from readiness import ReadinessEngine
+        from stratification import StratificationIndex
+        from survey_ingest import SurveyIngestor
+        from survey_stats import SurveyStatistics
+        from twin_store import TwinStore, cycle_phases, phase_metrics
+        from wearables import WearableStore
+        
+        # Load the data
+        survey_ingestor = SurveyIngestor(SURVEY_SOURCE)
+        df, question_labels = load_data()
+        
+        # Per-athlete phase profiles (SQLite, with an in-memory LRU in front)
+        twin_store = TwinStore()
+        
+        # Period-start history and precomputed phase forecasts
+        forecaster = CycleForecaster(twin_store.db_path)
+        
+        # Seed the demo athlete with six regular 28-day cycles, the latest starting 21 days ago
+        if forecaster.get_forecast(DEFAULT_ATHLETE_ID) is None:
+            for cycles_ago in range(6, -1, -1):
+                forecaster.log_period_start(
+                    DEFAULT_ATHLETE_ID,
+                    datetime.date.today() - datetime.timedelta(days=21 + 28 * cycles_ago)
+                )
+        elif forecaster.get_forecast(DEFAULT_ATHLETE_ID)['as_of'] != datetime.date.today().isoformat():
+            # Forecasts are normally refreshed by the nightly job (python forecaster.py nightly)
+            forecaster.run_batch(athlete_ids=[DEFAULT_ATHLETE_ID])
+        
+        # Daily performance logs, aligned phase by phase over each athlete's own
+        # cycles into their twin, and the cohort's phase curves
+        alignment_engine = PhaseAlignmentEngine(twin_store.db_path, twin_store, forecaster)
+        
+        # Seed the demo athlete with daily performance over its logged cycles,
+        # simulated around a phase profile
+        if alignment_engine.daily_performance(DEFAULT_ATHLETE_ID).empty:
+            demo_user_data = {
+                'Energy Level': [60, 80, 95, 70],
+                'Strength': [65, 85, 90, 75],
+                'Endurance': [55, 75, 90, 65],
+                'Recovery': [50, 70, 85, 60],
+                'Recommended Intensity': [60, 90, 95, 75]
+            }
+            profile = np.array([demo_user_data[m] for m in phase_metrics]).T
+            rng = np.random.default_rng(0)
+            first = datetime.date.today() - datetime.timedelta(days=21 + 28 * 6)
+            days = [first + datetime.timedelta(days=n) for n in range(22 + 28 * 6)]
+            phase = (np.arange(len(days))[:, None] % 28 >= np.cumsum(default_phase_lengths(28))[:-1]).sum(axis=1)
+            values = np.clip(profile[phase] + rng.normal(0, 4, (len(days), len(phase_metrics))), 0, 100).round(1)
+            alignment_engine.log_many(
+                (DEFAULT_ATHLETE_ID, day, *row) for day, row in zip(days, values.tolist())
+            )
+            alignment_engine.run_batch(athlete_ids=[DEFAULT_ATHLETE_ID])
+        elif getattr(twin_store.get(DEFAULT_ATHLETE_ID), 'date', None) != datetime.date.today().isoformat():
+            # Twins are normally refreshed by the nightly job (python phase_alignment.py nightly)
+            alignment_engine.run_batch(athlete_ids=[DEFAULT_ATHLETE_ID])
+        
+        # Daily sleep/HRV/soreness/load inputs and precomputed readiness scores
+        readiness_engine = ReadinessEngine(twin_store.db_path, twin_store, forecaster)
+        
+        # Seed the demo athlete with six weeks of simulated daily inputs
+        if readiness_engine.get_readiness(DEFAULT_ATHLETE_ID) is None:
+            rng = np.random.default_rng(0)
+            days = [datetime.date.today() - datetime.timedelta(days=n) for n in range(41, -1, -1)]
+            readiness_engine.log_many(zip(
+                [DEFAULT_ATHLETE_ID] * len(days),
+                days,
+                np.round(rng.normal(7.4, 0.6, len(days)), 1).tolist(),
+                np.round(rng.normal(62, 5, len(days))).tolist(),
+                rng.integers(1, 6, len(days)).tolist(),
+                np.where(np.arange(len(days)) % 7 == 6, 0, np.round(rng.normal(300, 60, len(days)))).tolist()
+            ))
+            readiness_engine.run_batch(athlete_ids=[DEFAULT_ATHLETE_ID])
+        elif readiness_engine.get_readiness(DEFAULT_ATHLETE_ID)['date'] != datetime.date.today().isoformat():
+            # Scores are normally refreshed by the nightly job (python readiness.py nightly)
+            readiness_engine.run_batch(athlete_ids=[DEFAULT_ATHLETE_ID])
+        
+        # Per-minute and per-day aggregates of wearable activity and heart-rate files
+        wearable_store = WearableStore()
+        
+        # Running correlation statistics over every question; new survey rows are
+        # folded in with correlation_engine.update(rows) instead of rescanning df
+        correlation_engine = CorrelationEngine([label for label in question_labels.values() if label in df.columns])
+        correlation_engine.update(df)
+        
+        # Bootstrap confidence intervals and chi-square tests; resampled once per
+        # data version across a process pool and kept next to the survey cache
+        survey_statistics = SurveyStatistics.load_or_compute(correlation_engine, cache_dir=survey_ingestor.cache_dir)
+        
+        # Answer histograms for every question, with cohort breakdowns; new survey
+        # rows are added with answer_index.update(rows)
+        answer_index = AnswerCountIndex(correlation_engine.columns)
+        answer_index.update(df)
+        
+        # Per-(question, answer) bitmaps for slicing the survey by other answers
+        cohort_index = CohortBitmapIndex(correlation_engine.columns)
+        cohort_index.update(df)
+        
+        # Answer histograms and Impact Score totals per age/BMI band; new
+        # survey rows are added with strata_index.update(rows)
+        strata_index = StratificationIndex(correlation_engine.columns)
+        strata_index.update(df)
+        
+        # Quantile sketches of the Impact Score and answers, overall and per
+        # age/BMI band, for ranking an athlete against the survey
+        percentile_index = PercentileIndex(correlation_engine.columns)
+        percentile_index.update(df)
+        
+        base_layout = build_layout()
+        
+        # Render every phase variant up front so phase switching is a cache lookup
+        for phase_callback in (update_radar_chart, update_training_recommendations, update_phase_advice):
+            figure_cache.warm(phase_callback, cycle_phases)
+        
+        # Dash renders a layout function as soon as it is assigned
+        app.layout = serve_layout if SERVER_RENDER else base_layout
+        _initialized = True
+    return app
+
+# Initialize on the first request of a process that has not called init().
+# Dash checks the layout before every other hook on the first request, so
+# this hook goes first.
+def _init_on_first_request():
+    init()
+
+app.server.before_request_funcs.setdefault(None, []).insert(0, _init_on_first_request)
+
+# Stream training plans for a list of athletes and a date range as NDJSON, CSV
+# or Parquet, e.g. /api/planner/export?athletes=a1,a2&start=2025-01-01&end=2025-12-31&format=csv
+# Large squads can POST the same parameters as a JSON body instead
+@app.server.route('/api/planner/export', methods=['GET', 'POST'])
+def export_training_plans():
+    from planner_export import EXPORT_FORMATS, iter_plan_frames, parse_export_request, stream_plan_export
+    
+    try:
+        athletes, start, end, fmt = parse_export_request(
+            flask.request.args, flask.request.get_json(silent=True)
+        )
+    except ValueError as e:
+        return flask.jsonify({'error': str(e)}), 400
+    
+    # Align each athlete's plan with their forecast cycle, where one exists
+    cycle_starts = {athlete: cycle_start for athlete, (cycle_start, _) in forecaster.current_cycles(athletes).items()}
+    frames = iter_plan_frames(twin_store, athletes, start, end, cycle_start=cycle_starts)
+    return flask.Response(
+        flask.stream_with_context(stream_plan_export(frames, fmt)),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename=training-plans.{fmt}'}
+    )
+
+# Log a period start for an athlete: POST {"date": "YYYY-MM-DD"}
+# Returns the athlete's refreshed forecast
+@app.server.route('/api/athletes/<athlete_id>/period-starts', methods=['POST'])
+def log_period_start(athlete_id):
+    body = flask.request.get_json(silent=True) or {}
+    if not isinstance(body, dict):
+        return flask.jsonify({'error': "The request body must be a JSON object"}), 400
+    try:
+        start_date = datetime.date.fromisoformat(body.get('date', ''))
+    except (TypeError, ValueError):
+        return flask.jsonify({'error': "date must be given as YYYY-MM-DD"}), 400
+    return flask.jsonify(forecaster.log_period_start(athlete_id, start_date))
+
+# Log an athlete's daily inputs:
+# POST {"date": "YYYY-MM-DD", "sleep_hours": 7.5, "hrv": 64, "soreness": 3, "load": 320}
+# Every field but the date is optional. Returns the athlete's refreshed readiness
+@app.server.route('/api/athletes/<athlete_id>/daily-inputs', methods=['POST'])
+def log_daily_inputs(athlete_id):
+    body = flask.request.get_json(silent=True) or {}
+    if not isinstance(body, dict):
+        return flask.jsonify({'error': "The request body must be a JSON object"}), 400
+    try:
+        date = datetime.date.fromisoformat(body.get('date', ''))
+        values = {field: None if body.get(field) is None else float(body[field])
+                  for field in ('sleep_hours', 'hrv', 'soreness', 'load')}
+    except (TypeError, ValueError):
+        return flask.jsonify({'error': "date must be YYYY-MM-DD and inputs must be numbers"}), 400
+    return flask.jsonify(readiness_engine.log_daily_inputs(athlete_id, date, **values))
+
+# Log an athlete's daily performance (0-100):
+# POST {"date": "YYYY-MM-DD", "energy": 80, "strength": 85, "endurance": 75, "recovery": 70, "intensity": 90}
+# Every field but the date is optional. Returns the athlete's realigned phase profile
+@app.server.route('/api/athletes/<athlete_id>/daily-performance', methods=['POST'])
+def log_daily_performance(athlete_id):
+    body = flask.request.get_json(silent=True) or {}
+    if not isinstance(body, dict):
+        return flask.jsonify({'error': "The request body must be a JSON object"}), 400
+    try:
+        date = datetime.date.fromisoformat(body.get('date', ''))
+        values = {field: None if body.get(field) is None else float(body[field])
+                  for field in ('energy', 'strength', 'endurance', 'recovery', 'intensity')}
+    except (TypeError, ValueError):
+        return flask.jsonify({'error': "date must be YYYY-MM-DD and metrics must be numbers"}), 400
+    twin = alignment_engine.log_daily_performance(athlete_id, date, **values)
+    if twin is None:
+        return flask.jsonify({'error': "No cycle history to align this athlete's days with"}), 404
+    return flask.jsonify({
+        'date': twin.date,
+        'phase_lengths': twin.phase_lengths.tolist(),
+        'phases': json.loads(twin.to_frame().to_json(orient='records'))
+    })
+
+# Cohort performance per phase-relative bin, from the nightly alignment:
+# athletes, mean and percentiles of each metric at each point of the grid
+@app.server.route('/api/cohort/phase-curves')
+def cohort_phase_curves():
+    return flask.jsonify(json.loads(alignment_engine.cohort_curves().to_json(orient='records')))
+
+# Upload a wearable activity/heart-rate file (FIT, GPX or CSV) as the request
+# body, e.g. POST /api/athletes/a1/wearable-files?format=fit. The body is parsed
+# as it streams in; each day's training load is passed on to the readiness score.
+@app.server.route('/api/athletes/<athlete_id>/wearable-files', methods=['POST'])
+def upload_wearable_file(athlete_id):
+    from wearables import WEARABLE_FORMATS, detect_format
+    
+    try:
+        fmt = flask.request.args.get('format') or detect_format(flask.request.args.get('filename'))
+        if fmt not in WEARABLE_FORMATS:
+            raise ValueError(f"Format must be one of: {', '.join(WEARABLE_FORMATS)}")
+        daily = wearable_store.ingest(athlete_id, flask.request.stream, fmt)
+    except ValueError as e:
+        return flask.jsonify({'error': str(e)}), 400
+    
+    if len(daily):
+        readiness_engine.log_many(
+            (athlete_id, date, None, None, None, load) for date, load in zip(daily['date'], daily['load'])
+        )
+        readiness_engine.run_batch(athlete_ids=[athlete_id])
+    return flask.jsonify({'days': json.loads(daily.assign(date=daily['date'].astype(str)).to_json(orient='records'))})
+
+# An athlete's wearable aggregates averaged per cycle phase, placing days by
+# their forecast cycle
+@app.server.route('/api/athletes/<athlete_id>/wearable-phases')
+def wearable_phase_aggregates(athlete_id):
+    cycle = forecaster.current_cycles([athlete_id]).get(athlete_id)
+    if cycle is None:
+        return flask.jsonify({'error': "No cycle history for this athlete"}), 404
+    frame = wearable_store.phase_aggregates(athlete_id, *cycle)
+    return flask.jsonify(json.loads(frame.to_json(orient='records')))
+
+# Survey aggregates per age and/or BMI band, e.g.
+# /api/survey/strata?by=age,bmi&question=Fatigue/Soreness
+# Each row has the band(s), respondents, mean Impact Score and, with a
+# question, the number of respondents giving each answer
+@app.server.route('/api/survey/strata')
+def survey_strata():
+    by = [d for d in flask.request.args.get('by', 'age').split(',') if d]
+    question = flask.request.args.get('question') or None
+    try:
+        table = strata_index.summary(by, question)
+    except ValueError as e:
+        return flask.jsonify({'error': str(e)}), 400
+    except KeyError:
+        return flask.jsonify({'error': f"Unknown question: {question}"}), 404
+    table = table.rename(columns={answer: str(answer) for answer in strata_index.levels})
+    return flask.jsonify(json.loads(table.reset_index().to_json(orient='records')))
+
+# Rank an athlete's answers against the survey:
+# POST {"answers": {"Fatigue/Soreness": 1, "Motivation Impact": 2}, "age": 21, "bmi": 22.4}
+# Age and BMI are optional and add percentiles among respondents in the same bands
+@app.server.route('/api/survey/percentiles', methods=['POST'])
+def survey_percentiles():
+    body = flask.request.get_json(silent=True) or {}
+    if not isinstance(body, dict):
+        return flask.jsonify({'error': "The request body must be a JSON object"}), 400
+    answers = body.get('answers') or {}
+    # Answers are category codes: whole numbers only, never truncated
+    if not isinstance(answers, dict) or not all(
+        isinstance(answer, (int, float)) and not isinstance(answer, bool) and float(answer).is_integer()
+        for answer in answers.values()
+    ):
+        return flask.jsonify({'error': "answers must map questions to 1-3, and age and bmi must be numbers"}), 400
+    try:
+        answers = {question: int(answer) for question, answer in answers.items()}
+        age = None if body.get('age') is None else float(body['age'])
+        bmi = None if body.get('bmi') is None else float(body['bmi'])
+    except (TypeError, ValueError):
+        return flask.jsonify({'error': "answers must map questions to 1-3, and age and bmi must be numbers"}), 400
+    try:
+        return flask.jsonify(percentile_index.rank(answers, age, bmi))
+    except ValueError as e:
+        return flask.jsonify({'error': str(e)}), 400
+
+# Hit/miss counters for the figure cache
+@app.server.route('/figure-cache/stats')
+def figure_cache_stats():
+    return flask.jsonify(figure_cache.stats())
+
+# Callback metrics in Prometheus text format
+@app.server.route('/metrics')
+def metrics():
+    return flask.Response(callback_metrics.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+# Serving profiles: 'dev' runs Dash's debug server, 'prod' is for a WSGI server
+# (see wsgi.py) with compressed responses and cacheable static assets.
+# Pick one with CYCLEPERFORM_ENV. 'profiling' honours the callback profile
+# header (see callback_metrics.py); in prod only when CYCLEPERFORM_PROFILE_DIR is set.
+SERVING_CONFIGS = {
+    'dev': {'debug': True, 'compress': False, 'static_max_age': 0, 'profiling': True},
+    'prod': {'debug': False, 'compress': True, 'static_max_age': 365 * 24 * 3600, 'profiling': False}
+}
+SERVING_ENV = os.environ.get('CYCLEPERFORM_ENV', 'dev')
+
+# Configure the app for a serving profile and initialize it, so a server that
+# creates the app before forking workers (gunicorn --preload) shares one
+# read-only copy of the survey frame, indexes and cached figures between them.
+def create_app(env=None):
+    env = env or SERVING_ENV
+    if env not in SERVING_CONFIGS:
+        raise ValueError(f"Unknown serving profile {env!r}; expected one of: {', '.join(SERVING_CONFIGS)}")
+    config = SERVING_CONFIGS[env]
+    server = app.server
+    if server.config.get('CYCLEPERFORM_ENV') is not None:
+        return init()
+    server.config['CYCLEPERFORM_ENV'] = env
+    
+    profile_dir = os.environ.get('CYCLEPERFORM_PROFILE_DIR')
+    if profile_dir or config['profiling']:
+        callback_metrics.profile_dir = profile_dir or '.profiles'
+    
+    if config['compress']:
+        from flask_compress import Compress
+        server.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+        Compress(server)
+    
+    if config['static_max_age']:
+        # Asset URLs carry a modification stamp (?m=...) and component bundles a
+        # fingerprint, so browsers can keep them until they change
+        @server.after_request
+        def cache_static_assets(response):
+            if response.status_code == 200 and flask.request.path.startswith(('/assets/', '/_dash-component-suites/')):
+                response.cache_control.public = True
+                response.cache_control.max_age = config['static_max_age']
+                response.cache_control.no_cache = None
+            return response
+    
+    # Load everything and render the default page before any worker is forked
+    init()
+    serve_layout()
+    return app
 
 # Run the app
 if __name__ == '__main__':
-    app.run_server(debug=True)
\ No newline at end of file
+    create_app().run_server(debug=SERVING_CONFIGS[SERVING_ENV]['debug'])
\ No newline at end of file
@@ -0,0 +1,81 @@
+import functools
+import json
+import threading
+from collections import OrderedDict
+
+import plotly.graph_objects as go
+
+
+# Figures are stored as plain JSON-decoded dicts: Dash returns them without
+# touching plotly's object model again. Components are stored as built.
+def _freeze(value):
+    if isinstance(value, go.Figure):
+        return json.loads(value.to_json())
+    return value
+
+
+class FigureCache:
+    # Memoizes callback outputs keyed by (callback, arguments); the key must
+    # cover whatever data the output depends on. At most `max_entries` outputs
+    # are kept, least recently used first out.
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._hits = {}
+        self._misses = {}
+        self._lock = threading.Lock()
+
+    def get_or_render(self, name, key, render):
+        entry_key = (name, key)
+        with self._lock:
+            value = self._entries.get(entry_key)
+            if value is not None:
+                self._entries.move_to_end(entry_key)
+                self._hits[name] = self._hits.get(name, 0) + 1
+                return value
+
+        value = _freeze(render())
+        with self._lock:
+            self._misses[name] = self._misses.get(name, 0) + 1
+            self._entries[entry_key] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    # Decorator for callbacks that are pure functions of their inputs. `key`
+    # maps the callback arguments to the cache key (default: the arguments),
+    # e.g. to key on the data an argument resolves to rather than the argument.
+    def memoize(self, func=None, key=None):
+        if func is None:
+            return functools.partial(self.memoize, key=key)
+        name = func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            cache_key = args if key is None else key(*args)
+            return self.get_or_render(name, cache_key, lambda: func(*args))
+
+        wrapper.figure_cache = self
+        return wrapper
+
+    # Render every variant up front so the first request is already a hit
+    def warm(self, func, arg_list):
+        for args in arg_list:
+            if not isinstance(args, tuple):
+                args = (args,)
+            func(*args)
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            names = sorted(set(self._hits) | set(self._misses))
+            return {
+                'entries': len(self._entries),
+                'callbacks': {
+                    name: {'hits': self._hits.get(name, 0), 'misses': self._misses.get(name, 0)}
+                    for name in names
+                }
+            }
@@ -0,0 +1,234 @@
+import argparse
+import datetime
+import json
+
+import numpy as np
+import pandas as pd
+
+from planner import MIN_CYCLE_LENGTH, MAX_CYCLE_LENGTH, default_phase_lengths
+from twin_store import DEFAULT_DB_PATH, SQLiteStore, cycle_phases
+
+# Population prior used until an athlete has logged enough cycles
+PRIOR_CYCLE_LENGTH = 28.0
+PRIOR_CYCLE_SD = 3.0
+
+# Floor on the per-athlete spread, so a few identical cycles don't claim certainty
+MIN_CYCLE_SD = 1.0
+
+# Cycle boundaries forecast per athlete
+FORECAST_HORIZON = 3
+
+# Intervals outside this range are treated as missed logs, not cycles
+_PLAUSIBLE_INTERVAL = (MIN_CYCLE_LENGTH, MAX_CYCLE_LENGTH)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS period_starts (
+    athlete_id TEXT NOT NULL,
+    start_date TEXT NOT NULL,
+    PRIMARY KEY (athlete_id, start_date)
+);
+CREATE TABLE IF NOT EXISTS cycle_stats (
+    athlete_id TEXT PRIMARY KEY,
+    last_start TEXT NOT NULL,
+    n_cycles INTEGER NOT NULL,
+    mean_length REAL NOT NULL,
+    m2 REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cycle_forecasts (
+    athlete_id TEXT PRIMARY KEY,
+    as_of TEXT NOT NULL,
+    phase INTEGER NOT NULL,
+    cycle_day INTEGER NOT NULL,
+    cycle_length INTEGER NOT NULL,
+    cycle_length_sd REAL NOT NULL,
+    next_starts TEXT NOT NULL
+);
+"""
+
+
+# Expected cycle length and its spread from running stats, shrunk towards the
+# population prior while there are fewer than two observed cycles
+def _length_estimate(n_cycles, mean_length, m2):
+    n_cycles = np.asarray(n_cycles, dtype='float64')
+    mean_length = np.where(n_cycles > 0, mean_length, PRIOR_CYCLE_LENGTH)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sd = np.where(n_cycles > 1, np.sqrt(m2 / np.maximum(n_cycles - 1, 1)), PRIOR_CYCLE_SD)
+    return mean_length, np.maximum(sd, MIN_CYCLE_SD)
+
+
+# Vectorized forecast for many athletes from their cycle stats.
+# stats: DataFrame with athlete_id, last_start, n_cycles, mean_length, m2
+def compute_forecasts(stats, as_of, horizon=FORECAST_HORIZON):
+    as_of_ordinal = as_of.toordinal()
+    last_start = np.array([datetime.date.fromisoformat(d).toordinal() for d in stats['last_start']])
+    n_cycles = stats['n_cycles'].to_numpy(dtype='float64')
+
+    mean_length, sd = _length_estimate(n_cycles, stats['mean_length'].to_numpy(), stats['m2'].to_numpy())
+    cycle_length = np.clip(np.rint(mean_length), MIN_CYCLE_LENGTH, MAX_CYCLE_LENGTH).astype('int64')
+
+    # If the expected start has passed without a log, roll forward whole cycles
+    elapsed = np.maximum(as_of_ordinal - last_start, 0)
+    cycles_missed = elapsed // cycle_length
+    current_start = last_start + cycles_missed * cycle_length
+    cycle_day = elapsed - cycles_missed * cycle_length + 1
+
+    phase_ends = np.cumsum(default_phase_lengths(cycle_length), axis=1)[:, :-1]
+    phase = (cycle_day[:, None] > phase_ends).sum(axis=1)
+
+    # k-th next boundary: cycle-to-cycle spread grows with sqrt(k), plus the
+    # uncertainty of the estimated mean itself
+    k = np.arange(1, horizon + 1)
+    next_starts = current_start[:, None] + k * cycle_length[:, None]
+    standard_error = sd / np.sqrt(np.maximum(n_cycles, 1))
+    next_sd = np.sqrt(k * sd[:, None] ** 2 + (k * standard_error[:, None]) ** 2 + (cycles_missed[:, None] * sd[:, None]) ** 2)
+
+    return pd.DataFrame({
+        'athlete_id': stats['athlete_id'].to_numpy(),
+        'as_of': as_of.isoformat(),
+        'phase': phase,
+        'cycle_day': cycle_day,
+        'cycle_length': cycle_length,
+        'cycle_length_sd': np.round(sd, 2),
+        'next_starts': [
+            json.dumps([{'date': datetime.date.fromordinal(int(d)).isoformat(), 'sd_days': round(float(s), 1)}
+                        for d, s in zip(dates, sds)])
+            for dates, sds in zip(next_starts, next_sd)
+        ]
+    })
+
+
+class CycleForecaster(SQLiteStore):
+    # Period-start history per athlete with running cycle-length statistics.
+    # Forecasts are precomputed into cycle_forecasts (nightly for everyone, and
+    # immediately for an athlete who logs a new start), so request handlers only
+    # ever read a row.
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        super().__init__(db_path)
+        self.connection().executescript(_SCHEMA)
+
+    # Log a period start. A start after the last one updates the running stats
+    # in O(1) (Welford); a backdated start rebuilds that athlete's stats from
+    # their history. The athlete's forecast is refreshed either way.
+    def log_period_start(self, athlete_id, start_date, as_of=None):
+        conn = self.connection()
+        with conn:
+            inserted = conn.execute(
+                "INSERT OR IGNORE INTO period_starts VALUES (?, ?)", (athlete_id, start_date.isoformat())
+            ).rowcount
+            if not inserted:
+                return self.get_forecast(athlete_id)
+
+            row = conn.execute(
+                "SELECT last_start, n_cycles, mean_length, m2 FROM cycle_stats WHERE athlete_id = ?", (athlete_id,)
+            ).fetchone()
+            if row is None:
+                stats = (start_date.isoformat(), 0, 0.0, 0.0)
+            elif start_date.isoformat() > row[0]:
+                last_start, n_cycles, mean_length, m2 = row
+                interval = (start_date - datetime.date.fromisoformat(last_start)).days
+                if _PLAUSIBLE_INTERVAL[0] <= interval <= _PLAUSIBLE_INTERVAL[1]:
+                    n_cycles += 1
+                    delta = interval - mean_length
+                    mean_length += delta / n_cycles
+                    m2 += delta * (interval - mean_length)
+                stats = (start_date.isoformat(), n_cycles, mean_length, m2)
+            else:
+                stats = self._stats_from_history(athlete_id)
+
+            conn.execute("INSERT OR REPLACE INTO cycle_stats VALUES (?, ?, ?, ?, ?)", (athlete_id, *stats))
+
+        self.run_batch(as_of=as_of, athlete_ids=[athlete_id])
+        return self.get_forecast(athlete_id)
+
+    def _stats_from_history(self, athlete_id):
+        starts = [datetime.date.fromisoformat(row[0]) for row in self.connection().execute(
+            "SELECT start_date FROM period_starts WHERE athlete_id = ? ORDER BY start_date", (athlete_id,)
+        )]
+        intervals = np.diff([d.toordinal() for d in starts])
+        intervals = intervals[(intervals >= _PLAUSIBLE_INTERVAL[0]) & (intervals <= _PLAUSIBLE_INTERVAL[1])]
+        n_cycles = len(intervals)
+        mean_length = float(intervals.mean()) if n_cycles else 0.0
+        m2 = float(((intervals - mean_length) ** 2).sum()) if n_cycles else 0.0
+        return starts[-1].isoformat(), n_cycles, mean_length, m2
+
+    # Recompute forecasts for every athlete (or the given ones) as of a date,
+    # in vectorized chunks. Meant to run nightly, e.g. from cron:
+    #   python forecaster.py nightly
+    def run_batch(self, as_of=None, athlete_ids=None, chunk_size=50000):
+        as_of = as_of or datetime.date.today()
+        conn = self.connection()
+        query = "SELECT athlete_id, last_start, n_cycles, mean_length, m2 FROM cycle_stats"
+        params = ()
+        if athlete_ids is not None:
+            query += f" WHERE athlete_id IN ({', '.join('?' * len(athlete_ids))})"
+            params = tuple(athlete_ids)
+
+        written = 0
+        for stats in pd.read_sql_query(query, conn, params=params, chunksize=chunk_size):
+            forecasts = compute_forecasts(stats, as_of)
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO cycle_forecasts VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    forecasts.itertuples(index=False, name=None)
+                )
+            written += len(forecasts)
+        return written
+
+    # Precomputed forecast for an athlete, or None if they have no history
+    def get_forecast(self, athlete_id):
+        row = self.connection().execute(
+            """SELECT as_of, phase, cycle_day, cycle_length, cycle_length_sd, next_starts
+               FROM cycle_forecasts WHERE athlete_id = ?""",
+            (athlete_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        as_of, phase, cycle_day, cycle_length, cycle_length_sd, next_starts = row
+        return {
+            'as_of': as_of,
+            'phase': cycle_phases[phase],
+            'cycle_day': cycle_day,
+            'cycle_length': cycle_length,
+            'cycle_length_sd': cycle_length_sd,
+            'next_starts': json.loads(next_starts)
+        }
+
+    # Logged period starts per athlete, oldest first; athletes without any are left out
+    def period_starts(self, athlete_ids):
+        starts = {}
+        for offset in range(0, len(athlete_ids), 500):
+            batch = athlete_ids[offset:offset + 500]
+            rows = self.connection().execute(
+                f"""SELECT athlete_id, start_date FROM period_starts
+                    WHERE athlete_id IN ({', '.join('?' * len(batch))}) ORDER BY athlete_id, start_date""",
+                batch
+            )
+            for athlete_id, start_date in rows:
+                starts.setdefault(athlete_id, []).append(datetime.date.fromisoformat(start_date))
+        return starts
+
+    # Start date and length of each athlete's current cycle, from the precomputed forecasts
+    def current_cycles(self, athlete_ids):
+        cycles = {}
+        for offset in range(0, len(athlete_ids), 500):
+            batch = athlete_ids[offset:offset + 500]
+            rows = self.connection().execute(
+                f"""SELECT athlete_id, as_of, cycle_day, cycle_length FROM cycle_forecasts
+                    WHERE athlete_id IN ({', '.join('?' * len(batch))})""",
+                batch
+            )
+            for athlete_id, as_of, cycle_day, cycle_length in rows:
+                start = datetime.date.fromisoformat(as_of) - datetime.timedelta(days=cycle_day - 1)
+                cycles[athlete_id] = (start, cycle_length)
+        return cycles
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Cycle phase forecasts")
+    parser.add_argument('command', choices=['nightly'])
+    parser.add_argument('--db', default=DEFAULT_DB_PATH)
+    parser.add_argument('--as-of', type=datetime.date.fromisoformat, default=None)
+    args = parser.parse_args()
+
+    count = CycleForecaster(args.db).run_batch(as_of=args.as_of)
+    print(f"Forecast {count} athletes")
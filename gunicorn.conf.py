@@ -0,0 +1,14 @@
+import multiprocessing
+import os
+
+wsgi_app = 'wsgi:server'
+bind = os.environ.get('CYCLEPERFORM_BIND', '0.0.0.0:8050')
+
+# Load the app (and its data) before forking so workers share it
+preload_app = True
+workers = int(os.environ.get('CYCLEPERFORM_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('CYCLEPERFORM_THREADS', 4))
+timeout = 120
+
+raw_env = ['CYCLEPERFORM_ENV=prod']
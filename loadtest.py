@@ -0,0 +1,269 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import urllib.request
+
+import aiohttp
+import numpy as np
+
+# Values virtual users type into free-text inputs; dropdowns use their options
+DEFAULT_TEXT_VALUES = {'athlete-id': ['demo', '']}
+
+PERCENTILES = (50, 95, 99)
+
+
+# component id -> props for every component with an id in a serialized layout
+def component_props(node, found=None):
+    found = {} if found is None else found
+    if isinstance(node, list):
+        for child in node:
+            component_props(child, found)
+    elif isinstance(node, dict):
+        props = node.get('props')
+        if isinstance(props, dict):
+            if isinstance(props.get('id'), str):
+                found[props['id']] = props
+            for value in props.values():
+                component_props(value, found)
+    return found
+
+
+# (id, property) pairs of a dependency's output string: "a.b" or "..a.b...c.d.."
+def parse_outputs(output):
+    multi = output.startswith('..')
+    parts = output.strip('.').split('...') if multi else [output]
+    return [tuple(part.rsplit('.', 1)) for part in parts], multi
+
+
+class Callback:
+    def __init__(self, dependency):
+        self.output = dependency['output']
+        self.outputs, self.multi = parse_outputs(self.output)
+        self.inputs = [(i['id'], i['property']) for i in dependency['inputs']]
+        self.state = [(s['id'], s['property']) for s in dependency.get('state', [])]
+        self.initial_call = not dependency.get('prevent_initial_call')
+        self.label = ', '.join(f'{component}.{prop}' for component, prop in self.outputs)
+
+    def payload(self, values, changed):
+        outputs = [{'id': component, 'property': prop} for component, prop in self.outputs]
+        return {
+            'output': self.output,
+            'outputs': outputs if self.multi else outputs[0],
+            'inputs': [{'id': c, 'property': p, 'value': values.get(c, {}).get(p)} for c, p in self.inputs],
+            'state': [{'id': c, 'property': p, 'value': values.get(c, {}).get(p)} for c, p in self.state],
+            'changedPropIds': changed
+        }
+
+
+class SessionModel:
+    # What a user of the served app can do, read from the app itself: the
+    # server-side callbacks (clientside ones never reach the server), the
+    # layout's initial values, and the inputs a user changes with the values
+    # each can take.
+    def __init__(self, layout, dependencies, text_values=DEFAULT_TEXT_VALUES):
+        self.props = component_props(layout)
+        self.callbacks = [Callback(d) for d in dependencies if not d.get('clientside_function')]
+        self.choices = {}
+        for callback in self.callbacks:
+            for component, prop in callback.inputs:
+                props = self.props.get(component, {})
+                if prop != 'value' or (component, prop) in self.choices:
+                    continue
+                if props.get('options'):
+                    values = [o['value'] if isinstance(o, dict) else o for o in props['options']]
+                    self.choices[(component, prop)] = (values, bool(props.get('multi')))
+                elif component in text_values:
+                    self.choices[(component, prop)] = (list(text_values[component]), False)
+
+    def initial_values(self):
+        return {component: dict(props) for component, props in self.props.items()}
+
+    def triggered_by(self, changed):
+        return [c for c in self.callbacks if any(i in changed for i in c.inputs)]
+
+    # A new value for an input: one option, or up to two for multi-selects
+    def pick(self, rng, key):
+        values, multi = self.choices[key]
+        if multi:
+            return rng.sample(values, rng.randint(0, min(2, len(values))))
+        return rng.choice(values)
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def record(self, label, seconds, ok):
+        self.latencies.setdefault(label, []).append(seconds)
+        if not ok:
+            self.errors[label] = self.errors.get(label, 0) + 1
+
+    def summary(self):
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        rows = {}
+        everything = []
+        for label, latencies in sorted(self.latencies.items()):
+            everything += latencies
+            rows[label] = self._row(latencies, self.errors.get(label, 0), elapsed)
+        rows['total'] = self._row(everything, sum(self.errors.values()), elapsed)
+        return {'elapsed_s': elapsed, 'callbacks': rows}
+
+    @staticmethod
+    def _row(latencies, errors, elapsed):
+        latencies = np.asarray(latencies) * 1000
+        row = {
+            'requests': int(latencies.size),
+            'errors': int(errors),
+            'error_rate': errors / latencies.size if latencies.size else 0.0,
+            'throughput_rps': latencies.size / elapsed if elapsed else 0.0
+        }
+        for p in PERCENTILES:
+            row[f'p{p}_ms'] = float(np.percentile(latencies, p)) if latencies.size else None
+        return row
+
+
+async def _timed(http, stats, label, method, url, **kwargs):
+    start = time.perf_counter()
+    try:
+        async with http.request(method, url, **kwargs) as response:
+            body = await response.read()
+            # 204 is Dash's PreventUpdate: a valid answer with nothing to change
+            ok = response.status in (200, 204)
+            stats.record(label, time.perf_counter() - start, ok)
+            return response.status, body
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        stats.record(label, time.perf_counter() - start, False)
+        return None, None
+
+
+# Fire callbacks the way the Dash renderer does: every callback an input
+# change triggers concurrently, then the callbacks their outputs trigger
+async def _fire(http, base_url, model, values, callbacks, changed, stats):
+    async def one(callback):
+        status, body = await _timed(http, stats, callback.label, 'POST', f'{base_url}/_dash-update-component',
+                                    json=callback.payload(values, changed))
+        if status != 200:
+            return []
+        updated = []
+        for component, props in json.loads(body).get('response', {}).items():
+            values.setdefault(component, {}).update(props)
+            updated += [(component, prop) for prop in props]
+        return updated
+
+    results = await asyncio.gather(*[one(c) for c in callbacks])
+    updated = [key for keys in results for key in keys]
+    dependents = model.triggered_by(set(updated))
+    if dependents:
+        await _fire(http, base_url, model, values, dependents, [f'{c}.{p}' for c, p in updated], stats)
+
+
+# One visit: load the page, then change `actions` inputs with think time between
+async def run_session(http, base_url, model, rng, stats, actions, think_time):
+    for path in ('/', '/_dash-layout', '/_dash-dependencies'):
+        await _timed(http, stats, f'GET {path}', 'GET', f'{base_url}{path}')
+
+    values = model.initial_values()
+    initial = [c for c in model.callbacks if c.initial_call]
+    if initial:
+        await _fire(http, base_url, model, values, initial, [], stats)
+
+    keys = list(model.choices)
+    for _ in range(actions):
+        if think_time:
+            await asyncio.sleep(rng.expovariate(1 / think_time))
+        component, prop = key = rng.choice(keys)
+        values.setdefault(component, {})[prop] = model.pick(rng, key)
+        await _fire(http, base_url, model, values, model.triggered_by({key}), [f'{component}.{prop}'], stats)
+
+
+async def load_test(base_url, concurrency=10, duration=30.0, actions=10, think_time=0.0, seed=0, timeout=30.0):
+    base_url = base_url.rstrip('/')
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=timeout)) as http:
+        async with http.get(f'{base_url}/_dash-layout') as response:
+            layout = await response.json()
+        async with http.get(f'{base_url}/_dash-dependencies') as response:
+            dependencies = await response.json()
+        model = SessionModel(layout, dependencies)
+
+        stats = Stats()
+        deadline = time.perf_counter() + duration
+
+        async def user(index):
+            rng = random.Random(seed * 1000003 + index)
+            while time.perf_counter() < deadline:
+                await run_session(http, base_url, model, rng, stats, actions, think_time)
+
+        await asyncio.gather(*[user(i) for i in range(concurrency)])
+        stats.finished = time.perf_counter()
+    return stats.summary()
+
+
+# Start the app under gunicorn on a local port for the duration of a run
+@contextlib.contextmanager
+def local_server(port=8050, workers=1, threads=4, env=None):
+    root = os.path.dirname(os.path.abspath(__file__))
+    server_env = dict(os.environ, **(env or {}), CYCLEPERFORM_BIND=f'127.0.0.1:{port}',
+                      CYCLEPERFORM_WORKERS=str(workers), CYCLEPERFORM_THREADS=str(threads))
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'], cwd=root, env=server_env)
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        for _ in range(600):
+            if process.poll() is not None:
+                raise RuntimeError(f"Server exited with status {process.returncode}")
+            try:
+                urllib.request.urlopen(f'{base_url}/_dash-layout', timeout=1).close()
+                break
+            except OSError:
+                time.sleep(0.5)
+        else:
+            raise RuntimeError("Server did not start within 5 minutes")
+        yield base_url
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def format_report(summary):
+    header = f"{'callback':<72} {'reqs':>7} {'err%':>6} {'req/s':>8}" + ''.join(f" {f'p{p} ms':>9}" for p in PERCENTILES)
+    lines = [header, '-' * len(header)]
+    for label, row in summary['callbacks'].items():
+        percentiles = ''.join(f" {row[f'p{p}_ms']:>9.1f}" if row[f'p{p}_ms'] is not None else f" {'-':>9}"
+                              for p in PERCENTILES)
+        lines.append(f"{label[:72]:<72} {row['requests']:>7} {100 * row['error_rate']:>6.2f} "
+                     f"{row['throughput_rps']:>8.1f}{percentiles}")
+    lines.append(f"{summary['elapsed_s']:.1f}s elapsed")
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Replay dashboard sessions against a running CyclePerform server")
+    parser.add_argument('--url', default='http://127.0.0.1:8050', help="Server to test (ignored with --serve)")
+    parser.add_argument('--serve', action='store_true', help="Start the app under gunicorn locally for the run")
+    parser.add_argument('--port', type=int, default=8050)
+    parser.add_argument('--workers', type=int, default=1, help="Worker processes for --serve")
+    parser.add_argument('--threads', type=int, default=4, help="Threads per worker for --serve")
+    parser.add_argument('--concurrency', type=int, default=10, help="Simultaneous virtual users")
+    parser.add_argument('--duration', type=float, default=30.0, help="Seconds to run")
+    parser.add_argument('--actions', type=int, default=10, help="Input changes per session after the page load")
+    parser.add_argument('--think-time', type=float, default=0.0, help="Mean seconds between a user's actions")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help="Also write the results to this file")
+    args = parser.parse_args()
+
+    with (local_server(args.port, args.workers, args.threads) if args.serve else contextlib.nullcontext(args.url)) as url:
+        summary = asyncio.run(load_test(url, args.concurrency, args.duration, args.actions, args.think_time, args.seed))
+
+    print(format_report(summary))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(summary, f, indent=2)
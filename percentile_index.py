@@ -0,0 +1,221 @@
+import threading
+
+import numpy as np
+
+from stratification import AGE_BANDS, BMI_BANDS, band_codes, bmi_values
+from survey_schema import answer_categories, answer_values, impact_questions
+
+# Centroids a sketch keeps at most (about half this after compressing)
+DEFAULT_COMPRESSION = 200
+
+# Rows sketched per vectorized pass when updating from a large frame
+_UPDATE_CHUNK = 100000
+
+# Impact Scores are stored as float32; rounding both the survey's and the
+# athlete's to this many decimals lets equal scores tie
+_SCORE_DECIMALS = 4
+
+
+class QuantileSketch:
+    # Mergeable t-digest: values are summarized as centroids (mean, weight)
+    # sorted by mean. Once there are more than `compression` distinct values,
+    # neighbouring centroids are combined under the arcsine scale function,
+    # which keeps centroids near the tails small so extreme ranks stay
+    # accurate. Below that every distinct value is its own centroid and ranks
+    # are exact, which covers the survey's answers and most Impact Scores.
+    def __init__(self, compression=DEFAULT_COMPRESSION):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.count = 0.0
+        self._ranks = np.empty(0)
+
+    # Add values, each with weight 1 unless weights are given; NaNs are skipped
+    def update(self, values, weights=None):
+        values = np.asarray(values, dtype='float64')
+        weights = np.ones(len(values)) if weights is None else np.asarray(weights, dtype='float64')
+        finite = np.isfinite(values)
+        self._absorb(values[finite], weights[finite])
+        return self
+
+    # Fold another sketch in, e.g. one built by another ingest worker
+    def merge(self, other):
+        self._absorb(other.means, other.weights)
+        return self
+
+    def _absorb(self, means, weights):
+        if not len(means):
+            return
+        means, inverse = np.unique(np.concatenate([self.means, means]), return_inverse=True)
+        weights = np.bincount(inverse, weights=np.concatenate([self.weights, weights]))
+        total = weights.sum()
+
+        if len(means) > self.compression:
+            # Centroids whose midpoints fall in the same unit of k(q) are combined
+            q = (np.cumsum(weights) - weights / 2) / total
+            k = self.compression / (2 * np.pi) * np.arcsin(2 * q - 1)
+            group = np.floor(k - k[0]).astype('int64')
+            starts = np.flatnonzero(np.concatenate([[True], group[1:] != group[:-1]]))
+            combined = np.add.reduceat(weights, starts)
+            means = np.add.reduceat(means * weights, starts) / combined
+            weights = combined
+
+        self.means, self.weights, self.count = means, weights, total
+        # Rank at each centroid's mean: the weight below it plus half its own
+        self._ranks = np.cumsum(weights) - weights / 2
+
+    # Fraction of the values below x, counting values equal to x as half
+    # below (mid-rank). A binary search over the centroids, O(log n).
+    def cdf(self, x):
+        if not self.count:
+            return np.nan
+        x = np.asarray(x, dtype='float64')
+        ranks = np.interp(x, self.means, self._ranks)
+        ranks = np.where(x < self.means[0], 0.0, np.where(x > self.means[-1], self.count, ranks))
+        return ranks / self.count
+
+    # Value at quantile q (0-1)
+    def quantile(self, q):
+        if not self.count:
+            return np.nan
+        return np.interp(np.asarray(q, dtype='float64') * self.count, self._ranks, self.means)
+
+
+class PercentileIndex:
+    # Quantile sketches of the Impact Score and every question's answers, for
+    # all respondents and per age band, BMI band and (age band, BMI band)
+    # stratum, so an athlete is ranked against any of them without touching
+    # the responses:
+    #
+    #   sketches[(metric, age_band, bmi_band)]    None for "any band"
+    #
+    # Indexes built from separate shards of the survey combine with merge().
+    def __init__(self, columns, age_bands=AGE_BANDS, bmi_bands=BMI_BANDS, score_column='Impact Score',
+                 compression=DEFAULT_COMPRESSION):
+        self.columns = list(columns)
+        self.age_bands = age_bands
+        self.bmi_bands = bmi_bands
+        self.score_column = score_column
+        self.compression = compression
+        self.metrics = [score_column] + self.columns
+        self.shape = (len(age_bands['labels']), len(bmi_bands['labels']))
+        self.sketches = {}
+        self.n_rows = 0
+        self._lock = threading.Lock()
+
+    # Add survey rows (a DataFrame holding the index's columns, the score
+    # column, AGE and BMI or HEIGHT/WEIGHT)
+    def update(self, frame):
+        for start in range(0, len(frame), _UPDATE_CHUNK):
+            chunk = frame.iloc[start:start + _UPDATE_CHUNK]
+            scores = chunk[self.score_column] if self.score_column in chunk.columns else np.full(len(chunk), np.nan)
+            values = np.column_stack([np.round(np.asarray(scores, dtype='float64'), _SCORE_DECIMALS)] + [
+                answer_values(chunk[col]).to_numpy(dtype='float64') for col in self.columns
+            ])
+            age = np.asarray(chunk['AGE'], dtype='float64') if 'AGE' in chunk.columns else np.full(len(chunk), np.nan)
+            self.update_arrays(values, age, bmi_values(chunk))
+
+    # Add rows given as metric values (rows x metrics, NaN for missing), ages
+    # and BMIs. The rows are sketched on their own, then merged in.
+    def update_arrays(self, values, age, bmi):
+        values = np.asarray(values, dtype='float64')
+        if not len(values):
+            return
+        n_age, n_bmi = self.shape
+        age_band = band_codes(age, self.age_bands['edges'])
+        bmi_band = band_codes(bmi, self.bmi_bands['edges'])
+        # One cell per (age band, BMI band), with a last band for missing
+        cell = np.where(age_band >= 0, age_band, n_age) * (n_bmi + 1) + np.where(bmi_band >= 0, bmi_band, n_bmi)
+
+        sketches = {}
+        for m, metric in enumerate(self.metrics):
+            cells = self._cell_sketches(cell, values[:, m])
+            for a in range(n_age + 1):
+                for b in range(n_bmi + 1):
+                    sketch = cells.get(a * (n_bmi + 1) + b)
+                    if sketch is None:
+                        continue
+                    keys = [(None, None), (a, None), (None, b), (a, b)]
+                    for age_key, bmi_key in keys:
+                        if age_key == n_age or bmi_key == n_bmi:
+                            continue
+                        key = (metric, age_key, bmi_key)
+                        sketches.setdefault(key, QuantileSketch(self.compression)).merge(sketch)
+        self._merge_sketches(sketches, len(values))
+
+    # Sketch of one metric's values per cell, from a single sort by (cell, value)
+    def _cell_sketches(self, cell, values):
+        present = np.isfinite(values)
+        cell, values = cell[present], values[present]
+        order = np.lexsort((values, cell))
+        cell, values = cell[order], values[order]
+        starts = np.flatnonzero(np.concatenate([[True], (np.diff(cell) != 0) | (np.diff(values) != 0)]))
+        counts = np.diff(np.concatenate([starts, [len(values)]]))
+        cell, values = cell[starts], values[starts]
+
+        sketches = {}
+        bounds = np.flatnonzero(np.concatenate([[True], np.diff(cell) != 0, [True]]))
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            sketches[int(cell[start])] = QuantileSketch(self.compression).update(values[start:end], counts[start:end])
+        return sketches
+
+    # Fold in another index over the same questions and bands
+    def merge(self, other):
+        self._merge_sketches(other.sketches, other.n_rows)
+        return self
+
+    def _merge_sketches(self, sketches, n_rows):
+        with self._lock:
+            for key, sketch in sketches.items():
+                existing = self.sketches.get(key)
+                if existing is None:
+                    self.sketches[key] = QuantileSketch(self.compression).merge(sketch)
+                else:
+                    existing.merge(sketch)
+            self.n_rows += n_rows
+
+    # Age and BMI bands of an athlete (None where not given)
+    def bands(self, age=None, bmi=None):
+        age_band = int(band_codes([age], self.age_bands['edges'])[0]) if age is not None else -1
+        bmi_band = int(band_codes([bmi], self.bmi_bands['edges'])[0]) if bmi is not None else -1
+        return (age_band if age_band >= 0 else None), (bmi_band if bmi_band >= 0 else None)
+
+    # Percentile (0-100, mid-rank) of a value among the respondents in a band
+    # (None for any band), or None when nobody in it has a value
+    def percentile(self, metric, value, age_band=None, bmi_band=None):
+        sketch = self.sketches.get((metric, age_band, bmi_band))
+        if sketch is None or not sketch.count:
+            return None
+        return float(100 * sketch.cdf(value))
+
+    # Rank an athlete's answers ({question: 1-3}) against the survey, and
+    # against respondents in the athlete's age/BMI bands when given. The
+    # Impact Score is the mean of the athlete's answers to the impact questions.
+    def rank(self, answers, age=None, bmi=None):
+        for question, answer in answers.items():
+            if question not in self.columns:
+                raise ValueError(f"Unknown question: {question}")
+            if answer not in answer_categories:
+                raise ValueError(f"Answers must be one of: {', '.join(map(str, answer_categories))}")
+
+        age_band, bmi_band = self.bands(age, bmi)
+        stratified = age_band is not None or bmi_band is not None
+
+        def entry(metric, value):
+            return {
+                'value': value,
+                'percentile': self.percentile(metric, value),
+                'stratum_percentile': self.percentile(metric, value, age_band, bmi_band) if stratified else None
+            }
+
+        scored = [answers[q] for q in impact_questions if q in answers]
+        stratum = self.sketches.get((self.score_column, age_band, bmi_band)) if stratified else None
+        return {
+            'impact_score': entry(self.score_column, round(float(np.mean(scored)), _SCORE_DECIMALS)) if scored else None,
+            'questions': {question: entry(question, answer) for question, answer in answers.items()},
+            'stratum': {
+                'age': self.age_bands['labels'][age_band] if age_band is not None else None,
+                'bmi': self.bmi_bands['labels'][bmi_band] if bmi_band is not None else None,
+                'respondents': int(stratum.count) if stratum is not None else 0
+            } if stratified else None
+        }
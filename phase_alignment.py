@@ -0,0 +1,421 @@
+import argparse
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from forecaster import CycleForecaster
+from percentile_index import QuantileSketch
+from planner import MIN_CYCLE_LENGTH, MAX_CYCLE_LENGTH, default_phase_lengths
+from twin_store import (DEFAULT_DB_PATH, DEFAULT_PHASE_PROFILE, EPOCH_ORDINAL, AthleteTwin, SQLiteStore, TwinStore,
+                        cycle_phases, phase_metrics, standard_phase_lengths)
+
+# Bins each phase is resampled to, whatever its length in days
+PHASE_BINS = 8
+
+# Percentiles across the cohort kept for every point of the phase-relative grid
+CURVE_PERCENTILES = (10, 25, 50, 75, 90)
+
+# Cycles resampled per vectorized pass, bounding the (cycles x days x metrics) array
+_ALIGN_CHUNK = 20000
+
+# SQL column for each metric, in phase_metrics order
+_METRIC_COLUMNS = ['energy', 'strength', 'endurance', 'recovery', 'intensity']
+
+_CURVE_COLUMNS = ['mean'] + [f'p{p}' for p in CURVE_PERCENTILES]
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS daily_performance (
+    athlete_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    {', '.join(f'{col} REAL' for col in _METRIC_COLUMNS)},
+    PRIMARY KEY (athlete_id, date)
+);
+CREATE TABLE IF NOT EXISTS phase_curves (
+    phase INTEGER NOT NULL,
+    bin INTEGER NOT NULL,
+    metric INTEGER NOT NULL,
+    as_of TEXT NOT NULL,
+    athletes INTEGER NOT NULL,
+    {', '.join(f'{col} REAL' for col in _CURVE_COLUMNS)},
+    run INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (phase, bin, metric)
+);
+"""
+
+
+# Phase and bin of every point of the phase-relative grid, with where the
+# point falls in a standard 28-day cycle (in days from its start), for plotting
+def phase_grid(bins=PHASE_BINS):
+    phase = np.repeat(np.arange(len(cycle_phases)), bins)
+    bin_ = np.tile(np.arange(bins), len(cycle_phases))
+    lengths = np.asarray(standard_phase_lengths)
+    starts = np.cumsum(lengths) - lengths
+    return pd.DataFrame({
+        'phase': phase,
+        'bin': bin_,
+        'standard_day': starts[phase] + (bin_ + 0.5) / bins * lengths[phase]
+    })
+
+
+# Day in cycle (0-based) and cycle length of each daily row, from the
+# athlete's logged period starts. Rows between two starts belong to that
+# logged cycle; rows after the last start follow the forecast cycle length,
+# rolling forward over cycles that were not logged. Rows before an athlete's
+# first start, in an interval too short or long to be one cycle (a missed
+# log), or of an athlete without a forecast get day -1 and length 0.
+#
+# athletes, days: per-row athlete number and date ordinal
+# start_athletes, start_days: logged starts, sorted by athlete then day
+# forecast_lengths: per-athlete forecast cycle length (0 when unknown)
+def cycle_positions(athletes, days, start_athletes, start_days, forecast_lengths):
+    athletes = np.asarray(athletes, dtype='int64')
+    days = np.asarray(days, dtype='int64')
+    start_athletes = np.asarray(start_athletes, dtype='int64')
+    start_days = np.asarray(start_days, dtype='int64')
+    if not len(start_days):
+        return np.full(len(days), -1), np.zeros(len(days), dtype='int64')
+
+    # Date ordinals fit in 32 bits, so (athlete, day) sorts as one integer
+    start_keys = (start_athletes << 32) | start_days
+    latest = np.searchsorted(start_keys, (athletes << 32) | days, side='right') - 1
+    following = np.minimum(latest + 1, len(start_days) - 1)
+    has_start = latest >= 0
+    latest = np.maximum(latest, 0)
+    has_start &= start_athletes[latest] == athletes
+    start = start_days[latest]
+
+    closed = (following != latest) & (start_athletes[following] == athletes)
+    length = np.where(closed, start_days[following] - start, np.asarray(forecast_lengths, dtype='int64')[athletes])
+    placed = has_start & (length >= MIN_CYCLE_LENGTH) & (length <= MAX_CYCLE_LENGTH)
+    day_in_cycle = (days - start) % np.maximum(length, 1)
+    return np.where(placed, day_in_cycle, -1), np.where(placed, length, 0)
+
+
+# Resample the daily rows of each cycle onto the phase-relative grid. Each
+# phase is split into `bins` equal parts of its own length, with phase lengths
+# following the cycle length as in the planner (see default_phase_lengths),
+# and each bin takes the value at its centre: interpolated linearly between
+# the two nearest days, or the one of them that was logged.
+#
+# cycles: per-row cycle number (rows of one cycle share it)
+# cycle_day, cycle_length: per-row day in cycle (0-based) and length of the cycle
+# values: (rows x metrics) daily values, NaN where not logged
+#
+# Returns the sorted distinct cycle numbers and a (cycles, phases * bins,
+# metrics) array, NaN where a bin has no logged day on either side
+def align_cycles(cycles, cycle_day, cycle_length, values, bins=PHASE_BINS):
+    cycle_day = np.asarray(cycle_day, dtype='int64')
+    cycle_length = np.asarray(cycle_length, dtype='int64')
+    values = np.asarray(values, dtype='float64').reshape(len(cycle_day), -1)
+    ids, first, inverse = np.unique(cycles, return_index=True, return_inverse=True)
+    lengths = cycle_length[first]
+    n_metrics = values.shape[1]
+    curves = np.empty((len(ids), len(cycle_phases) * bins, n_metrics))
+
+    # Rows ordered by cycle, so each pass takes a contiguous run of them
+    order = np.argsort(inverse, kind='stable')
+    sorted_cycles = inverse[order]
+    centres = (np.arange(bins) + 0.5) / bins
+
+    for start in range(0, len(ids), _ALIGN_CHUNK):
+        end = min(start + _ALIGN_CHUNK, len(ids))
+        rows = order[np.searchsorted(sorted_cycles, start):np.searchsorted(sorted_cycles, end)]
+        n = end - start
+
+        daily = np.full((n, MAX_CYCLE_LENGTH, n_metrics), np.nan)
+        daily[inverse[rows] - start, cycle_day[rows]] = values[rows]
+
+        phase_lengths = default_phase_lengths(lengths[start:end])[:, :, None]
+        first_day = np.cumsum(phase_lengths, axis=1) - phase_lengths
+        last_day = first_day + phase_lengths - 1
+        position = (first_day + centres * phase_lengths - 0.5).reshape(n, -1)
+        first_day = np.broadcast_to(first_day, (n, len(cycle_phases), bins)).reshape(n, -1)
+        last_day = np.broadcast_to(last_day, (n, len(cycle_phases), bins)).reshape(n, -1)
+        before = np.clip(np.floor(position), first_day, last_day).astype('int64')
+        after = np.minimum(before + 1, last_day)
+        fraction = np.clip(position - before, 0, 1)[:, :, None]
+
+        cycle = np.arange(n)[:, None]
+        value_before, value_after = daily[cycle, before], daily[cycle, after]
+        weight_before = (1 - fraction) * np.isfinite(value_before)
+        weight_after = fraction * np.isfinite(value_after)
+        total = weight_before + weight_after
+        with np.errstate(invalid='ignore', divide='ignore'):
+            interpolated = (weight_before * np.nan_to_num(value_before)
+                            + weight_after * np.nan_to_num(value_after)) / total
+        nearest = np.where(np.isfinite(value_before), value_before, value_after)
+        curves[start:end] = np.where(total > 0, interpolated, nearest)
+
+    return ids, curves
+
+
+# Mean of each athlete's aligned cycles, ignoring gaps. Returns the sorted
+# distinct athlete numbers and their (athletes, grid, metrics) curves.
+def athlete_curves(cycle_athletes, curves):
+    ids, inverse = np.unique(cycle_athletes, return_inverse=True)
+    order = np.argsort(inverse, kind='stable')
+    starts = np.flatnonzero(np.concatenate([[True], np.diff(inverse[order]) != 0]))
+    curves = curves[order]
+    present = np.isfinite(curves)
+    sums = np.add.reduceat(np.where(present, curves, 0.0), starts, axis=0)
+    counts = np.add.reduceat(present.astype('int64'), starts, axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return ids, np.where(counts > 0, sums / counts, np.nan)
+
+
+# Align every athlete's daily rows in one vectorized pass.
+#
+# daily: DataFrame with athlete_id, day (date ordinal) and the metric columns
+# period_starts: dict of athlete id -> logged period start dates
+# forecast_lengths: dict of athlete id -> forecast cycle length
+#
+# Returns the ids of athletes with at least one aligned cycle and their
+# (athletes, phases * bins, metrics) curves
+def align_daily(daily, period_starts, forecast_lengths, metrics=_METRIC_COLUMNS, bins=PHASE_BINS):
+    codes, names = pd.factorize(daily['athlete_id'])
+    starts = [sorted(d.toordinal() for d in period_starts.get(name, ())) for name in names]
+    start_athletes = np.repeat(np.arange(len(names)), [len(s) for s in starts])
+    start_days = np.array([day for s in starts for day in s], dtype='int64')
+    lengths = np.array([forecast_lengths.get(name, 0) for name in names], dtype='int64')
+
+    days = daily['day'].to_numpy(dtype='int64')
+    cycle_day, cycle_length = cycle_positions(codes, days, start_athletes, start_days, lengths)
+    placed = cycle_length > 0
+    if not placed.any():
+        return np.asarray(names)[:0], np.empty((0, len(cycle_phases) * bins, len(metrics)))
+
+    cycle_keys = (codes[placed].astype('int64') << 32) | (days[placed] - cycle_day[placed])
+    cycle_ids, curves = align_cycles(cycle_keys, cycle_day[placed], cycle_length[placed],
+                                     daily[metrics].to_numpy(dtype='float64')[placed], bins)
+    athletes, curves = athlete_curves(cycle_ids >> 32, curves)
+    return np.asarray(names)[athletes], curves
+
+
+# Phase x metric profile of a cohort curve column ('mean', 'p50', ...): the
+# average over each phase's bins. None when there are no curves.
+def phase_profile(curves, column='p50'):
+    if curves is None or curves.empty:
+        return None
+    table = curves.pivot_table(index='phase', columns='metric', values=column, aggfunc='mean')
+    return table.reindex(index=cycle_phases, columns=phase_metrics).to_numpy(dtype='float64')
+
+
+class CohortCurves:
+    # Distribution across athletes of every point of the phase-relative grid.
+    # Each athlete's curve adds one value per (grid point, metric) to a running
+    # mean and a quantile sketch, so curves from chunks of athletes, or from
+    # separate shards of the squad, combine with update() and merge().
+    def __init__(self, metrics=phase_metrics, bins=PHASE_BINS):
+        self.metrics = list(metrics)
+        self.bins = bins
+        shape = (len(cycle_phases) * bins, len(self.metrics))
+        self.sums = np.zeros(shape)
+        self.counts = np.zeros(shape, dtype='int64')
+        self.sketches = [[QuantileSketch() for _ in self.metrics] for _ in range(shape[0])]
+        self.n_athletes = 0
+
+    # Add athletes' curves (athletes x grid x metrics, NaN for gaps)
+    def update(self, curves):
+        curves = np.asarray(curves, dtype='float64')
+        present = np.isfinite(curves)
+        self.sums += np.where(present, curves, 0.0).sum(axis=0)
+        self.counts += present.sum(axis=0)
+        for point, row in enumerate(self.sketches):
+            for m, sketch in enumerate(row):
+                sketch.update(curves[:, point, m])
+        self.n_athletes += len(curves)
+        return self
+
+    def merge(self, other):
+        self.sums += other.sums
+        self.counts += other.counts
+        for row, other_row in zip(self.sketches, other.sketches):
+            for sketch, other_sketch in zip(row, other_row):
+                sketch.merge(other_sketch)
+        self.n_athletes += other.n_athletes
+        return self
+
+    # One row per (phase, bin, metric): the athletes with a value there, their
+    # mean, and each of `percentiles`
+    def summary(self, percentiles=CURVE_PERCENTILES):
+        grid = phase_grid(self.bins)
+        frame = pd.DataFrame({
+            'phase': np.repeat(np.array(cycle_phases)[grid['phase']], len(self.metrics)),
+            'bin': np.repeat(grid['bin'].to_numpy(), len(self.metrics)),
+            'standard_day': np.repeat(grid['standard_day'].to_numpy(), len(self.metrics)),
+            'metric': np.tile(self.metrics, len(grid)),
+            'athletes': self.counts.ravel()
+        })
+        with np.errstate(invalid='ignore', divide='ignore'):
+            frame['mean'] = np.where(self.counts > 0, self.sums / self.counts, np.nan).ravel()
+        q = np.asarray(percentiles) / 100
+        quantiles = np.array([[sketch.quantile(q) if sketch.count else np.full(len(q), np.nan) for sketch in row]
+                              for row in self.sketches])
+        for i, p in enumerate(percentiles):
+            frame[f'p{p}'] = quantiles[:, :, i].ravel()
+        return frame
+
+
+class PhaseAlignmentEngine(SQLiteStore):
+    # Daily performance logs (the phase metrics, 0-100) per athlete, aligned
+    # onto a phase-relative grid by the athlete's logged cycles so cycles of
+    # any length line up phase by phase. The batch writes every athlete's twin
+    # (each phase's metrics averaged over their aligned curve, and the phase
+    # lengths of their forecast cycle) and the cohort's percentile curves into
+    # phase_curves, so request handlers only ever read rows.
+    def __init__(self, db_path=DEFAULT_DB_PATH, twin_store=None, forecaster=None, bins=PHASE_BINS):
+        super().__init__(db_path)
+        self.twin_store = twin_store or TwinStore(db_path)
+        self.forecaster = forecaster or CycleForecaster(db_path)
+        self.bins = bins
+        conn = self.connection()
+        conn.executescript(_SCHEMA)
+        # Databases created before curve runs were numbered
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(phase_curves)")}
+        if 'run' not in columns:
+            conn.execute("ALTER TABLE phase_curves ADD COLUMN run INTEGER NOT NULL DEFAULT 0")
+
+    # Log one day's metrics; fields left as None keep any value already logged
+    # for that day. The athlete's twin is refreshed.
+    def log_daily_performance(self, athlete_id, date, energy=None, strength=None, endurance=None, recovery=None,
+                              intensity=None, as_of=None):
+        self.log_many([(athlete_id, date, energy, strength, endurance, recovery, intensity)])
+        self.run_batch(as_of=as_of, athlete_ids=[athlete_id])
+        return self.twin_store.get(athlete_id)
+
+    # Bulk insert of (athlete_id, date, energy, strength, endurance, recovery,
+    # intensity) rows, without realigning
+    def log_many(self, rows):
+        conn = self.connection()
+        with conn:
+            conn.executemany(
+                f"""INSERT INTO daily_performance VALUES (?, ?, {', '.join('?' * len(_METRIC_COLUMNS))})
+                    ON CONFLICT (athlete_id, date) DO UPDATE SET
+                    {', '.join(f'{c} = COALESCE(excluded.{c}, {c})' for c in _METRIC_COLUMNS)}""",
+                [(athlete_id, date.isoformat(), *values) for athlete_id, date, *values in rows]
+            )
+
+    # Daily rows logged for an athlete, oldest first
+    def daily_performance(self, athlete_id):
+        frame = pd.read_sql_query(
+            f"""SELECT date, {', '.join(_METRIC_COLUMNS)} FROM daily_performance
+                WHERE athlete_id = ? ORDER BY date""",
+            self.connection(), params=(athlete_id,)
+        )
+        return frame.rename(columns=dict(zip(_METRIC_COLUMNS, phase_metrics)))
+
+    # Align every athlete (or the given athletes) up to a date, in chunks of
+    # athletes, and store their twins. A run over every athlete also replaces
+    # the cohort curves. Meant to run nightly after the forecasts, e.g. from cron:
+    #   python forecaster.py nightly && python phase_alignment.py nightly
+    def run_batch(self, as_of=None, athlete_ids=None, chunk_size=5000):
+        as_of = as_of or datetime.date.today()
+        conn = self.connection()
+        cohort = None
+        if athlete_ids is None:
+            cohort = CohortCurves(bins=self.bins)
+            athlete_ids = [row[0] for row in conn.execute(
+                "SELECT DISTINCT athlete_id FROM daily_performance ORDER BY athlete_id"
+            )]
+
+        # Phases an athlete has no logged day in, and no twin values for, take
+        # the cohort median, or the population profile before there is a cohort
+        fallback = phase_profile(self.cohort_curves())
+        fallback = DEFAULT_PHASE_PROFILE if fallback is None else np.where(np.isnan(fallback), DEFAULT_PHASE_PROFILE,
+                                                                            fallback)
+
+        written = 0
+        for offset in range(0, len(athlete_ids), chunk_size):
+            chunk = list(athlete_ids[offset:offset + chunk_size])
+            daily = pd.read_sql_query(
+                f"""SELECT athlete_id, date, {', '.join(_METRIC_COLUMNS)} FROM daily_performance
+                    WHERE athlete_id IN ({', '.join('?' * len(chunk))}) AND date <= ?""",
+                conn, params=(*chunk, as_of.isoformat())
+            )
+            if daily.empty:
+                continue
+            dates = pd.to_datetime(daily.pop('date')).to_numpy().astype('datetime64[D]')
+            daily['day'] = dates.astype('int64') + EPOCH_ORDINAL
+
+            cycles = self.forecaster.current_cycles(chunk)
+            athletes, curves = align_daily(daily, self.forecaster.period_starts(chunk),
+                                           {a: length for a, (_, length) in cycles.items()}, bins=self.bins)
+            if cohort is not None:
+                cohort.update(curves)
+
+            # Each phase's metrics: the mean over its bins; phases without a
+            # logged day keep the athlete's current values, or the fallback
+            by_phase = curves.reshape(len(athletes), len(cycle_phases), self.bins, len(phase_metrics))
+            present = np.isfinite(by_phase)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                profiles = np.where(present, by_phase, 0.0).sum(axis=2) / present.sum(axis=2)
+            existing = self.twin_store.get_many(list(athletes))
+            twins = []
+            for athlete_id, profile in zip(athletes, profiles):
+                if athlete_id in existing:
+                    profile = np.where(np.isnan(profile), existing[athlete_id].metrics, profile)
+                profile = np.where(np.isnan(profile), fallback, profile)
+                if athlete_id in cycles:
+                    phase_lengths = default_phase_lengths(cycles[athlete_id][1])
+                else:
+                    phase_lengths = existing[athlete_id].phase_lengths if athlete_id in existing else None
+                twins.append(AthleteTwin(athlete_id, as_of.isoformat(), np.round(profile, 1), phase_lengths))
+            self.twin_store.put_many(twins)
+            written += len(twins)
+
+        if cohort is not None and cohort.n_athletes:
+            self._store_curves(cohort.summary(), as_of)
+        return written
+
+    # Replace the cohort curves, numbering the run so workers notice new curves
+    # even when the batch is re-run for the same date
+    def _store_curves(self, summary, as_of):
+        conn = self.connection()
+        with conn:
+            run = conn.execute("SELECT COALESCE(MAX(run), 0) + 1 FROM phase_curves").fetchone()[0]
+            rows = zip(
+                summary['phase'].map(cycle_phases.index).tolist(),
+                summary['bin'].tolist(),
+                summary['metric'].map(phase_metrics.index).tolist(),
+                [as_of.isoformat()] * len(summary),
+                summary['athletes'].tolist(),
+                *(summary[col].where(summary[col].notna(), None).tolist() for col in _CURVE_COLUMNS),
+                [run] * len(summary)
+            )
+            conn.execute("DELETE FROM phase_curves")
+            conn.executemany(
+                f"""INSERT INTO phase_curves (phase, bin, metric, as_of, athletes, {', '.join(_CURVE_COLUMNS)}, run)
+                    VALUES ({', '.join('?' * (6 + len(_CURVE_COLUMNS)))})""",
+                rows
+            )
+
+    # Number of the run that stored the current cohort curves, or None before
+    # the first run over every athlete
+    def curves_run(self):
+        return self.connection().execute("SELECT MAX(run) FROM phase_curves").fetchone()[0]
+
+    # The latest cohort curves (see CohortCurves.summary), with the date they
+    # were computed as of; empty when the batch has not run over every athlete
+    def cohort_curves(self):
+        frame = pd.read_sql_query(
+            f"""SELECT phase, bin, metric, as_of, athletes, {', '.join(_CURVE_COLUMNS)} FROM phase_curves
+                ORDER BY phase, bin, metric""",
+            self.connection()
+        )
+        grid = phase_grid(self.bins).set_index(['phase', 'bin'])['standard_day']
+        frame.insert(2, 'standard_day', grid.reindex(list(zip(frame['phase'], frame['bin']))).to_numpy())
+        frame['phase'] = np.array(cycle_phases)[frame['phase'].to_numpy(dtype='int64')]
+        frame['metric'] = np.array(phase_metrics)[frame['metric'].to_numpy(dtype='int64')]
+        return frame
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Phase-aligned performance curves")
+    parser.add_argument('command', choices=['nightly'])
+    parser.add_argument('--db', default=DEFAULT_DB_PATH)
+    parser.add_argument('--as-of', type=datetime.date.fromisoformat, default=None)
+    args = parser.parse_args()
+
+    count = PhaseAlignmentEngine(args.db).run_batch(as_of=args.as_of)
+    print(f"Aligned {count} athletes")
@@ -0,0 +1,144 @@
+import hashlib
+
+import numpy as np
+
+from twin_store import cycle_phases, standard_phase_lengths
+
+# Recommended workouts by phase
+phase_workouts = {
+    'Menstrual': [
+        {'type': 'Light Jog', 'intensity': 50, 'duration': 25},
+        {'type': 'Recovery Walk', 'intensity': 30, 'duration': 40},
+        {'type': 'Gentle Yoga', 'intensity': 45, 'duration': 30}
+    ],
+    'Follicular': [
+        {'type': 'Hill Sprints', 'intensity': 75, 'duration': 30},
+        {'type': 'Tempo Run', 'intensity': 70, 'duration': 40},
+        {'type': 'Long Run', 'intensity': 65, 'duration': 60}
+    ],
+    'Ovulatory': [
+        {'type': 'HIIT Session', 'intensity': 90, 'duration': 35},
+        {'type': 'Race Pace Run', 'intensity': 85, 'duration': 45},
+        {'type': 'Speed Intervals', 'intensity': 95, 'duration': 30}
+    ],
+    'Luteal': [
+        {'type': 'Steady State', 'intensity': 65, 'duration': 45},
+        {'type': 'Fartlek Training', 'intensity': 70, 'duration': 35},
+        {'type': 'Cross Training', 'intensity': 60, 'duration': 40}
+    ]
+}
+
+# Planned daily intensity range per phase, [low, high)
+phase_intensity_ranges = {
+    'Menstrual': (30, 60),
+    'Follicular': (60, 80),
+    'Ovulatory': (80, 100),
+    'Luteal': (50, 75)
+}
+
+# Lookup tables indexed by phase number
+workout_names = np.array([[w['type'] for w in phase_workouts[phase]] for phase in cycle_phases])
+_intensity_low = np.array([phase_intensity_ranges[phase][0] for phase in cycle_phases])
+_intensity_span = np.array([phase_intensity_ranges[phase][1] - phase_intensity_ranges[phase][0]
+                            for phase in cycle_phases])
+
+MIN_CYCLE_LENGTH = 21
+MAX_CYCLE_LENGTH = 45
+
+# Salts keeping the workout and intensity draws independent
+_WORKOUT_STREAM = np.uint64(0x9E3779B97F4A7C15)
+_INTENSITY_STREAM = np.uint64(0xD1B54A32D192ED03)
+
+
+# Stable 64-bit key for an athlete id (Python's hash() is salted per process)
+def athlete_key(athlete_id):
+    return int.from_bytes(hashlib.blake2b(str(athlete_id).encode(), digest_size=8).digest(), 'little')
+
+
+# Phase lengths for arbitrary cycle lengths. The menstrual, ovulatory and luteal
+# phases keep their standard length and the follicular phase absorbs the
+# difference, which is where most cycle-length variation comes from.
+def default_phase_lengths(cycle_lengths):
+    cycle_lengths = np.asarray(cycle_lengths, dtype='int64')
+    menstrual, _, ovulatory, luteal = standard_phase_lengths
+    follicular = cycle_lengths - (menstrual + ovulatory + luteal)
+    return np.stack([
+        np.full_like(cycle_lengths, menstrual),
+        follicular,
+        np.full_like(cycle_lengths, ovulatory),
+        np.full_like(cycle_lengths, luteal)
+    ], axis=-1)
+
+
+# SplitMix64 finaliser: a counter-based generator, so the draw for a given
+# (seed, athlete, day) never depends on which other athletes or days are planned
+def _mix64(x):
+    x = x ^ (x >> np.uint64(30))
+    x = x * np.uint64(0xBF58476D1CE4E5B9)
+    x = x ^ (x >> np.uint64(27))
+    x = x * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _uniform(keys, days, stream):
+    with np.errstate(over='ignore'):
+        bits = _mix64(_mix64(keys[:, None] ^ stream) + days.astype('uint64'))
+    return (bits >> np.uint64(11)).astype('float64') * (1.0 / (1 << 53))
+
+
+# Plan N athletes x D days in one vectorized pass.
+#
+# athlete_keys: per-athlete keys (see athlete_key)
+# cycle_lengths: per-athlete cycle length in days (21-45)
+# n_days: number of days to plan
+# first_day: day number of the first planned day, e.g. a date ordinal
+# cycle_start: day number on which one of the athlete's cycles started
+# phase_lengths: (N, 4) days per phase, defaults to default_phase_lengths
+#
+# Returns a dict of (N, D) arrays: day, cycle_day (1-based), phase (index into
+# cycle_phases), workout (index into the phase's workouts) and intensity.
+# Identical inputs always produce identical plans.
+def generate_plans(athlete_keys, cycle_lengths, n_days, first_day=0, cycle_start=0,
+                   phase_lengths=None, seed=0):
+    keys = np.asarray(athlete_keys, dtype='uint64').reshape(-1)
+    lengths = np.broadcast_to(np.asarray(cycle_lengths, dtype='int64'), keys.shape)
+    if ((lengths < MIN_CYCLE_LENGTH) | (lengths > MAX_CYCLE_LENGTH)).any():
+        raise ValueError(f"Cycle lengths must be between {MIN_CYCLE_LENGTH} and {MAX_CYCLE_LENGTH} days")
+
+    if phase_lengths is None:
+        phase_lengths = default_phase_lengths(lengths)
+    phase_lengths = np.broadcast_to(np.asarray(phase_lengths, dtype='int64'), keys.shape + (len(cycle_phases),))
+    if (phase_lengths.sum(axis=1) != lengths).any() or (phase_lengths < 1).any():
+        raise ValueError("Phase lengths must be positive and add up to the cycle length")
+
+    first_day = np.broadcast_to(np.asarray(first_day, dtype='int64'), keys.shape)
+    cycle_start = np.broadcast_to(np.asarray(cycle_start, dtype='int64'), keys.shape)
+
+    days = first_day[:, None] + np.arange(n_days, dtype='int64')
+    day_in_cycle = (days - cycle_start[:, None]) % lengths[:, None]
+
+    # Phase number = how many phase ends the day has passed
+    phase_ends = np.cumsum(phase_lengths, axis=1)[:, :-1]
+    phase = (day_in_cycle[:, :, None] >= phase_ends[:, None, :]).sum(axis=2).astype('int8')
+
+    with np.errstate(over='ignore'):
+        salted = keys ^ np.uint64(seed & 0xFFFFFFFFFFFFFFFF)
+    workout = np.minimum(
+        (_uniform(salted, days, _WORKOUT_STREAM) * workout_names.shape[1]).astype('int8'),
+        workout_names.shape[1] - 1
+    )
+    intensity = (_intensity_low[phase] +
+                 (_uniform(salted, days, _INTENSITY_STREAM) * _intensity_span[phase]).astype('int64')).astype('int16')
+
+    return {
+        'day': days,
+        'cycle_day': (day_in_cycle + 1).astype('int16'),
+        'phase': phase,
+        'workout': workout,
+        'intensity': intensity
+    }
+
+
+# Workout names for a generated plan's (phase, workout) arrays
+def plan_workout_names(plan):
+    return workout_names[plan['phase'], plan['workout']]
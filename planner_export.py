@@ -0,0 +1,181 @@
+import datetime
+import io
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from planner import athlete_key, generate_plans, workout_names
+from twin_store import EPOCH_ORDINAL, cycle_phases, standard_phase_lengths
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet'
+}
+
+# Athletes planned per vectorized batch; bounds memory at chunk_size x days rows
+DEFAULT_CHUNK_SIZE = 256
+
+# Longest range one export may cover
+MAX_EXPORT_DAYS = 3660
+
+# Fixed Parquet schema so every streamed row group matches the file's schema
+PARQUET_SCHEMA = pa.schema([
+    ('athlete_id', pa.string()),
+    ('date', pa.date32()),
+    ('cycle_day', pa.int16()),
+    ('phase', pa.dictionary(pa.int8(), pa.string())),
+    ('workout', pa.dictionary(pa.int8(), pa.string())),
+    ('intensity', pa.int16())
+])
+
+
+# One DataFrame of plan rows per chunk of athletes, in request order.
+# Athletes without a twin are planned on the standard 28-day layout.
+#
+# cycle_start: date one of each athlete's cycles started, either one date for
+# everyone or a dict of athlete id -> date (missing athletes default to `start`)
+def iter_plan_frames(twin_store, athlete_ids, start, end, cycle_start=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    n_days = (end - start).days + 1
+    if n_days < 1:
+        raise ValueError("The end date must not be before the start date")
+    if n_days > MAX_EXPORT_DAYS:
+        raise ValueError(f"Exports are limited to {MAX_EXPORT_DAYS} days")
+
+    for offset in range(0, len(athlete_ids), chunk_size):
+        chunk = athlete_ids[offset:offset + chunk_size]
+        twins = twin_store.get_many(chunk)
+
+        phase_lengths = np.array([
+            twins[a].phase_lengths if a in twins else standard_phase_lengths for a in chunk
+        ], dtype='int64')
+        if isinstance(cycle_start, dict):
+            starts = [cycle_start.get(a, start).toordinal() for a in chunk]
+        else:
+            starts = (cycle_start or start).toordinal()
+
+        plan = generate_plans(
+            [athlete_key(a) for a in chunk],
+            phase_lengths.sum(axis=1),
+            n_days,
+            first_day=start.toordinal(),
+            cycle_start=starts,
+            phase_lengths=phase_lengths
+        )
+
+        # Text columns are built as categoricals from the plan's integer codes
+        yield pd.DataFrame({
+            'athlete_id': pd.Categorical.from_codes(np.repeat(np.arange(len(chunk)), n_days), chunk),
+            'date': (plan['day'] - EPOCH_ORDINAL).astype('datetime64[D]').ravel(),
+            'cycle_day': plan['cycle_day'].ravel(),
+            'phase': pd.Categorical.from_codes(plan['phase'].ravel(), cycle_phases),
+            'workout': pd.Categorical.from_codes(
+                (plan['phase'].astype('int64') * workout_names.shape[1] + plan['workout']).ravel(),
+                workout_names.ravel()
+            ),
+            'intensity': plan['intensity'].ravel()
+        })
+
+
+# File-like sink for ParquetWriter whose contents are handed out as they are written
+class _StreamSink(io.RawIOBase):
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _iter_ndjson(frames):
+    for frame in frames:
+        frame = frame.assign(date=frame['date'].dt.strftime('%Y-%m-%d'))
+        text = frame.to_json(orient='records', lines=True)
+        yield text if text.endswith('\n') else text + '\n'
+
+
+def _iter_csv(frames):
+    header = True
+    for frame in frames:
+        yield frame.to_csv(index=False, header=header, date_format='%Y-%m-%d')
+        header = False
+
+
+def _iter_parquet(frames):
+    sink = _StreamSink()
+    writer = None
+    try:
+        for frame in frames:
+            table = pa.Table.from_pandas(frame, preserve_index=False).cast(PARQUET_SCHEMA)
+            if writer is None:
+                writer = pq.ParquetWriter(sink, PARQUET_SCHEMA)
+            # Each chunk becomes one row group, streamed as soon as it is written
+            writer.write_table(table)
+            yield sink.drain()
+    finally:
+        if writer is not None:
+            writer.close()
+    yield sink.drain()
+
+
+# Serialize plan frames as a stream of str/bytes chunks in the given format
+def stream_plan_export(frames, fmt):
+    if fmt == 'ndjson':
+        return _iter_ndjson(frames)
+    if fmt == 'csv':
+        return _iter_csv(frames)
+    if fmt == 'parquet':
+        return _iter_parquet(frames)
+    raise ValueError(f"Unknown export format: {fmt!r}")
+
+
+# Read export parameters from a JSON body or the query string:
+# athletes (list or comma-separated), start, end (ISO dates), format
+def parse_export_request(args, body=None):
+    params = dict(args)
+    if body:
+        if not isinstance(body, dict):
+            raise ValueError("The request body must be a JSON object")
+        params.update(body)
+
+    athletes = params.get('athletes') or []
+    if isinstance(athletes, str):
+        athletes = athletes.split(',')
+    elif not isinstance(athletes, list):
+        raise ValueError("Athletes must be a list or a comma-separated string")
+    # Repeated ids are exported once, in the order first given
+    athletes = list(dict.fromkeys(str(a).strip() for a in athletes if str(a).strip()))
+    if not athletes:
+        raise ValueError("No athletes given")
+
+    try:
+        start = datetime.date.fromisoformat(params['start']) if params.get('start') else datetime.date.today()
+        end = datetime.date.fromisoformat(params['end']) if params.get('end') else start + datetime.timedelta(days=27)
+    except (TypeError, ValueError):
+        raise ValueError("Dates must be given as YYYY-MM-DD")
+    if end < start:
+        raise ValueError("The end date must not be before the start date")
+    if (end - start).days + 1 > MAX_EXPORT_DAYS:
+        raise ValueError(f"Exports are limited to {MAX_EXPORT_DAYS} days")
+
+    fmt = params.get('format', 'ndjson')
+    if not isinstance(fmt, str) or fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Format must be one of: {', '.join(EXPORT_FORMATS)}")
+
+    return athletes, start, end, fmt
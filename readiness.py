@@ -0,0 +1,268 @@
+import argparse
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from forecaster import CycleForecaster
+from planner import default_phase_lengths
+from twin_store import DEFAULT_DB_PATH, EPOCH_ORDINAL, SQLiteStore, TwinStore, cycle_phases
+
+# Weight of each component in the readiness score. Components an athlete has
+# not logged for a day drop out and the remaining weights are renormalised.
+COMPONENT_WEIGHTS = {
+    'phase': 0.30,
+    'sleep': 0.20,
+    'hrv': 0.20,
+    'soreness': 0.15,
+    'load': 0.15
+}
+
+# EWMA spans (days) for acute and chronic training load, and the HRV baseline
+ACUTE_SPAN = 7
+CHRONIC_SPAN = 28
+
+TARGET_SLEEP_HOURS = 8.0
+
+# Acute:chronic workload ratios in this range carry no penalty
+ACWR_SWEET_SPOT = (0.8, 1.3)
+
+# Score bands for the readiness dial, highest first: (minimum, label, colour)
+READINESS_BANDS = [
+    (80, 'High Energy Level', '#06d6a0'),
+    (60, 'Moderate Energy Level', '#f59e0b'),
+    (40, 'Low Energy Level', '#fb923c'),
+    (0, 'Rest Recommended', '#ff6b6b')
+]
+
+_INPUT_COLUMNS = ['sleep_hours', 'hrv', 'soreness', 'load']
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS daily_inputs (
+    athlete_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    sleep_hours REAL,
+    hrv REAL,
+    soreness REAL,
+    load REAL,
+    PRIMARY KEY (athlete_id, date)
+);
+CREATE TABLE IF NOT EXISTS readiness_scores (
+    athlete_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    phase INTEGER,
+    score INTEGER NOT NULL,
+    acwr REAL,
+    PRIMARY KEY (athlete_id, date)
+);
+"""
+
+
+def readiness_band(score):
+    for minimum, label, color in READINESS_BANDS:
+        if score >= minimum:
+            return label, color
+    return READINESS_BANDS[-1][1:]
+
+
+# One row per athlete-day, from each athlete's first logged day up to `as_of`.
+# Days without a log keep NaN inputs, except training load which is 0 (rest).
+def _daily_grid(inputs, as_of_ordinal):
+    first = inputs.groupby('athlete_id', sort=True)['day'].min()
+    lengths = np.maximum(as_of_ordinal - first.to_numpy() + 1, 0)
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    grid = pd.DataFrame({
+        'athlete_id': np.repeat(first.index.to_numpy(), lengths),
+        'day': np.repeat(first.to_numpy(), lengths) + offsets
+    })
+    grid = grid.merge(inputs, on=['athlete_id', 'day'], how='left')
+    grid['load'] = grid['load'].fillna(0.0)
+    return grid
+
+
+# Grouped rolling results come back indexed by (athlete, row); realign them with the grid
+def _in_grid_order(series):
+    return series.droplevel(0).sort_index().to_numpy()
+
+
+# Score every athlete-day in one vectorized pass.
+#
+# inputs: DataFrame with athlete_id, day (date ordinal) and the _INPUT_COLUMNS
+# phase_profiles: dict of athlete id -> (phase x metric) array from their twin
+# cycles: dict of athlete id -> (cycle start date, cycle length) from the forecaster
+#
+# Returns a DataFrame with athlete_id, day, phase (-1 when unknown), score and acwr
+def compute_readiness(inputs, phase_profiles, cycles, as_of):
+    grid = _daily_grid(inputs, as_of.toordinal())
+    by_athlete = grid.groupby('athlete_id', sort=True)
+
+    # Training load: EWMA acute vs chronic load
+    acute = _in_grid_order(by_athlete['load'].ewm(span=ACUTE_SPAN, adjust=False).mean())
+    chronic = _in_grid_order(by_athlete['load'].ewm(span=CHRONIC_SPAN, adjust=False).mean())
+    with np.errstate(divide='ignore', invalid='ignore'):
+        acwr = np.where(chronic > 0, acute / chronic, np.nan)
+    low, high = ACWR_SWEET_SPOT
+    load_score = 100 - np.clip(acwr - high, 0, None) * (100 / 0.7) - np.clip(low - acwr, 0, None) * 50
+
+    # HRV relative to the athlete's own baseline up to the day before
+    baseline = by_athlete['hrv'].ewm(span=CHRONIC_SPAN, ignore_na=True).mean().droplevel(0).sort_index()
+    baseline = baseline.groupby(grid['athlete_id']).shift(1).to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        hrv_score = 75 + 250 * (grid['hrv'].to_numpy() / baseline - 1)
+
+    sleep_score = np.clip(grid['sleep_hours'].to_numpy() / TARGET_SLEEP_HOURS, 0, 1) * 100
+    soreness_score = (10 - np.clip(grid['soreness'].to_numpy(), 0, 10)) * 10
+
+    # Phase of every day from the athlete's forecast cycle, and the mean of
+    # their twin's metrics for that phase
+    athletes = by_athlete.size().index.to_numpy()
+    athlete_index = np.repeat(np.arange(len(athletes)), by_athlete.size().to_numpy())
+    profiles = np.full((len(athletes), len(cycle_phases) + 1), np.nan)
+    starts = np.zeros(len(athletes), dtype='int64')
+    cycle_lengths = np.zeros(len(athletes), dtype='int64')
+    for i, athlete_id in enumerate(athletes):
+        profile = phase_profiles.get(athlete_id)
+        if profile is not None:
+            phase_means = np.asarray(profile, dtype='float64').mean(axis=1)
+            profiles[i, :-1] = phase_means
+            profiles[i, -1] = phase_means.mean()
+        if athlete_id in cycles:
+            start, length = cycles[athlete_id]
+            starts[i], cycle_lengths[i] = start.toordinal(), length
+
+    known = cycle_lengths[athlete_index] > 0
+    day_in_cycle = np.where(
+        known,
+        (grid['day'].to_numpy() - starts[athlete_index]) % np.maximum(cycle_lengths[athlete_index], 1),
+        0
+    )
+    phase_ends = np.cumsum(default_phase_lengths(np.where(cycle_lengths > 0, cycle_lengths, 28)), axis=1)[:, :-1]
+    phase = np.where(known, (day_in_cycle[:, None] >= phase_ends[athlete_index]).sum(axis=1), -1)
+    # Athletes without a forecast get the mean over all phases (the last column)
+    phase_score = profiles[athlete_index, phase]
+
+    components = np.column_stack([
+        phase_score, sleep_score, hrv_score, soreness_score, load_score
+    ])
+    components = np.clip(components, 0, 100)
+    weights = np.array([COMPONENT_WEIGHTS[c] for c in ('phase', 'sleep', 'hrv', 'soreness', 'load')])
+    present = ~np.isnan(components)
+    total_weight = (present * weights).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        score = np.nansum(components * weights, axis=1) / total_weight
+
+    result = pd.DataFrame({
+        'athlete_id': grid['athlete_id'].to_numpy(),
+        'day': grid['day'].to_numpy(),
+        'phase': phase,
+        'score': np.rint(score),
+        'acwr': np.round(acwr, 3)
+    })
+    # Load alone is not enough: rest days carry a load of 0 whether or not anything was logged
+    scored = present[:, :-1].any(axis=1)
+    return result[scored].astype({'score': 'int64'})
+
+
+class ReadinessEngine(SQLiteStore):
+    # Daily readiness inputs (sleep, HRV, soreness, training load) per athlete,
+    # combined with the athlete's twin and cycle forecast into a 0-100 score.
+    # Scores are precomputed into readiness_scores (nightly for everyone, and
+    # immediately for an athlete who logs new inputs), so request handlers only
+    # ever read a row.
+    def __init__(self, db_path=DEFAULT_DB_PATH, twin_store=None, forecaster=None):
+        super().__init__(db_path)
+        self.twin_store = twin_store or TwinStore(db_path)
+        self.forecaster = forecaster or CycleForecaster(db_path)
+        self.connection().executescript(_SCHEMA)
+
+    # Log one day's inputs; fields left as None keep any value already logged
+    # for that day. The athlete's scores are refreshed.
+    def log_daily_inputs(self, athlete_id, date, sleep_hours=None, hrv=None, soreness=None, load=None,
+                         as_of=None):
+        self.log_many([(athlete_id, date, sleep_hours, hrv, soreness, load)])
+        self.run_batch(as_of=as_of, athlete_ids=[athlete_id])
+        return self.get_readiness(athlete_id, as_of)
+
+    # Bulk insert of (athlete_id, date, sleep_hours, hrv, soreness, load) rows,
+    # without rescoring
+    def log_many(self, rows):
+        conn = self.connection()
+        with conn:
+            conn.executemany(
+                f"""INSERT INTO daily_inputs VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (athlete_id, date) DO UPDATE SET
+                    {', '.join(f'{c} = COALESCE(excluded.{c}, {c})' for c in _INPUT_COLUMNS)}""",
+                [(athlete_id, date.isoformat(), *values) for athlete_id, date, *values in rows]
+            )
+
+    # Score every athlete-day (or the given athletes') up to a date, in chunks
+    # of athletes. Meant to run nightly after the forecasts, e.g. from cron:
+    #   python forecaster.py nightly && python readiness.py nightly
+    def run_batch(self, as_of=None, athlete_ids=None, chunk_size=5000):
+        as_of = as_of or datetime.date.today()
+        conn = self.connection()
+        if athlete_ids is None:
+            athlete_ids = [row[0] for row in conn.execute(
+                "SELECT DISTINCT athlete_id FROM daily_inputs ORDER BY athlete_id"
+            )]
+
+        written = 0
+        for offset in range(0, len(athlete_ids), chunk_size):
+            chunk = list(athlete_ids[offset:offset + chunk_size])
+            inputs = pd.read_sql_query(
+                f"""SELECT athlete_id, date, {', '.join(_INPUT_COLUMNS)} FROM daily_inputs
+                    WHERE athlete_id IN ({', '.join('?' * len(chunk))}) AND date <= ?""",
+                conn, params=(*chunk, as_of.isoformat())
+            )
+            if inputs.empty:
+                continue
+            dates = pd.to_datetime(inputs.pop('date')).to_numpy().astype('datetime64[D]')
+            inputs['day'] = dates.astype('int64') + EPOCH_ORDINAL
+            inputs[_INPUT_COLUMNS] = inputs[_INPUT_COLUMNS].astype('float64')
+
+            profiles = {a: twin.metrics for a, twin in self.twin_store.get_many(chunk).items()}
+            scores = compute_readiness(inputs, profiles, self.forecaster.current_cycles(chunk), as_of)
+
+            rows = zip(
+                scores['athlete_id'],
+                (scores['day'].to_numpy() - EPOCH_ORDINAL).astype('datetime64[D]').astype(str),
+                np.where(scores['phase'] >= 0, scores['phase'], None).tolist(),
+                scores['score'].tolist(),
+                scores['acwr'].where(scores['acwr'].notna(), None).tolist()
+            )
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO readiness_scores VALUES (?, ?, ?, ?, ?)", rows)
+            written += len(scores)
+        return written
+
+    # Latest precomputed score on or before `as_of`, or None if there is none
+    def get_readiness(self, athlete_id, as_of=None):
+        as_of = as_of or datetime.date.today()
+        row = self.connection().execute(
+            """SELECT date, phase, score, acwr FROM readiness_scores
+               WHERE athlete_id = ? AND date <= ? ORDER BY date DESC LIMIT 1""",
+            (athlete_id, as_of.isoformat())
+        ).fetchone()
+        if row is None:
+            return None
+        date, phase, score, acwr = row
+        label, color = readiness_band(score)
+        return {
+            'date': date,
+            'phase': cycle_phases[phase] if phase is not None else None,
+            'score': score,
+            'acwr': acwr,
+            'label': label,
+            'color': color
+        }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Readiness scores")
+    parser.add_argument('command', choices=['nightly'])
+    parser.add_argument('--db', default=DEFAULT_DB_PATH)
+    parser.add_argument('--as-of', type=datetime.date.fromisoformat, default=None)
+    args = parser.parse_args()
+
+    count = ReadinessEngine(args.db).run_batch(as_of=args.as_of)
+    print(f"Scored {count} athlete-days")
@@ -0,0 +1,145 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from survey_schema import answer_categories, answer_codes
+
+# Band edges: a value falls in band i when edges[i - 1] <= value < edges[i]
+AGE_BANDS = {'edges': [20, 22, 25], 'labels': ['Under 20', '20-21', '22-24', '25+']}
+
+# WHO adult BMI categories
+BMI_BANDS = {'edges': [18.5, 25, 30], 'labels': ['Underweight', 'Normal', 'Overweight', 'Obese']}
+
+# Dimensions the aggregates can be read by
+STRATA_DIMENSIONS = ('age', 'bmi')
+
+# Rows binned per vectorized pass when updating from a large frame
+_UPDATE_CHUNK = 100000
+
+
+# 0-based band of each value (-1 for missing)
+def band_codes(values, edges):
+    values = np.asarray(values, dtype='float64')
+    return np.where(np.isfinite(values), np.searchsorted(edges, values, side='right'), -1)
+
+
+# BMI from the frame's BMI column, or from HEIGHT (cm) and WEIGHT (kg)
+def bmi_values(frame):
+    if 'BMI' in frame.columns:
+        return pd.to_numeric(frame['BMI'], errors='coerce').to_numpy(dtype='float64')
+    if 'HEIGHT' in frame.columns and 'WEIGHT' in frame.columns:
+        height = pd.to_numeric(frame['HEIGHT'], errors='coerce').to_numpy(dtype='float64') / 100
+        return pd.to_numeric(frame['WEIGHT'], errors='coerce').to_numpy(dtype='float64') / height ** 2
+    return np.full(len(frame), np.nan)
+
+
+class StratificationIndex:
+    # Answer histograms and Impact Score totals per (age band, BMI band)
+    # stratum, so the demographic breakdowns are read from small arrays
+    # instead of grouping the responses on every request:
+    #
+    #   counts[s, q, a]     respondents in stratum s answering level a on question q
+    #   respondents[s]      respondents in stratum s
+    #   impact_sum[s]       sum of their Impact Scores (over impact_n[s] scored respondents)
+    #
+    # where s = age_band * len(BMI bands) + bmi_band. Respondents without an
+    # age or BMI are left out. Appending rows adds their counts without
+    # rescanning what was already indexed.
+    def __init__(self, columns, levels=answer_categories, age_bands=AGE_BANDS, bmi_bands=BMI_BANDS,
+                 score_column='Impact Score'):
+        self.columns = list(columns)
+        self.levels = list(levels)
+        self.age_bands = age_bands
+        self.bmi_bands = bmi_bands
+        self.score_column = score_column
+        self._column_index = {col: i for i, col in enumerate(self.columns)}
+        self.shape = (len(age_bands['labels']), len(bmi_bands['labels']))
+        n_strata = self.shape[0] * self.shape[1]
+        self.counts = np.zeros((n_strata, len(self.columns), len(self.levels)), dtype='int64')
+        self.respondents = np.zeros(n_strata, dtype='int64')
+        self.impact_sum = np.zeros(n_strata, dtype='float64')
+        self.impact_n = np.zeros(n_strata, dtype='int64')
+        self.n_rows = 0
+        self._lock = threading.Lock()
+
+    # Add survey rows (a DataFrame holding the index's columns, AGE and BMI
+    # or HEIGHT/WEIGHT, and the score column)
+    def update(self, frame):
+        for start in range(0, len(frame), _UPDATE_CHUNK):
+            chunk = frame.iloc[start:start + _UPDATE_CHUNK]
+            age = chunk['AGE'] if 'AGE' in chunk.columns else np.full(len(chunk), np.nan)
+            scores = chunk[self.score_column] if self.score_column in chunk.columns else np.full(len(chunk), np.nan)
+            self.update_arrays(
+                np.column_stack([answer_codes(chunk[col]) for col in self.columns]),
+                pd.to_numeric(pd.Series(age), errors='coerce').to_numpy(dtype='float64'),
+                bmi_values(chunk),
+                np.asarray(scores, dtype='float64')
+            )
+
+    # Add rows given as answer codes (rows x columns, 0-based level, -1
+    # missing), ages, BMIs and scores (NaN for missing)
+    def update_arrays(self, codes, age, bmi, scores):
+        codes = np.asarray(codes, dtype='int64')
+        if codes.size == 0:
+            return
+        n, k = codes.shape
+        age_band = band_codes(age, self.age_bands['edges'])
+        bmi_band = band_codes(bmi, self.bmi_bands['edges'])
+        stratum = np.where((age_band >= 0) & (bmi_band >= 0), age_band * self.shape[1] + bmi_band, -1)
+        n_strata = len(self.respondents)
+
+        cell = stratum[:, None] * (k * len(self.levels)) + np.arange(k) * len(self.levels) + codes
+        valid = (stratum[:, None] >= 0) & (codes >= 0)
+        added = np.bincount(cell[valid], minlength=self.counts.size).reshape(self.counts.shape)
+
+        placed = stratum >= 0
+        scored = placed & np.isfinite(scores)
+        respondents = np.bincount(stratum[placed], minlength=n_strata)
+        impact_sum = np.bincount(stratum[scored], weights=np.asarray(scores)[scored], minlength=n_strata)
+        impact_n = np.bincount(stratum[scored], minlength=n_strata)
+
+        with self._lock:
+            self.counts += added
+            self.respondents += respondents
+            self.impact_sum += impact_sum
+            self.impact_n += impact_n
+            self.n_rows += n
+
+    # Per-band aggregates along `by` ('age' or 'bmi', or both as a list):
+    # respondents, mean Impact Score and, with a question, the count per
+    # answer level. Bands nobody falls in are kept, with zero respondents.
+    def summary(self, by='age', question=None):
+        by = [by] if isinstance(by, str) else list(by)
+        if not by or any(dimension not in STRATA_DIMENSIONS for dimension in by):
+            raise ValueError(f"by must be one or both of: {', '.join(STRATA_DIMENSIONS)}")
+        if question is not None and question not in self._column_index:
+            raise KeyError(question)
+
+        axes = [STRATA_DIMENSIONS.index(dimension) for dimension in by]
+        summed = tuple(axis for axis in range(2) if axis not in axes)
+
+        def collapse(values):
+            values = values.reshape(self.shape + values.shape[1:]).sum(axis=summed)
+            # Order the grouped axes as requested, then flatten them into rows
+            if axes == [1, 0]:
+                values = values.swapaxes(0, 1)
+            return values.reshape((-1,) + values.shape[len(axes):])
+
+        with self._lock:
+            respondents = collapse(self.respondents)
+            impact_sum = collapse(self.impact_sum)
+            impact_n = collapse(self.impact_n)
+            counts = collapse(self.counts[:, self._column_index[question]]) if question is not None else None
+
+        bands = {'age': self.age_bands['labels'], 'bmi': self.bmi_bands['labels']}
+        index = pd.MultiIndex.from_product([bands[dimension] for dimension in by], names=by)
+        if len(by) == 1:
+            index = index.get_level_values(0)
+        table = pd.DataFrame({'respondents': respondents}, index=index)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            table['mean_impact_score'] = np.where(impact_n > 0, impact_sum / impact_n, np.nan)
+        if counts is not None:
+            for level, column in zip(self.levels, counts.T):
+                table[level] = column
+        return table
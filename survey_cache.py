@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+import tempfile
+
+import pandas as pd
+import pyarrow as pa
+
+from survey_schema import compact_survey_frame, normalize_survey_columns, timestamp_column
+
+# Parsed survey workbooks are cached as uncompressed Arrow IPC (Feather v2) files.
+# Uncompressed IPC can be memory-mapped, so every worker process reading the
+# same cache file shares one copy of the pages through the OS page cache.
+CACHE_DIR = os.environ.get(
+    'CYCLEPERFORM_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache')
+)
+
+# Bump when the cached layout changes so stale files are not picked up
+CACHE_FORMAT_VERSION = '3'
+
+INDEX_FILE = 'survey_index.json'
+
+
+def _hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_index(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, INDEX_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+# Write to a temporary file and rename so concurrent workers never see a partial file
+def _atomic_write(path, write):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _write_index(cache_dir, index):
+    payload = json.dumps(index, indent=2, sort_keys=True).encode()
+    _atomic_write(os.path.join(cache_dir, INDEX_FILE), lambda f: f.write(payload))
+
+
+# Size, mtime and content hash of the source file. Hashing is skipped when the
+# size and mtime match what was recorded last time.
+def file_fingerprint(path, known=None):
+    stat = os.stat(path)
+    if known and known.get('size') == stat.st_size and known.get('mtime_ns') == stat.st_mtime_ns:
+        return known
+    return {
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': _hash_file(path)
+    }
+
+
+def cache_path_for(fingerprint, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, f"survey-{fingerprint['sha256'][:24]}-v{CACHE_FORMAT_VERSION}.arrow")
+
+
+# Parse a raw XLSX/CSV export onto the canonical schema, with the answer
+# columns stored as 1-3 categoricals, demographics downcast and names hashed
+def read_survey_file(path):
+    if path.lower().endswith('.csv'):
+        df = pd.read_csv(path)
+    else:
+        df = pd.read_excel(path)
+
+    df = normalize_survey_columns(df)
+    if timestamp_column in df.columns:
+        df[timestamp_column] = pd.to_datetime(df[timestamp_column], errors='coerce')
+
+    return compact_survey_frame(df)
+
+
+def _write_cache(df, path, fingerprint, source_path):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        b'cycleperform.source': os.path.abspath(source_path).encode(),
+        b'cycleperform.fingerprint': json.dumps(fingerprint).encode()
+    })
+
+    def write(f):
+        with pa.ipc.new_file(f, table.schema) as writer:
+            writer.write_table(table)
+
+    _atomic_write(path, write)
+
+
+# Zero-copy read of the Arrow file; pandas conversion reuses the mapped
+# buffers where the column layout allows it
+def _read_cache(path):
+    source = pa.memory_map(path, 'r')
+    table = pa.ipc.open_file(source).read_all()
+    return table.to_pandas(split_blocks=True)
+
+
+# Load a survey export, parsing the workbook only when no cache entry exists
+# for its current content
+def load_survey_frame(path, cache_dir=CACHE_DIR):
+    os.makedirs(cache_dir, exist_ok=True)
+    source_key = os.path.abspath(path)
+
+    index = _read_index(cache_dir)
+    fingerprint = file_fingerprint(path, index.get(source_key))
+    cache_path = cache_path_for(fingerprint, cache_dir)
+
+    if os.path.exists(cache_path):
+        try:
+            df = _read_cache(cache_path)
+        except (OSError, pa.ArrowInvalid):
+            df = None
+        if df is not None:
+            if index.get(source_key) != fingerprint:
+                index[source_key] = fingerprint
+                _write_index(cache_dir, index)
+            return df
+
+    df = read_survey_file(path)
+    _write_cache(df, cache_path, fingerprint, path)
+
+    index[source_key] = fingerprint
+    _write_index(cache_dir, index)
+
+    return df
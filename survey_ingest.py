@@ -0,0 +1,109 @@
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from survey_cache import CACHE_DIR, load_survey_frame
+from survey_schema import question_labels, demographic_columns, timestamp_column, compact_survey_frame
+
+# File types we know how to read as survey exports
+SURVEY_EXTENSIONS = ('.xlsx', '.xls', '.csv')
+
+
+# Expand a survey source into export files. A source can be a single file,
+# a directory (every export inside it) or a glob pattern; several sources can
+# be given as a list or joined with os.pathsep.
+def resolve_survey_files(source):
+    if isinstance(source, str):
+        source = [s for s in source.split(os.pathsep) if s]
+
+    files = set()
+    for entry in source:
+        entry = os.path.expanduser(entry)
+        if os.path.isdir(entry):
+            candidates = glob.glob(os.path.join(entry, '*'))
+        elif glob.has_magic(entry):
+            candidates = glob.glob(entry, recursive=True)
+        else:
+            candidates = [entry] if os.path.exists(entry) else []
+        for path in candidates:
+            name = os.path.basename(path)
+            # Skip Office lock files left next to open workbooks
+            if name.startswith('~$') or not name.lower().endswith(SURVEY_EXTENSIONS):
+                continue
+            files.add(os.path.abspath(path))
+
+    # Oldest export first so newer exports win when deduplicating
+    return sorted(files, key=lambda p: (os.stat(p).st_mtime_ns, p))
+
+
+# Runs in a pool worker: parse the export into its Arrow cache entry.
+# The parent then memory-maps the cache, so no frame is pickled back.
+def _warm_cache(path, cache_dir):
+    load_survey_frame(path, cache_dir)
+    return path
+
+
+# Drop repeated responses. With a submission timestamp a response is identified
+# by (timestamp, respondent); otherwise only exact repeats are dropped, which is
+# what re-downloading the same export produces.
+def deduplicate_responses(df):
+    if timestamp_column in df.columns and 'NAME' in df.columns:
+        keys = [timestamp_column, 'NAME']
+    else:
+        keys = [c for c in demographic_columns + list(question_labels) if c in df.columns]
+    if not keys:
+        return df
+    return df.drop_duplicates(subset=keys, keep='last').reset_index(drop=True)
+
+
+class SurveyIngestor:
+    # Loads and merges every export under `source`. Parsed frames are kept per
+    # file, so refresh() only re-reads files whose mtime changed.
+    def __init__(self, source, cache_dir=CACHE_DIR, max_workers=None):
+        self.source = source
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self._frames = {}
+        self._mtimes = {}
+        self.df = None
+
+    def refresh(self):
+        files = resolve_survey_files(self.source)
+        if not files:
+            raise FileNotFoundError(f"No survey exports found for source: {self.source!r}")
+
+        mtimes = {path: os.stat(path).st_mtime_ns for path in files}
+        changed = [path for path in files if self._mtimes.get(path) != mtimes[path]]
+        removed = [path for path in self._frames if path not in mtimes]
+
+        if not changed and not removed and self.df is not None:
+            return self.df, False
+
+        # Parse the new/changed exports in parallel; a single file is cheaper inline
+        if len(changed) > 1:
+            workers = min(len(changed), self.max_workers or os.cpu_count() or 1)
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(_warm_cache, changed, [self.cache_dir] * len(changed)))
+
+        for path in changed:
+            self._frames[path] = load_survey_frame(path, self.cache_dir)
+            self._mtimes[path] = mtimes[path]
+        for path in removed:
+            del self._frames[path]
+            del self._mtimes[path]
+
+        frames = [self._frames[path] for path in files]
+        df = frames[0]
+        if len(frames) > 1:
+            # A column missing from one export makes concat fall back to a
+            # wider dtype (object for answers, float64 for demographics)
+            df = compact_survey_frame(pd.concat(frames, ignore_index=True))
+
+        self.df = deduplicate_responses(df)
+        return self.df, True
+
+    def load(self):
+        df, _ = self.refresh()
+        return df
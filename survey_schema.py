@@ -0,0 +1,153 @@
+import re
+
+# Shorthand question labels for better readability in visualizations
+question_labels = {
+    "1- Do you face menstrual cycle irregularity ?": "Cycle Irregularity",
+    "2- Have you been educated or informed about how the menstrual cycle may influence recreational athletic activities?": "Education on Cycle Effects",
+    "3- Do you perceive the general effect of your menstrual cycle on your engagement in recreational physical activity ": "Effect on Engagement",
+    "4- Do you recognise fluctuations in your energy levels throughout different phases of your menstrual cycle?": "Energy Fluctuations",
+    "5- Do you have a specific pre warm up routine or rituals that you follow taking into account your menstrual cycle phases? ": "Adjusted Warm-Up",
+    "6- Does your motivation for physical activities get influenced by your menstrual cycle?": "Motivation Impact",
+    "7- Have you modified the intensity or duration of your recreational activities depending on the stage of your menstrual cycle?": "Modified Intensity/Duration",
+    "8- Do you notice alterations in strength or endurance during particular phases of your menstrual cycle? ": "Strength/Endurance Changes",
+    "9- Does your menstrual cycle impact the agility and coordination while participating in physical activity?": "Agility/Coordination Impact",
+    "10- Does your menstrual cycle affect your capacity to partake in high intensity exercise? ": "High Intensity Capability",
+    "11- Do you experience fluctuations in flexibility or joint health throughout your menstrual cycle? ": "Flexibility Changes",
+    "12- Do you sense greater fatigue or muscle soreness during specific periods of the menstrual cycle while performing any physical activity?": "Fatigue/Soreness",
+    "13- Does menstrual discomfort like cramps, bloating or changes in mood influence your training or competitive  performance?": "Discomfort Effect",
+    "14- Do you perceive difference in the duration it takes for recovery after participating in recreational activities during your menstrual cycle? ": "Recovery Time Change",
+    "15- Do you implement psychological strategies to sustain focus and a positive mindset during recreational athletic activities, particularly when navigating challenges associated with the menstrual cycle?": "Psychological Strategies"
+}
+
+# Map numeric responses to meaningful labels for better visualization
+# Based on our analysis, 1 generally indicates higher impact, 3 lower impact
+response_mapping = {1: "High Impact", 2: "Moderate Impact", 3: "Low Impact"}
+
+# Every question is answered on the same 1-3 scale
+answer_categories = list(response_mapping)
+
+# Questions averaged into the Impact Score
+impact_questions = [
+    "Effect on Engagement",
+    "Motivation Impact",
+    "Strength/Endurance Changes",
+    "High Intensity Capability",
+    "Fatigue/Soreness"
+]
+
+
+# Store a 1-3 answer column as an ordered categorical (one byte per answer)
+# Anything outside the scale is treated as missing
+def to_answer_categorical(values):
+    import numpy as np
+    import pandas as pd
+
+    values = pd.to_numeric(pd.Series(values), errors='coerce').to_numpy(dtype='float64')
+    codes = np.full(len(values), -1, dtype='int8')
+    for code, answer in enumerate(answer_categories):
+        codes[values == answer] = code
+    return pd.Categorical.from_codes(codes, categories=answer_categories, ordered=True)
+
+
+# Numeric view of an answer column (float, NaN for missing) for arithmetic
+def answer_values(series):
+    import numpy as np
+    import pandas as pd
+
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes = series.cat.codes.to_numpy()
+        categories = np.asarray(series.cat.categories, dtype='float64')
+        return pd.Series(np.where(codes >= 0, categories[codes], np.nan), index=series.index, name=series.name)
+    return pd.to_numeric(series, errors='coerce')
+
+
+# Respondent fields carried alongside the answers
+demographic_columns = ['NAME', 'AGE', 'HEIGHT', 'WEIGHT', 'BMI']
+
+# Demographics stored as numbers
+numeric_demographics = ['AGE', 'HEIGHT', 'WEIGHT', 'BMI']
+
+# Form exports (e.g. Google Forms) stamp each response with its submission time
+timestamp_column = 'Timestamp'
+
+
+# Reduce a header to a comparable key: drop the "1-" numbering, case and spacing
+def _header_key(name):
+    key = re.sub(r'^\s*\d+\s*[-.)]\s*', '', str(name))
+    key = re.sub(r'\s+', ' ', key).strip().rstrip('?').strip()
+    return key.lower()
+
+
+_canonical_headers = {}
+for _question, _label in question_labels.items():
+    _canonical_headers[_header_key(_question)] = _question
+    _canonical_headers[_header_key(_label)] = _question
+for _col in demographic_columns + [timestamp_column]:
+    _canonical_headers[_header_key(_col)] = _col
+
+
+# Rename an export's columns onto the canonical schema and drop everything else,
+# so exports with reworded headers or extra columns concatenate cleanly
+def normalize_survey_columns(df):
+    renames = {}
+    for col in df.columns:
+        canonical = _canonical_headers.get(_header_key(col))
+        if canonical is not None and canonical not in renames.values():
+            renames[col] = canonical
+    return df[list(renames)].rename(columns=renames)
+
+
+# 0-based answer level codes of an answer column (-1 for missing), for indexing
+def answer_codes(series):
+    import pandas as pd
+
+    if not isinstance(series.dtype, pd.CategoricalDtype):
+        series = pd.Series(to_answer_categorical(series))
+    return series.cat.codes.to_numpy()
+
+
+# Smallest dtype that holds a numeric demographic column: an unsigned integer
+# when every value is a non-negative whole number, float32 otherwise
+def compact_numeric(series):
+    import numpy as np
+    import pandas as pd
+
+    if series.dtype.kind in 'uf' and series.dtype.itemsize <= 4:
+        return series
+    values = pd.to_numeric(series, errors='coerce').to_numpy(dtype='float64')
+    if len(values) and np.isfinite(values).all() and (values >= 0).all() and (values == np.round(values)).all():
+        values = pd.to_numeric(values.astype('int64'), downcast='unsigned')
+    else:
+        values = values.astype('float32')
+    return pd.Series(values, index=series.index, name=series.name)
+
+
+# Respondent names are replaced by a 64-bit hash when an export is parsed, so
+# responses can still be told apart and deduplicated but names are never
+# cached or held in memory
+def hash_names(series):
+    import pandas as pd
+
+    if series.dtype == 'uint64':
+        return series
+    hashes = pd.util.hash_array(series.astype(str).to_numpy(dtype=object))
+    return pd.Series(hashes, index=series.index, name=series.name)
+
+
+# Store an export compactly: answers as one-byte categoricals, numeric
+# demographics downcast and names hashed. Columns already stored that way are
+# left alone, so this is cheap to re-apply after merging exports.
+def compact_survey_frame(df):
+    import pandas as pd
+
+    for col in question_labels:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = to_answer_categorical(df[col])
+    for col in numeric_demographics:
+        if col in df.columns:
+            compacted = compact_numeric(df[col])
+            if compacted is not df[col]:
+                df[col] = compacted
+    if 'NAME' in df.columns and df['NAME'].dtype != 'uint64':
+        df['NAME'] = hash_names(df['NAME'])
+    return df
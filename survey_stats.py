@@ -0,0 +1,240 @@
+import hashlib
+import json
+import math
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from correlation_engine import (CORRELATION_METHODS, pearson_from_tables, spearman_from_tables,
+                                kendall_from_tables, polychoric_from_tables)
+from survey_cache import CACHE_DIR
+from survey_schema import answer_categories
+
+# Bump when the stored arrays change so stale files are not picked up
+STATS_FORMAT_VERSION = '1'
+
+DEFAULT_RESAMPLES = int(os.environ.get('CYCLEPERFORM_BOOTSTRAP_RESAMPLES', 1000))
+DEFAULT_CONFIDENCE = 0.95
+
+# Replicates per pool task; fixed so results do not depend on the worker count
+_TASK_RESAMPLES = 100
+
+# Replicates evaluated together inside a task, bounding the polychoric search's
+# intermediate arrays
+_BATCH_RESAMPLES = 25
+
+# Golden-section iterations for replicate polychoric correlations: the bracket
+# ends ~1e-4 wide, well inside any interval's width
+_BOOTSTRAP_POLYCHORIC_ITERATIONS = 20
+
+_TABLE_CORRELATIONS = {
+    'pearson': pearson_from_tables,
+    'spearman': spearman_from_tables,
+    'kendall': kendall_from_tables,
+    'polychoric': lambda tables: polychoric_from_tables(tables, iterations=_BOOTSTRAP_POLYCHORIC_ITERATIONS)
+}
+
+
+# Upper tail of the chi-square distribution, in closed form for integer
+# degrees of freedom
+def chi2_sf(statistic, dof):
+    if dof < 1 or not np.isfinite(statistic):
+        return math.nan
+    half = statistic / 2
+    if dof % 2 == 0:
+        term = total = 1.0
+        for i in range(1, dof // 2):
+            term *= half / i
+            total += term
+        return min(1.0, math.exp(-half) * total)
+    term = math.sqrt(2 * statistic / math.pi) * math.exp(-half)
+    total = math.erfc(math.sqrt(half))
+    for i in range(1, (dof + 1) // 2):
+        total += term
+        term *= statistic / (2 * i + 1)
+    return min(1.0, total)
+
+
+# Pearson's chi-square test of independence for each joint answer table
+# (..., L, L); levels nobody gave are left out of the degrees of freedom
+def chi_square_tests(tables):
+    tables = np.asarray(tables, dtype='float64')
+    n = tables.sum(axis=(-2, -1))
+    rows, cols = tables.sum(axis=-1), tables.sum(axis=-2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        expected = rows[..., :, None] * cols[..., None, :] / n[..., None, None]
+        statistic = np.where(expected > 0, (tables - expected) ** 2 / expected, 0.0).sum(axis=(-2, -1))
+    dof = ((rows > 0).sum(-1) - 1) * ((cols > 0).sum(-1) - 1)
+    statistic = np.where(dof > 0, statistic, np.nan)
+    p_value = np.vectorize(chi2_sf, otypes=['float64'])(statistic, dof)
+    return statistic, dof, p_value
+
+
+# Runs in a pool worker: `n_resamples` bootstrap replicates of the pair tables.
+# Resampling n_rows respondents with replacement draws each pair's table
+# (plus a cell for respondents who skipped either question) from a
+# multinomial, so a replicate never touches the responses themselves.
+def _bootstrap_task(tables, n_rows, n_resamples, methods, seed):
+    rng = np.random.default_rng(seed)
+    n_pairs, n_levels = tables.shape[0], tables.shape[-1]
+    cells = tables.reshape(n_pairs, -1)
+    probabilities = np.column_stack([cells, n_rows - cells.sum(axis=1)]) / n_rows
+
+    draws = rng.multinomial(n_rows, probabilities, size=(n_resamples, n_pairs))[..., :-1]
+    draws = draws.reshape(n_resamples, n_pairs, n_levels, n_levels)
+    correlations = {method: np.empty((n_resamples, n_pairs)) for method in methods}
+    for start in range(0, n_resamples, _BATCH_RESAMPLES):
+        batch = draws[start:start + _BATCH_RESAMPLES].astype('float64')
+        for method in methods:
+            correlations[method][start:start + _BATCH_RESAMPLES] = _TABLE_CORRELATIONS[method](batch)
+    return draws.astype('int32'), correlations
+
+
+def _atomic_save(path, arrays):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class SurveyStatistics:
+    # Bootstrap confidence intervals for the answer counts and correlation
+    # matrices, and chi-square tests of every question against every other,
+    # computed from a CorrelationEngine's joint answer tables:
+    #
+    #   count_ci[0 or 1, q, c, m, a]   lower/upper bound on the respondents answering
+    #                                  level a on question q among those whose answer
+    #                                  to question c is in answer subset m (bitmask - 1)
+    #   correlation_ci[method][0 or 1] lower/upper bound on the correlation matrix
+    #   chi2_statistic/chi2_dof/chi2_p_value[q, c]
+    #                                  test of independence between questions q and c
+    #
+    # The unfiltered counts of q are count_ci[:, q, q, all answers]. Everything
+    # is computed once per data version and stored on disk, so reading an
+    # interval never resamples.
+    def __init__(self, columns, arrays, levels=answer_categories):
+        self.columns = list(columns)
+        self.levels = list(levels)
+        self._column_index = {col: i for i, col in enumerate(self.columns)}
+        self.arrays = arrays
+        self.confidence = float(arrays['confidence'])
+        self.count_ci = arrays['count_ci']
+        self.correlation_ci = {method: arrays[f'correlation_ci_{method}'] for method in CORRELATION_METHODS
+                               if f'correlation_ci_{method}' in arrays}
+        self.chi2_statistic = arrays['chi2_statistic']
+        self.chi2_dof = arrays['chi2_dof']
+        self.chi2_p_value = arrays['chi2_p_value']
+
+    # Cache key: the engine's sufficient statistics and the bootstrap parameters
+    @staticmethod
+    def version(engine, **params):
+        digest = hashlib.sha256()
+        digest.update(json.dumps({
+            'format': STATS_FORMAT_VERSION,
+            'columns': engine.columns,
+            'levels': engine.levels.tolist(),
+            'n_rows': engine.n_rows,
+            **params
+        }, sort_keys=True).encode())
+        digest.update(np.ascontiguousarray(engine.tables).tobytes())
+        return digest.hexdigest()
+
+    @classmethod
+    def compute(cls, engine, n_resamples=DEFAULT_RESAMPLES, confidence=DEFAULT_CONFIDENCE, seed=0,
+                methods=tuple(CORRELATION_METHODS), max_workers=None):
+        k, n_levels = len(engine.columns), len(engine.levels)
+        upper = np.triu_indices(k)
+        tables = engine.tables[upper]
+
+        # Replicates are split into fixed-size tasks, each with its own seed
+        sizes = [min(_TASK_RESAMPLES, n_resamples - start) for start in range(0, n_resamples, _TASK_RESAMPLES)]
+        seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+        args = [(tables, engine.n_rows, size, tuple(methods), task_seed) for size, task_seed in zip(sizes, seeds)]
+        workers = min(len(args), max_workers or os.cpu_count() or 1)
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(_bootstrap_task, *zip(*args)))
+        else:
+            results = [_bootstrap_task(*task) for task in args]
+
+        bounds = [50 * (1 - confidence), 50 * (1 + confidence)]
+        arrays = {'confidence': np.float64(confidence)}
+
+        # Full (q, c) replicate tables, rows indexed by q's answer
+        pair_draws = np.concatenate([draws for draws, _ in results])
+        draws = np.empty((len(pair_draws), k, k, n_levels, n_levels), dtype='int32')
+        draws[:, upper[0], upper[1]] = pair_draws
+        draws[:, upper[1], upper[0]] = pair_draws.swapaxes(-1, -2)
+
+        # Counts among each subset of the cohort question's answers
+        subsets = [[b for b in range(n_levels) if mask >> b & 1] for mask in range(1, 2 ** n_levels)]
+        subset_counts = np.stack([draws[..., subset].sum(axis=-1) for subset in subsets], axis=3)
+        arrays['count_ci'] = np.percentile(subset_counts, bounds, axis=0)
+
+        for method in methods:
+            replicates = np.concatenate([correlations[method] for _, correlations in results])
+            with np.errstate(invalid='ignore'):
+                pair_bounds = np.nanpercentile(replicates, bounds, axis=0)
+            matrix = np.full((2, k, k), np.nan)
+            matrix[:, upper[0], upper[1]] = pair_bounds
+            matrix[:, upper[1], upper[0]] = pair_bounds
+            for bound in matrix:
+                np.fill_diagonal(bound, 1.0)
+            arrays[f'correlation_ci_{method}'] = matrix
+
+        statistic, dof, p_value = chi_square_tests(engine.tables)
+        arrays['chi2_statistic'], arrays['chi2_dof'], arrays['chi2_p_value'] = statistic, dof, p_value
+        return cls(engine.columns, arrays)
+
+    # Read the statistics for the engine's current data from the disk cache,
+    # computing and storing them when no entry exists
+    @classmethod
+    def load_or_compute(cls, engine, cache_dir=CACHE_DIR, n_resamples=DEFAULT_RESAMPLES,
+                        confidence=DEFAULT_CONFIDENCE, seed=0, methods=tuple(CORRELATION_METHODS), max_workers=None):
+        params = {'n_resamples': n_resamples, 'confidence': confidence, 'seed': seed, 'methods': list(methods)}
+        os.makedirs(cache_dir, exist_ok=True)
+        path = os.path.join(cache_dir, f"survey-stats-{cls.version(engine, **params)[:24]}-v{STATS_FORMAT_VERSION}.npz")
+
+        if os.path.exists(path):
+            try:
+                with np.load(path) as stored:
+                    return cls(engine.columns, dict(stored))
+            except (OSError, ValueError, KeyError):
+                pass
+
+        stats = cls.compute(engine, n_resamples, confidence, seed, methods, max_workers)
+        _atomic_save(path, stats.arrays)
+        return stats
+
+    # Lower and upper bounds on the count per answer level for a question,
+    # optionally among respondents giving any of `cohort_answers` to `cohort`
+    def count_interval(self, question, cohort=None, cohort_answers=None):
+        q = self._column_index[question]
+        if cohort is None:
+            c, mask = q, 2 ** len(self.levels) - 1
+        else:
+            c = self._column_index[cohort]
+            mask = sum(1 << self.levels.index(answer) for answer in cohort_answers)
+        lower, upper = self.count_ci[:, q, c, mask - 1]
+        return pd.Series(lower, index=self.levels, name=question), pd.Series(upper, index=self.levels, name=question)
+
+    # Lower and upper bound matrices for a correlation method
+    def correlation_interval(self, method):
+        return self.correlation_ci[method][0], self.correlation_ci[method][1]
+
+    # Chi-square test of independence between the answers to two questions
+    def chi_square(self, question, cohort):
+        q, c = self._column_index[question], self._column_index[cohort]
+        return {
+            'statistic': float(self.chi2_statistic[q, c]),
+            'dof': int(self.chi2_dof[q, c]),
+            'p_value': float(self.chi2_p_value[q, c])
+        }
@@ -0,0 +1,292 @@
+import argparse
+import datetime
+import os
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from correlation_engine import CorrelationEngine
+from planner import default_phase_lengths
+from survey_schema import question_labels, answer_categories, timestamp_column
+from twin_store import DEFAULT_PHASE_PROFILE, cycle_phases, phase_metrics
+
+# Answer shares (levels 1, 2, 3) per question in the bundled survey, used when
+# no survey is given to fit the model to
+DEFAULT_MARGINALS = {
+    "Cycle Irregularity": (0.29, 0.40, 0.31),
+    "Education on Cycle Effects": (0.67, 0.22, 0.11),
+    "Effect on Engagement": (0.52, 0.27, 0.21),
+    "Energy Fluctuations": (0.75, 0.10, 0.15),
+    "Adjusted Warm-Up": (0.34, 0.49, 0.17),
+    "Motivation Impact": (0.57, 0.22, 0.21),
+    "Modified Intensity/Duration": (0.53, 0.26, 0.21),
+    "Strength/Endurance Changes": (0.63, 0.14, 0.23),
+    "Agility/Coordination Impact": (0.58, 0.18, 0.24),
+    "High Intensity Capability": (0.61, 0.18, 0.21),
+    "Flexibility Changes": (0.54, 0.27, 0.19),
+    "Fatigue/Soreness": (0.57, 0.18, 0.25),
+    "Discomfort Effect": (0.69, 0.10, 0.21),
+    "Recovery Time Change": (0.53, 0.24, 0.23),
+    "Psychological Strategies": (0.52, 0.22, 0.26)
+}
+
+# Average polychoric correlation between questions in the bundled survey
+DEFAULT_CORRELATION = 0.38
+
+# (mean, sd, min, max) of the respondent measurements in the bundled survey
+DEMOGRAPHICS = {
+    'AGE': (21.3, 1.9, 18, 31),
+    'HEIGHT': (160.7, 6.1, 145, 180),
+    'WEIGHT': (54.8, 8.3, 40, 95)
+}
+
+SYNTHETIC_FORMATS = ('csv', 'parquet', 'xlsx')
+
+# Rows per worksheet in an XLSX file, header included
+XLSX_MAX_ROWS = 1048576
+
+_standard_normal = NormalDist()
+
+
+# Nearest valid correlation matrix: clip negative eigenvalues, restore the unit diagonal
+def _nearest_correlation(matrix):
+    matrix = (np.asarray(matrix, dtype='float64') + np.asarray(matrix, dtype='float64').T) / 2
+    eigenvalues, eigenvectors = np.linalg.eigh(matrix)
+    matrix = (eigenvectors * np.clip(eigenvalues, 1e-6, None)) @ eigenvectors.T
+    scale = np.sqrt(np.diag(matrix))
+    return matrix / np.outer(scale, scale)
+
+
+# Latent correlation between the questions: a single number for the same
+# correlation between every pair, or a full questions x questions matrix
+def correlation_matrix(correlation, k):
+    if np.isscalar(correlation):
+        if not -1 / (k - 1) < correlation < 1:
+            raise ValueError(f"A common correlation must lie in ({-1 / (k - 1):.3f}, 1)")
+        matrix = np.full((k, k), float(correlation))
+        np.fill_diagonal(matrix, 1.0)
+        return matrix
+    matrix = np.asarray(correlation, dtype='float64')
+    if matrix.shape != (k, k):
+        raise ValueError(f"Correlation matrix must be {k}x{k}, got {matrix.shape}")
+    return _nearest_correlation(matrix)
+
+
+# Marginals and latent (polychoric) correlations of a real survey frame, as
+# keyword arguments for iter_survey_chunks
+def fit_survey_model(frame):
+    columns = [col for col in question_labels if col in frame.columns]
+    engine = CorrelationEngine(columns)
+    engine.update(frame)
+    marginals = {}
+    for col in columns:
+        counts = frame[col].value_counts().reindex(answer_categories, fill_value=0).to_numpy(dtype='float64')
+        marginals[question_labels[col]] = tuple(counts / counts.sum())
+    return {
+        'marginals': marginals,
+        'correlation': engine.matrix('polychoric'),
+        'missing_rate': float(frame[columns].isna().to_numpy().mean())
+    }
+
+
+# Survey responses on the export schema (demographics, full question text,
+# answers 1-3), `chunk_size` rows at a time.
+#
+# Answers follow a Gaussian copula: latent normal scores with the given
+# correlation are cut at thresholds that reproduce each question's answer
+# shares, so both the marginals and the dependence between questions are
+# controlled. `missing_rate` blanks that share of answers at random.
+def iter_survey_chunks(rows, chunk_size=100000, marginals=None, correlation=DEFAULT_CORRELATION,
+                       missing_rate=0.0, seed=0, start=datetime.datetime(2024, 1, 1)):
+    marginals = marginals or DEFAULT_MARGINALS
+    columns = list(question_labels)
+    k = len(columns)
+    cholesky = np.linalg.cholesky(correlation_matrix(correlation, k))
+
+    # Latent thresholds between levels 1|2 and 2|3 per question
+    thresholds = np.empty((k, len(answer_categories) - 1))
+    for i, col in enumerate(columns):
+        shares = np.asarray(marginals[question_labels[col]], dtype='float64')
+        cumulative = np.cumsum(shares / shares.sum())[:-1]
+        thresholds[i] = [_standard_normal.inv_cdf(min(max(p, 1e-9), 1 - 1e-9)) for p in cumulative]
+
+    rng = np.random.default_rng(seed)
+    levels = np.asarray(answer_categories, dtype='int8')
+    for offset in range(0, rows, chunk_size):
+        n = min(chunk_size, rows - offset)
+        latent = rng.standard_normal((n, k)) @ cholesky.T
+        codes = (latent[:, :, None] > thresholds[None, :, :]).sum(axis=-1)
+
+        chunk = pd.DataFrame({timestamp_column: start + pd.to_timedelta(offset + np.arange(n), unit='min')})
+        chunk['NAME'] = 'S' + pd.Series(np.arange(offset + 1, offset + n + 1)).astype(str)
+        for column, (mean, sd, low, high) in DEMOGRAPHICS.items():
+            chunk[column] = np.clip(np.rint(rng.normal(mean, sd, n)), low, high).astype('int16')
+        chunk['BMI'] = chunk['WEIGHT'] / (chunk['HEIGHT'] / 100) ** 2
+        for i, col in enumerate(columns):
+            answers = pd.array(levels[codes[:, i]], dtype='Int8')
+            if missing_rate:
+                answers[rng.random(n) < missing_rate] = pd.NA
+            chunk[col] = answers
+        yield chunk
+
+
+# Daily cycle and performance history for `athletes` athletes over `days`
+# days, in chunks of whole athletes of about `chunk_size` rows.
+#
+# Each athlete gets a cycle length (and the phase lengths that go with it), a
+# cycle start, and a phase profile scattered around DEFAULT_PHASE_PROFILE.
+# Daily metrics follow the profile of the day's phase plus AR(1) noise, and
+# sleep, HRV, soreness and training load respond to the phase and to each other.
+def iter_athlete_chunks(athletes, days, chunk_size=100000, start=datetime.date(2024, 1, 1), seed=0,
+                        profile=DEFAULT_PHASE_PROFILE, noise=5.0, persistence=0.6):
+    dates = pd.date_range(start, periods=days, freq='D')
+    weekday = dates.dayofweek.to_numpy()
+    per_chunk = max(1, chunk_size // max(days, 1))
+
+    for first in range(0, athletes, per_chunk):
+        rng = np.random.default_rng((seed, first))
+        n = min(per_chunk, athletes - first)
+
+        cycle_lengths = np.clip(np.rint(rng.normal(28, 2.5, n)), 21, 45).astype('int64')
+        boundaries = np.cumsum(default_phase_lengths(cycle_lengths), axis=1)
+        cycle_day = (np.arange(days)[None, :] + rng.integers(0, cycle_lengths)[:, None]) % cycle_lengths[:, None]
+        phase = (cycle_day[:, :, None] >= boundaries[:, None, :-1]).sum(axis=-1)
+
+        # Athlete profiles: a personal offset plus per-(phase, metric) scatter
+        profiles = (profile[None] + rng.normal(0, 5, (n, 1, 1))
+                    + rng.normal(0, 4, (n,) + profile.shape))
+        expected = np.take_along_axis(profiles, phase[:, :, None], axis=1)
+
+        # AR(1) day-to-day variation around the expected values
+        shocks = rng.normal(0, noise * np.sqrt(1 - persistence ** 2), expected.shape)
+        for day in range(1, days):
+            shocks[:, day] += persistence * shocks[:, day - 1]
+        metrics = np.clip(expected + shocks, 0, 100)
+
+        # Rest days on a personal weekday; load scales with the day's intensity
+        rest_day = rng.integers(0, 7, n)
+        training = weekday[None, :] != rest_day[:, None]
+        intensity = metrics[:, :, phase_metrics.index('Recommended Intensity')]
+        load = np.where(training, intensity * rng.uniform(0.8, 1.6, (n, days)), 0.0)
+
+        late_cycle = np.isin(phase, [cycle_phases.index('Menstrual'), cycle_phases.index('Luteal')])
+        sleep_hours = np.clip(rng.normal(7.5, 0.8, (n, days)) - 0.4 * late_cycle, 3, 12)
+        hrv = (rng.normal(65, 15, n)[:, None] * (1 - 0.06 * late_cycle)
+               * np.exp(rng.normal(0, 0.08, (n, days))))
+        previous_load = np.concatenate([np.zeros((n, 1)), load[:, :-1]], axis=1)
+        soreness = np.clip(1 + previous_load / 30 + 1.5 * late_cycle + rng.normal(0, 1, (n, days)), 0, 10)
+
+        chunk = pd.DataFrame({
+            'athlete_id': np.repeat([f'athlete-{i:07d}' for i in range(first, first + n)], days),
+            'date': np.tile(dates.date, n),
+            'cycle_length': np.repeat(cycle_lengths, days).astype('int8'),
+            'cycle_day': (cycle_day + 1).ravel().astype('int8'),
+            'phase': pd.Categorical.from_codes(phase.ravel(), categories=cycle_phases)
+        })
+        for i, metric in enumerate(phase_metrics):
+            chunk[metric] = metrics[:, :, i].ravel().round(1)
+        chunk['sleep_hours'] = sleep_hours.ravel().round(2)
+        chunk['hrv'] = hrv.ravel().round(1)
+        chunk['soreness'] = soreness.ravel().round(1)
+        chunk['load'] = load.ravel().round(1)
+        yield chunk
+
+
+def _write_csv(chunks, path):
+    with open(path, 'w', newline='') as f:
+        for i, chunk in enumerate(chunks):
+            chunk.to_csv(f, index=False, header=i == 0)
+            yield len(chunk)
+
+
+def _write_parquet(chunks, path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    try:
+        for chunk in chunks:
+            if writer is None:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                writer = pq.ParquetWriter(path, table.schema)
+            else:
+                table = pa.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False)
+            writer.write_table(table)
+            yield len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+# Write-only workbooks stream rows to disk; past the sheet limit rows go on
+# to another worksheet (survey ingest only reads the first)
+def _write_xlsx(chunks, path):
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet, sheet_rows, header = None, 0, None
+    try:
+        for chunk in chunks:
+            header = header or list(chunk.columns)
+            values = chunk.astype(object).where(chunk.notna(), None).to_numpy()
+            position = 0
+            while position < len(values):
+                if sheet is None or sheet_rows == XLSX_MAX_ROWS:
+                    sheet = workbook.create_sheet(f'Sheet{len(workbook.worksheets) + 1}')
+                    sheet.append(header)
+                    sheet_rows = 1
+                take = min(len(values) - position, XLSX_MAX_ROWS - sheet_rows)
+                for row in values[position:position + take]:
+                    sheet.append(list(row))
+                sheet_rows += take
+                position += take
+            yield len(chunk)
+    finally:
+        workbook.save(path)
+
+
+# Stream chunks to a CSV, Parquet or XLSX file (by `fmt` or the extension)
+# without holding more than one chunk in memory. Returns the rows written.
+def write_chunks(chunks, path, fmt=None):
+    fmt = (fmt or os.path.splitext(path)[1].lstrip('.')).lower()
+    writers = {'csv': _write_csv, 'parquet': _write_parquet, 'xlsx': _write_xlsx}
+    if fmt not in writers:
+        raise ValueError(f"Unsupported format {fmt!r}; expected one of: {', '.join(SYNTHETIC_FORMATS)}")
+    return sum(writers[fmt](chunks, path))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Synthetic survey responses and athlete histories")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    survey = subparsers.add_parser('survey', help="Survey responses on the export schema")
+    survey.add_argument('--rows', type=int, required=True)
+    survey.add_argument('--correlation', type=float, default=DEFAULT_CORRELATION,
+                        help="Latent correlation between every pair of questions")
+    survey.add_argument('--like', help="Survey export to copy answer shares and correlations from")
+    survey.add_argument('--missing-rate', type=float, default=0.0)
+
+    athletes = subparsers.add_parser('athletes', help="Daily cycle and performance histories")
+    athletes.add_argument('--athletes', type=int, required=True)
+    athletes.add_argument('--days', type=int, default=365)
+    athletes.add_argument('--start', type=datetime.date.fromisoformat, default=datetime.date(2024, 1, 1))
+
+    for subparser in (survey, athletes):
+        subparser.add_argument('--output', required=True, help="Output file (.csv, .parquet or .xlsx)")
+        subparser.add_argument('--format', choices=SYNTHETIC_FORMATS)
+        subparser.add_argument('--chunk-size', type=int, default=100000)
+        subparser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.command == 'survey':
+        if args.like:
+            from survey_cache import read_survey_file
+            model = fit_survey_model(read_survey_file(args.like))
+        else:
+            model = {'correlation': args.correlation, 'missing_rate': args.missing_rate}
+        chunks = iter_survey_chunks(args.rows, args.chunk_size, seed=args.seed, **model)
+    else:
+        chunks = iter_athlete_chunks(args.athletes, args.days, args.chunk_size, start=args.start, seed=args.seed)
+
+    print(f"Wrote {write_chunks(chunks, args.output, args.format)} rows to {args.output}")
@@ -0,0 +1,248 @@
+import datetime
+import itertools
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+cycle_phases = ['Menstrual', 'Follicular', 'Ovulatory', 'Luteal']
+phase_metrics = ['Energy Level', 'Strength', 'Endurance', 'Recovery', 'Recommended Intensity']
+
+# Days per phase in a standard 28-day cycle
+standard_phase_lengths = (5, 9, 3, 11)
+
+# Population-average phase profile (cycle_phases x phase_metrics), for
+# athletes and phases without data of their own
+DEFAULT_PHASE_PROFILE = np.array([
+    [60, 65, 55, 50, 60],
+    [80, 85, 75, 70, 90],
+    [95, 90, 90, 85, 95],
+    [70, 75, 65, 60, 75]
+], dtype='float64')
+
+# numpy's datetime64[D] counts days from 1970-01-01; its date.toordinal() offset
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+PHASE_INDEX = {phase: i for i, phase in enumerate(cycle_phases)}
+METRIC_INDEX = {metric: i for i, metric in enumerate(phase_metrics)}
+
+DEFAULT_DB_PATH = os.environ.get(
+    'CYCLEPERFORM_DB',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cycleperform.db')
+)
+
+# SQL column for each metric, in phase_metrics order
+_METRIC_COLUMNS = ['energy', 'strength', 'endurance', 'recovery', 'intensity']
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS phase_metrics (
+    athlete_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    phase INTEGER NOT NULL,
+    {', '.join(f'{col} REAL' for col in _METRIC_COLUMNS)},
+    days INTEGER,
+    PRIMARY KEY (athlete_id, date, phase)
+);
+CREATE INDEX IF NOT EXISTS idx_phase_metrics_athlete_date ON phase_metrics (athlete_id, date);
+"""
+
+
+# Bumped in forked children, so no store reuses a connection opened by the parent
+_fork_generation = 0
+
+
+def _after_fork():
+    global _fork_generation
+    _fork_generation += 1
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+class SQLiteStore:
+    # Base for the stores sharing the app database. SQLite connections can't
+    # be shared across threads, so each thread (and each forked worker) opens
+    # its own, with the same pragmas for every store.
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+
+    def connection(self):
+        local = self._local
+        if getattr(local, 'generation', None) != _fork_generation:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            local.conn, local.generation = conn, _fork_generation
+        return local.conn
+
+
+class AthleteTwin:
+    # One athlete's phase profile: a (phase x metric) float32 array, so resolving
+    # a phase is an index instead of a DataFrame filter, plus the length of each
+    # phase in days
+    __slots__ = ('athlete_id', 'date', 'metrics', 'phase_lengths')
+
+    def __init__(self, athlete_id, date, metrics, phase_lengths=None):
+        self.athlete_id = athlete_id
+        self.date = date
+        self.metrics = np.asarray(metrics, dtype='float32').reshape(len(cycle_phases), len(phase_metrics))
+        if phase_lengths is None:
+            phase_lengths = standard_phase_lengths
+        self.phase_lengths = np.asarray(phase_lengths, dtype='int16').reshape(len(cycle_phases))
+
+    @property
+    def cycle_length(self):
+        return int(self.phase_lengths.sum())
+
+    def phase_row(self, phase):
+        return self.metrics[PHASE_INDEX[phase]]
+
+    def phase_values(self, phase):
+        return dict(zip(phase_metrics, self.phase_row(phase).tolist()))
+
+    # user_df-style frame (one row per phase), for code that wants a DataFrame
+    def to_frame(self):
+        frame = pd.DataFrame(self.metrics, columns=phase_metrics)
+        frame.insert(0, 'Phase', cycle_phases)
+        return frame
+
+
+class TwinStore(SQLiteStore):
+    # Per-athlete twins backed by SQLite, with a bounded LRU of decoded twins in
+    # front so hot athletes rarely touch the database. Other workers write to
+    # the same database, so a cached twin is only trusted for `cache_ttl`
+    # seconds before it is read again.
+    def __init__(self, db_path=DEFAULT_DB_PATH, cache_size=4096, cache_ttl=30.0):
+        super().__init__(db_path)
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        conn = self.connection()
+        conn.executescript(_SCHEMA)
+        # Databases created before phase lengths were stored
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(phase_metrics)")}
+        if 'days' not in columns:
+            conn.execute("ALTER TABLE phase_metrics ADD COLUMN days INTEGER")
+
+    def _remember(self, twin):
+        with self._lock:
+            self._cache[twin.athlete_id] = (twin, time.monotonic())
+            self._cache.move_to_end(twin.athlete_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    # Cached twin if it was read recently enough; call with the lock held
+    def _cached(self, athlete_id, now):
+        entry = self._cache.get(athlete_id)
+        if entry is None:
+            return None
+        if now - entry[1] >= self.cache_ttl:
+            del self._cache[athlete_id]
+            return None
+        return entry[0]
+
+    # Latest phase profile for an athlete, or None if we have never seen them
+    def get(self, athlete_id):
+        with self._lock:
+            twin = self._cached(athlete_id, time.monotonic())
+            if twin is not None:
+                self._cache.move_to_end(athlete_id)
+                return twin
+
+        rows = self.connection().execute(
+            f"""SELECT date, phase, days, {', '.join(_METRIC_COLUMNS)} FROM phase_metrics
+                WHERE athlete_id = ? AND date = (SELECT MAX(date) FROM phase_metrics WHERE athlete_id = ?)
+                ORDER BY phase""",
+            (athlete_id, athlete_id)
+        ).fetchall()
+        if len(rows) != len(cycle_phases):
+            return None
+
+        phase_lengths = [row[2] for row in rows]
+        if None in phase_lengths:
+            phase_lengths = None
+        twin = AthleteTwin(athlete_id, rows[0][0], [row[3:] for row in rows], phase_lengths)
+        self._remember(twin)
+        return twin
+
+    # Latest twins for many athletes with one query per batch; athletes we have
+    # never seen are left out of the result
+    def get_many(self, athlete_ids, batch_size=500):
+        twins = {}
+        missing = []
+        with self._lock:
+            now = time.monotonic()
+            for athlete_id in athlete_ids:
+                twin = self._cached(athlete_id, now)
+                if twin is not None:
+                    twins[athlete_id] = twin
+                else:
+                    missing.append(athlete_id)
+
+        conn = self.connection()
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start:start + batch_size]
+            placeholders = ', '.join('?' * len(batch))
+            rows = conn.execute(
+                f"""SELECT m.athlete_id, m.date, m.phase, m.days, {', '.join('m.' + c for c in _METRIC_COLUMNS)}
+                    FROM phase_metrics m
+                    JOIN (SELECT athlete_id, MAX(date) AS date FROM phase_metrics
+                          WHERE athlete_id IN ({placeholders}) GROUP BY athlete_id) latest
+                      ON m.athlete_id = latest.athlete_id AND m.date = latest.date
+                    ORDER BY m.athlete_id, m.phase""",
+                batch
+            ).fetchall()
+            for athlete_id, group in itertools.groupby(rows, key=lambda row: row[0]):
+                group = list(group)
+                if len(group) != len(cycle_phases):
+                    continue
+                phase_lengths = [row[3] for row in group]
+                if None in phase_lengths:
+                    phase_lengths = None
+                twins[athlete_id] = AthleteTwin(athlete_id, group[0][1], [row[4:] for row in group], phase_lengths)
+
+        return twins
+
+    # Store a phase profile (phase x metric array) dated `date`, default today
+    def put(self, athlete_id, metrics, date=None, phase_lengths=None):
+        if date is None:
+            date = datetime.date.today()
+        if not isinstance(date, str):
+            date = date.isoformat()
+        twin = AthleteTwin(athlete_id, date, metrics, phase_lengths)
+        self.put_many([twin])
+        return twin
+
+    def put_many(self, twins):
+        rows = [
+            (twin.athlete_id, twin.date, phase, *map(float, twin.metrics[phase]), int(twin.phase_lengths[phase]))
+            for twin in twins
+            for phase in range(len(cycle_phases))
+        ]
+        conn = self.connection()
+        with conn:
+            conn.executemany(
+                f"""INSERT OR REPLACE INTO phase_metrics
+                    (athlete_id, date, phase, {', '.join(_METRIC_COLUMNS)}, days)
+                    VALUES ({', '.join('?' * (4 + len(_METRIC_COLUMNS)))})""",
+                rows
+            )
+        # Only refresh twins that are already cached; a backdated profile must
+        # not shadow a newer one in the database
+        with self._lock:
+            now = time.monotonic()
+            for twin in twins:
+                cached = self._cache.get(twin.athlete_id)
+                if cached is not None and cached[0].date <= twin.date:
+                    self._cache[twin.athlete_id] = (twin, now)
+
+    def athlete_ids(self):
+        return [row[0] for row in self.connection().execute(
+            "SELECT DISTINCT athlete_id FROM phase_metrics ORDER BY athlete_id"
+        )]
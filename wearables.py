@@ -0,0 +1,482 @@
+import argparse
+import hashlib
+import os
+import struct
+import tempfile
+import xml.etree.ElementTree as ET
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from planner import default_phase_lengths
+from twin_store import cycle_phases
+
+# Root of the wearable store:
+#   minutes/athlete_id=<id>/date=<YYYY-MM-DD>/<source>.parquet  per-minute aggregates
+#   daily/athlete_id=<id>/<YYYY-MM>.parquet                     per-day aggregates
+WEARABLE_DIR = os.environ.get(
+    'CYCLEPERFORM_WEARABLE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'wearables')
+)
+
+WEARABLE_FORMATS = ('fit', 'gpx', 'csv')
+
+# Samples parsed per chunk; raw samples never accumulate beyond one chunk
+CHUNK_ROWS = 50000
+
+# Per-sample channels, all stored as float32 after downsampling
+SAMPLE_COLUMNS = ['heart_rate', 'cadence', 'speed', 'power']
+
+# Heart rate that TRIMP zones are relative to, until athletes can set their own
+MAX_HEART_RATE = 190
+
+# Edwards TRIMP: minutes in each %HRmax zone (50-60, ..., 90-100) weighted 1-5
+_TRIMP_ZONES = np.array([0.5, 0.6, 0.7, 0.8, 0.9])
+
+# CSV header aliases onto the sample columns
+_CSV_ALIASES = {
+    'timestamp': 'timestamp', 'time': 'timestamp', 'datetime': 'timestamp', 'date_time': 'timestamp',
+    'heart_rate': 'heart_rate', 'heartrate': 'heart_rate', 'hr': 'heart_rate', 'bpm': 'heart_rate',
+    'cadence': 'cadence', 'cad': 'cadence',
+    'speed': 'speed', 'velocity': 'speed',
+    'power': 'power', 'watts': 'power'
+}
+
+# FIT timestamps count seconds from 1989-12-31 00:00 UTC
+_FIT_EPOCH = 631065600
+_FIT_RECORD = 20
+_FIT_TIMESTAMP = 253
+# record message field number -> (column, scale)
+_FIT_RECORD_FIELDS = {
+    3: ('heart_rate', 1),
+    4: ('cadence', 1),
+    6: ('speed', 1000),
+    73: ('speed', 1000),
+    7: ('power', 1)
+}
+_STRUCT_CODES = {1: 'B', 2: 'H', 4: 'I', 8: 'Q'}
+
+MINUTE_SCHEMA = pa.schema(
+    [('minute', pa.timestamp('s'))] +
+    [(col, pa.float32()) for col in SAMPLE_COLUMNS] +
+    [('heart_rate_max', pa.float32()), ('samples', pa.int32())]
+)
+
+
+def _frame(rows):
+    frame = pd.DataFrame(rows, columns=['timestamp'] + SAMPLE_COLUMNS)
+    frame['timestamp'] = pd.to_datetime(frame['timestamp'], unit='s')
+    return frame
+
+
+# Stream the record messages of a FIT file as sample chunks. Only what the
+# store needs is decoded: the timestamp, heart rate, cadence, speed and power
+# of each record; every other message is skipped by its definition's size.
+def iter_fit_samples(f, chunk_rows=CHUNK_ROWS):
+    definitions = {}
+    rows = []
+    last_timestamp = None
+
+    def read(n):
+        data = f.read(n)
+        if len(data) != n:
+            raise ValueError("Truncated FIT file")
+        return data
+
+    while True:
+        header = f.read(1)
+        if not header:
+            break
+        header_size = header[0]
+        header_rest = read(header_size - 1)
+        if header_rest[7:11] != b'.FIT':
+            raise ValueError("Not a FIT file")
+        data_size = struct.unpack('<I', header_rest[3:7])[0]
+        remaining = data_size
+
+        while remaining > 0:
+            record_header = read(1)[0]
+            remaining -= 1
+
+            if record_header & 0x80:
+                # Compressed timestamp header: a 5-bit offset from the last timestamp
+                local = (record_header >> 5) & 0x3
+                if last_timestamp is None:
+                    raise ValueError("Invalid FIT file: compressed timestamp before any timestamp")
+                offset = record_header & 0x1F
+                timestamp = (last_timestamp & ~0x1F) + offset
+                if offset < (last_timestamp & 0x1F):
+                    timestamp += 0x20
+                last_timestamp = timestamp
+            elif record_header & 0x40:
+                local = record_header & 0x0F
+                fixed = read(5)
+                endian = '>' if fixed[1] else '<'
+                global_number = struct.unpack(endian + 'H', fixed[2:4])[0]
+                fields = [read(3) for _ in range(fixed[4])]
+                size = 5 + 3 * fixed[4]
+                dev_size = 0
+                if record_header & 0x20:
+                    dev_fields = [read(3) for _ in range(read(1)[0])]
+                    size += 1 + 3 * len(dev_fields)
+                    dev_size = sum(field[1] for field in dev_fields)
+                remaining -= size
+                codes = ''.join(_STRUCT_CODES.get(field[1], f'{field[1]}s') for field in fields)
+                definitions[local] = (
+                    global_number,
+                    struct.Struct(endian + codes + (f'{dev_size}x' if dev_size else '')),
+                    [(field[0], field[1]) for field in fields]
+                )
+                continue
+            else:
+                local = record_header & 0x0F
+                timestamp = None
+
+            if local not in definitions:
+                raise ValueError(f"Invalid FIT file: no definition for local message {local}")
+            global_number, layout, fields = definitions[local]
+            values = layout.unpack(read(layout.size))
+            remaining -= layout.size
+
+            row = [None] * (1 + len(SAMPLE_COLUMNS))
+            for (number, size), value in zip(fields, values):
+                if isinstance(value, bytes) or value == (1 << (8 * size)) - 1:
+                    continue
+                if number == _FIT_TIMESTAMP:
+                    last_timestamp = timestamp = value
+                elif global_number == _FIT_RECORD and number in _FIT_RECORD_FIELDS:
+                    column, scale = _FIT_RECORD_FIELDS[number]
+                    row[1 + SAMPLE_COLUMNS.index(column)] = value / scale
+
+            if global_number == _FIT_RECORD and timestamp is not None:
+                row[0] = timestamp + _FIT_EPOCH
+                rows.append(row)
+                if len(rows) >= chunk_rows:
+                    yield _frame(rows)
+                    rows = []
+
+        read(2)  # file CRC; chained FIT files may follow
+
+    if rows:
+        yield _frame(rows)
+
+
+def _local_name(tag):
+    return tag.rsplit('}', 1)[-1].lower()
+
+
+def _haversine_m(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371000 * np.arcsin(np.sqrt(a))
+
+
+# ElementTree events with malformed XML reported as an invalid upload
+def _iterparse(f):
+    try:
+        yield from ET.iterparse(f, events=('start', 'end'))
+    except ET.ParseError as e:
+        raise ValueError(f"Invalid GPX file: {e}") from None
+
+
+# Stream the track points of a GPX file as sample chunks. Heart rate, cadence
+# and power come from the Garmin TrackPointExtension (or any extension
+# element with that name); speed is derived from consecutive positions.
+def iter_gpx_samples(f, chunk_rows=CHUNK_ROWS):
+    points = []
+    previous = None
+    segment = None
+
+    def flush(points, previous):
+        frame = pd.DataFrame(points, columns=['timestamp', 'lat', 'lon', 'heart_rate', 'cadence', 'power'])
+        frame['timestamp'] = pd.to_datetime(frame['timestamp'], utc=True, errors='coerce').dt.tz_convert(None)
+        lat = np.concatenate([[previous[1]] if previous else [np.nan], frame['lat'].to_numpy(dtype='float64')])
+        lon = np.concatenate([[previous[2]] if previous else [np.nan], frame['lon'].to_numpy(dtype='float64')])
+        seconds = np.concatenate([[previous[0]] if previous else [np.nan],
+                                  frame['timestamp'].astype('int64').to_numpy() / 1e9])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            speed = _haversine_m(lat[:-1], lon[:-1], lat[1:], lon[1:]) / np.diff(seconds)
+        frame['speed'] = np.where(np.isfinite(speed), speed, np.nan)
+        last = (seconds[-1], lat[-1], lon[-1])
+        return frame.dropna(subset=['timestamp'])[['timestamp'] + SAMPLE_COLUMNS], last
+
+    for event, elem in _iterparse(f):
+        name = _local_name(elem.tag)
+        if event == 'start':
+            if name == 'trkseg':
+                segment = elem
+            continue
+        if name != 'trkpt':
+            continue
+
+        values = {'time': None, 'hr': None, 'cad': None, 'power': None}
+        for child in elem.iter():
+            child_name = _local_name(child.tag)
+            if child_name in values and child.text:
+                values[child_name] = child.text.strip()
+        if elem.get('lat') is None or elem.get('lon') is None:
+            raise ValueError("Invalid GPX file: track point without lat/lon")
+        points.append((values['time'], float(elem.get('lat')), float(elem.get('lon')),
+                       values['hr'], values['cad'], values['power']))
+        # Drop parsed points from the tree so memory stays flat
+        elem.clear()
+        if segment is not None:
+            segment.clear()
+
+        if len(points) >= chunk_rows:
+            frame, previous = flush(points, previous)
+            points = []
+            yield frame.astype({col: 'float64' for col in SAMPLE_COLUMNS})
+
+    if points:
+        frame, _ = flush(points, previous)
+        yield frame.astype({col: 'float64' for col in SAMPLE_COLUMNS})
+
+
+# Stream a CSV export with a timestamp column and any of the sample columns
+# (common header spellings are accepted, see _CSV_ALIASES)
+def iter_csv_samples(f, chunk_rows=CHUNK_ROWS):
+    for chunk in pd.read_csv(f, chunksize=chunk_rows):
+        chunk = chunk.rename(columns=lambda c: _CSV_ALIASES.get(str(c).strip().lower().replace(' ', '_'), c))
+        if 'timestamp' not in chunk.columns:
+            raise ValueError("CSV exports need a timestamp column")
+        frame = pd.DataFrame({
+            'timestamp': pd.to_datetime(chunk['timestamp'], utc=True, errors='coerce').dt.tz_convert(None)
+        })
+        for col in SAMPLE_COLUMNS:
+            frame[col] = pd.to_numeric(chunk[col], errors='coerce') if col in chunk.columns else np.nan
+        yield frame.dropna(subset=['timestamp'])
+
+
+_PARSERS = {'fit': iter_fit_samples, 'gpx': iter_gpx_samples, 'csv': iter_csv_samples}
+
+
+def detect_format(name):
+    extension = os.path.splitext(name or '')[1].lower().lstrip('.')
+    if extension not in WEARABLE_FORMATS:
+        raise ValueError(f"Unknown wearable file type {name!r}; expected one of: {', '.join(WEARABLE_FORMATS)}")
+    return extension
+
+
+# Reader that hashes what it passes through, so a streamed upload gets a
+# content-derived source id without being buffered
+class _HashingReader:
+    def __init__(self, f):
+        self._f = f
+        self.digest = hashlib.blake2b(digest_size=12)
+
+    def read(self, n=-1):
+        data = self._f.read(n)
+        self.digest.update(data)
+        return data
+
+    def readable(self):
+        return True
+
+
+# Per-minute partial aggregates of a chunk: sums and counts rather than means,
+# so minutes split across chunk boundaries merge exactly
+def _minute_partials(samples):
+    grouped = samples[SAMPLE_COLUMNS].groupby(samples['timestamp'].dt.floor('min').to_numpy())
+    partial = pd.concat([
+        grouped.sum(min_count=1).add_suffix('_sum'),
+        grouped.count().add_suffix('_count'),
+        grouped['heart_rate'].max().rename('heart_rate_max'),
+        grouped.size().rename('samples')
+    ], axis=1)
+    return partial
+
+
+def _merge_partials(partials):
+    combined = pd.concat(partials)
+    if combined.index.is_unique:
+        return combined
+    grouped = combined.groupby(level=0)
+    sums = grouped[[c for c in combined.columns if c != 'heart_rate_max']].sum(min_count=1)
+    return sums.join(grouped['heart_rate_max'].max())
+
+
+def _finalize_minutes(partial):
+    minutes = pd.DataFrame({'minute': partial.index.astype('datetime64[s]')})
+    for col in SAMPLE_COLUMNS:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            minutes[col] = (partial[f'{col}_sum'] / partial[f'{col}_count'].replace(0, np.nan)).to_numpy(dtype='float32')
+    minutes['heart_rate_max'] = partial['heart_rate_max'].to_numpy(dtype='float32')
+    minutes['samples'] = partial['samples'].to_numpy(dtype='int32')
+    return minutes.sort_values('minute', ignore_index=True)
+
+
+# Per-day aggregates from per-minute rows (any number of days)
+def daily_aggregates(minutes, max_heart_rate=MAX_HEART_RATE):
+    day = minutes['minute'].dt.floor('D')
+    hr_fraction = minutes['heart_rate'].to_numpy(dtype='float64') / max_heart_rate
+    zone_weight = np.searchsorted(_TRIMP_ZONES, np.nan_to_num(hr_fraction), side='right')
+    frame = pd.DataFrame({
+        'date': day.to_numpy(),
+        'active_minutes': 1,
+        'distance_km': minutes['speed'].fillna(0).to_numpy(dtype='float64') * 60 / 1000,
+        'heart_rate': minutes['heart_rate'].to_numpy(dtype='float64'),
+        'heart_rate_max': minutes['heart_rate_max'].to_numpy(dtype='float64'),
+        'power': minutes['power'].to_numpy(dtype='float64'),
+        'cadence': minutes['cadence'].to_numpy(dtype='float64'),
+        'load': zone_weight.astype('float64')
+    })
+    daily = frame.groupby('date').agg(
+        active_minutes=('active_minutes', 'sum'),
+        distance_km=('distance_km', 'sum'),
+        heart_rate=('heart_rate', 'mean'),
+        heart_rate_max=('heart_rate_max', 'max'),
+        power=('power', 'mean'),
+        cadence=('cadence', 'mean'),
+        load=('load', 'sum')
+    ).reset_index()
+    daily['date'] = daily['date'].dt.date
+    return daily.round(2)
+
+
+def _empty_minutes():
+    return _finalize_minutes(_minute_partials(_frame([])))
+
+
+def _empty_daily():
+    return daily_aggregates(_empty_minutes())
+
+
+def _atomic_write_table(table, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    os.close(fd)
+    try:
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class WearableStore:
+    # Wearable time series per athlete, kept only as per-minute and per-day
+    # aggregates in a Parquet store partitioned by athlete and date. Files are
+    # parsed in chunks, so memory is bounded by the chunk size plus one row per
+    # minute of activity, however many raw samples a file holds.
+    def __init__(self, root=WEARABLE_DIR, chunk_rows=CHUNK_ROWS, max_heart_rate=MAX_HEART_RATE):
+        self.root = root
+        self.chunk_rows = chunk_rows
+        self.max_heart_rate = max_heart_rate
+
+    def _athlete_dir(self, kind, athlete_id):
+        return os.path.join(self.root, kind, f"athlete_id={quote(str(athlete_id), safe='')}")
+
+    def ingest_file(self, athlete_id, path, fmt=None):
+        with open(path, 'rb') as f:
+            return self.ingest(athlete_id, f, fmt or detect_format(path))
+
+    # Ingest one activity/heart-rate file from a binary stream. Re-ingesting
+    # the same content replaces its earlier minutes instead of adding to them.
+    # Returns the per-day aggregates of every day the file touched.
+    def ingest(self, athlete_id, stream, fmt):
+        if fmt not in _PARSERS:
+            raise ValueError(f"Format must be one of: {', '.join(WEARABLE_FORMATS)}")
+        reader = _HashingReader(stream)
+
+        partials = []
+        for samples in _PARSERS[fmt](reader, self.chunk_rows):
+            if not samples.empty:
+                partials.append(_minute_partials(samples))
+                # Keep the partials compact while a long file streams in
+                if len(partials) >= 32:
+                    partials = [_merge_partials(partials)]
+        if not partials:
+            return _empty_daily()
+
+        minutes = _finalize_minutes(_merge_partials(partials))
+        source_id = reader.digest.hexdigest()
+        athlete_dir = self._athlete_dir('minutes', athlete_id)
+        days = minutes['minute'].dt.floor('D')
+        for day, day_minutes in minutes.groupby(days):
+            table = pa.Table.from_pandas(day_minutes, schema=MINUTE_SCHEMA, preserve_index=False)
+            _atomic_write_table(table, os.path.join(athlete_dir, f"date={day.date().isoformat()}", f"{source_id}.parquet"))
+
+        return self._refresh_daily(athlete_id, sorted({d.date() for d in days.unique()}))
+
+    # Per-minute rows for one day, merged across every source that covers it
+    def minutes(self, athlete_id, date):
+        day_dir = os.path.join(self._athlete_dir('minutes', athlete_id), f"date={date.isoformat()}")
+        if not os.path.isdir(day_dir):
+            return _empty_minutes()
+        files = sorted(os.path.join(day_dir, name) for name in os.listdir(day_dir) if name.endswith('.parquet'))
+        minutes = pa.concat_tables([pq.read_table(path, schema=MINUTE_SCHEMA) for path in files]).to_pandas()
+        if minutes['minute'].is_unique:
+            return minutes.sort_values('minute', ignore_index=True)
+        # Two devices recording the same minute: average them
+        grouped = minutes.groupby('minute')
+        merged = grouped[SAMPLE_COLUMNS].mean().join(grouped['heart_rate_max'].max()).join(grouped['samples'].sum())
+        return merged.reset_index()
+
+    # Recompute the daily rows of the given dates from their minutes and
+    # rewrite the month files they live in
+    def _refresh_daily(self, athlete_id, dates):
+        daily_dir = self._athlete_dir('daily', athlete_id)
+        refreshed = daily_aggregates(pd.concat([self.minutes(athlete_id, d) for d in dates]), self.max_heart_rate)
+        for month, rows in refreshed.groupby(refreshed['date'].map(lambda d: d.strftime('%Y-%m'))):
+            path = os.path.join(daily_dir, f"{month}.parquet")
+            if os.path.exists(path):
+                existing = pq.read_table(path).to_pandas()
+                existing['date'] = pd.to_datetime(existing['date']).dt.date
+                rows = pd.concat([existing[~existing['date'].isin(rows['date'])], rows])
+            _atomic_write_table(pa.Table.from_pandas(rows.sort_values('date'), preserve_index=False), path)
+        return refreshed
+
+    # Per-day aggregates between two dates (inclusive), read from the month files only
+    def daily(self, athlete_id, start=None, end=None):
+        daily_dir = self._athlete_dir('daily', athlete_id)
+        if not os.path.isdir(daily_dir):
+            return _empty_daily()
+        months = sorted(name[:-len('.parquet')] for name in os.listdir(daily_dir) if name.endswith('.parquet'))
+        if start is not None:
+            months = [m for m in months if m >= start.strftime('%Y-%m')]
+        if end is not None:
+            months = [m for m in months if m <= end.strftime('%Y-%m')]
+        if not months:
+            return _empty_daily()
+        frame = pd.concat([pq.read_table(os.path.join(daily_dir, f"{m}.parquet")).to_pandas() for m in months],
+                          ignore_index=True)
+        frame['date'] = pd.to_datetime(frame['date']).dt.date
+        if start is not None:
+            frame = frame[frame['date'] >= start]
+        if end is not None:
+            frame = frame[frame['date'] <= end]
+        return frame.reset_index(drop=True)
+
+    # user_df-style frame: one row per phase with the athlete's mean daily
+    # aggregates on days in that phase, placing days by their forecast cycle
+    def phase_aggregates(self, athlete_id, cycle_start, cycle_length, start=None, end=None):
+        daily = self.daily(athlete_id, start, end)
+        days = np.array([d.toordinal() for d in daily['date']], dtype='int64')
+        day_in_cycle = (days - cycle_start.toordinal()) % cycle_length
+        phase_ends = np.cumsum(default_phase_lengths(cycle_length))[:-1]
+        phase = (day_in_cycle[:, None] >= phase_ends).sum(axis=1)
+
+        metrics = daily.drop(columns='date')
+        frame = metrics.groupby(phase).mean().reindex(range(len(cycle_phases)))
+        frame['days'] = np.bincount(phase, minlength=len(cycle_phases))
+        frame.insert(0, 'Phase', cycle_phases)
+        return frame.reset_index(drop=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Wearable data ingestion")
+    parser.add_argument('command', choices=['ingest'])
+    parser.add_argument('athlete_id')
+    parser.add_argument('files', nargs='+')
+    parser.add_argument('--root', default=WEARABLE_DIR)
+    args = parser.parse_args()
+
+    store = WearableStore(args.root)
+    for path in args.files:
+        daily = store.ingest_file(args.athlete_id, path)
+        print(f"{path}: {len(daily)} days")
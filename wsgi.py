@@ -0,0 +1,15 @@
+# Production entry point. Import this once in the server's master process and
+# fork workers from it, so they share the loaded survey data copy-on-write:
+#
+#   gunicorn -c gunicorn.conf.py
+#   uvicorn --interface wsgi wsgi:server
+import gc
+
+from cycle_analysis import create_app
+
+app = create_app('prod')
+server = app.server
+
+# Move everything loaded so far out of the collector's reach: collections
+# would otherwise touch every object header and un-share the workers' pages
+gc.freeze()